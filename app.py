@@ -13,6 +13,9 @@ from datetime import datetime, timedelta
 import traceback
 import logging
 import hashlib
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Configurar o path para imports locais (sem dependência da API principal)
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -24,26 +27,36 @@ try:
     load_env()  # Carrega .env do diretório busca_local
     
     # Imports dos módulos locais (agora com variáveis carregadas)
-    from config import LIMITE_PADRAO_RESULTADOS, LIMITE_MAXIMO_RESULTADOS, GROQ_API_KEY
+    from config import LIMITE_PADRAO_RESULTADOS, LIMITE_MAXIMO_RESULTADOS, GROQ_API_KEY, QUERIES_MAX_WORKERS, RERANK_MODO, DECOMPOSICAO_STREAMING
+    from config import INICIALIZACAO_AUTOMATICA, INICIALIZACAO_RETRY_SECONDS
+    from concorrencia import executar_em_paralelo
+    from groq_pool import obter_pool_groq
     from weaviate_client import WeaviateManager
     from supabase_client import SupabaseManager
-    from search_engine import buscar_hibrido_ponderado, _llm_escolher_indice
-    from query_builder import gerar_estrutura_de_queries
+    from search_engine import buscar_candidatos, _llm_escolher_indice, EmbeddingContext, estatisticas_cache_rerank, llm_escolher_indices_em_lote, validar_modo_busca
+    from query_builder import gerar_estrutura_de_queries, gerar_query_item
     from cotacao_manager import CotacaoManager
     from decomposer import SolutionDecomposer
+    from sync_worker import SyncWorker
+    from snapshot_catalogo import salvar_snapshot, restaurar_snapshot
 except ImportError:
     try:
         from .config import load_env
         load_env()  # Carrega .env do diretório busca_local
         
         # Imports dos módulos locais (agora com variáveis carregadas)
-        from .config import LIMITE_PADRAO_RESULTADOS, LIMITE_MAXIMO_RESULTADOS, GROQ_API_KEY
+        from .config import LIMITE_PADRAO_RESULTADOS, LIMITE_MAXIMO_RESULTADOS, GROQ_API_KEY, QUERIES_MAX_WORKERS, RERANK_MODO, DECOMPOSICAO_STREAMING
+        from .config import INICIALIZACAO_AUTOMATICA, INICIALIZACAO_RETRY_SECONDS
+        from .concorrencia import executar_em_paralelo
+        from .groq_pool import obter_pool_groq
         from .weaviate_client import WeaviateManager
         from .supabase_client import SupabaseManager
-        from .search_engine import buscar_hibrido_ponderado, _llm_escolher_indice
-        from .query_builder import gerar_estrutura_de_queries
+        from .search_engine import buscar_candidatos, _llm_escolher_indice, EmbeddingContext, estatisticas_cache_rerank, llm_escolher_indices_em_lote, validar_modo_busca
+        from .query_builder import gerar_estrutura_de_queries, gerar_query_item
         from .cotacao_manager import CotacaoManager
         from .decomposer import SolutionDecomposer
+        from .sync_worker import SyncWorker
+        from .snapshot_catalogo import salvar_snapshot, restaurar_snapshot
     except ImportError as e:
         print(f"⚠️ Erro crítico ao importar módulos: {e}")
         raise
@@ -70,6 +83,29 @@ CORS(app)
 weaviate_manager = None
 supabase_manager = None
 decomposer = None
+sync_worker = None
+
+# Estado da inicialização em background (liveness = /health; readiness = /ready)
+_servicos_prontos = threading.Event()
+_lock_inicializacao = threading.Lock()
+_thread_inicializacao = None
+_pid_inicializacao = None
+_estado_inicializacao = {
+    "fase": "pendente",  # pendente | inicializando | pronto | erro
+    "tentativas": 0,
+    "inicio": None,
+    "pronto_em": None,
+    "ultimo_erro": None,
+    "servicos": {
+        "weaviate": "pendente",
+        "supabase": "pendente",
+        "catalogo": "pendente",
+        "decomposer": "pendente",
+        "embeddings": "pendente",
+    },
+}
+# Rotas atendidas mesmo antes de os serviços estarem prontos
+ROTAS_SEM_PRONTIDAO = {"/health", "/", "/ready", "/sync-status"}
 
 # Logging de requisições: URL acessada, origem (Referer/Origin) e IP
 def _client_ip() -> str:
@@ -168,14 +204,30 @@ def executar_estrutura_de_queries(
     estrutura: List[Dict[str, Any]], 
     limite: int = None, 
     usar_multilingue: bool = True,
-    verbose: bool = False
+    verbose: bool = False,
+    contexto_embeddings: EmbeddingContext | None = None,
+    max_workers: int | None = None,
+    modo_busca: str | None = None,
+    rerank_modo: str | None = None,
+    metricas: Dict[str, Any] | None = None
 ) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
     """
     Executa todas as queries geradas pela estrutura e apresenta resultados.
     Retorna um dicionário {query_id: [resultados]} e uma lista de IDs de queries faltantes.
+    `contexto_embeddings` permite reaproveitar os embeddings das queries entre chamadas da mesma requisição.
+    As queries rodam em paralelo em até `max_workers` threads (padrão: QUERIES_MAX_WORKERS; 1 = sequencial);
+    a ordem e o conteúdo de `resultados_por_query` não dependem da ordem de conclusão.
+    `modo_busca` escolhe a recuperação ('por_espaco', 'multivetor' ou 'hibrido_nativo'; padrão: MODO_BUSCA).
+    `rerank_modo` ('individual' ou 'lote'; padrão: RERANK_MODO): em 'lote' todas as recuperações terminam
+    antes e o rerank agrupa várias queries por chamada à LLM.
+    Se `metricas` for fornecido, o rerank acumula em metricas['rerank'] chamadas e tamanho do prompt.
     """
     if limite is None:
         limite = LIMITE_PADRAO_RESULTADOS
+    if max_workers is None:
+        max_workers = QUERIES_MAX_WORKERS
+    if rerank_modo is None:
+        rerank_modo = RERANK_MODO
         
     modelos = weaviate_manager.get_models()
     espacos = ["vetor_portugues"] + (["vetor_multilingue"] if modelos.get("supports_multilingual") and usar_multilingue else [])
@@ -185,46 +237,32 @@ def executar_estrutura_de_queries(
 
     resultados_por_query: Dict[str, List[Dict[str, Any]]] = {}
 
-    for q in estrutura:
+    def _recuperar(q: Dict[str, Any]) -> List[Dict[str, Any]]:
         if verbose:
             logger.info(f"➡️ Executando {q['id']} [{q['tipo']}] | Query: {q['query']}")
             logger.info(f"Filtros: {q.get('filtros')}")
         
-        todos: List[Dict[str, Any]] = []
-        # Buscar em todos os espaços e juntar resultados
-        for espaco in espacos:
-            filtros_query = q.get("filtros") or {}
-            
-            r = buscar_hibrido_ponderado(
-                weaviate_manager.client,
-                modelos,
-                q["query"],
-                espaco,
-                limite=limite,
-                filtros=filtros_query,
-            )
-            todos.extend(r)
-        
-        # Agregar por produto mantendo melhor score
-        agregados: Dict[Tuple[str, str], Dict[str, Any]] = {}
-        for item in todos:
-            categoria = item.get("categoria", "") or item.get("modelo", "")
-            chave = (item["nome"], categoria)
-            atual = agregados.get(chave)
-            if not atual or item["score"] > atual["score"]:
-                agregados[chave] = item
-                
-        lista = list(agregados.values())
-        lista.sort(key=lambda x: x["score"], reverse=True)
+        # Buscar em todos os espaços e agregar por produto mantendo melhor score
+        return buscar_candidatos(
+            weaviate_manager.client,
+            modelos,
+            q["query"],
+            espacos,
+            limite=limite,
+            filtros=q.get("filtros") or {},
+            contexto_embeddings=contexto_embeddings,
+            modo_busca=modo_busca,
+        )
 
-        resultado_llm = {"index": -1, "relatorio": {}}
+    def _reranquear(q: Dict[str, Any], lista: List[Dict[str, Any]]) -> Dict[str, Any]:
         try:
-            resultado_llm = _llm_escolher_indice(q["query"], q.get("filtros") or None, q.get("custo_beneficio") or None, q.get("rigor") or None, lista)
-            logger.info(f"🧠 [LLM] Resultado para {q['id']}: índice={resultado_llm.get('index')}, relatório={len(resultado_llm.get('relatorio', {}))} campos")
+            return _llm_escolher_indice(q["query"], q.get("filtros") or None, q.get("custo_beneficio") or None, q.get("rigor") or None, lista, metricas=metricas)
         except Exception as e:
             logger.error(f"[LLM] Erro ao executar refinamento: {e}")
-            resultado_llm = {"index": -1, "relatorio": {}}
-        
+            return {"index": -1, "relatorio": {}}
+
+    def _aplicar_llm(q: Dict[str, Any], lista: List[Dict[str, Any]], resultado_llm: Dict[str, Any]) -> List[Dict[str, Any]]:
+        logger.info(f"🧠 [LLM] Resultado para {q['id']}: índice={resultado_llm.get('index')}, relatório={len(resultado_llm.get('relatorio', {}))} campos")
         idx_escolhido = resultado_llm.get("index", -1)
         relatorio_llm = resultado_llm.get("relatorio", {})
         
@@ -234,29 +272,60 @@ def executar_estrutura_de_queries(
             escolhido["llm_index"] = idx_escolhido
             escolhido["llm_relatorio"] = relatorio_llm
             logger.info(f"🎯 Índice escolhido pela LLM: {idx_escolhido} - {escolhido.get('nome', 'N/A')}")
-            lista = [escolhido]
+            return [escolhido]
+
+        if idx_escolhido == -1:
+            logger.info(f"❌ LLM não encontrou match adequado para {q['id']}")
         else:
-            if idx_escolhido == -1:
-                logger.info(f"❌ LLM não encontrou match adequado para {q['id']}")
-            else:
-                logger.warning(f"⚠️ Índice LLM inválido: {idx_escolhido} (max: {len(lista)-1})")
-            
-            # PRESERVAR o relatório LLM mesmo quando nenhum produto é escolhido
-            # Criar um objeto especial para representar a análise rejeitada
-            if relatorio_llm and lista:  # Se houve análise LLM e havia produtos candidatos
-                produto_rejeitado = {
-                    "llm_match": False,
-                    "llm_rejected": True,
-                    "llm_relatorio": relatorio_llm,
-                    "query_id": q["id"],
-                    "status": "rejeitado_por_llm",
-                    "observacao": "Produtos encontrados mas rejeitados pela análise LLM"
-                }
-                # Manter o produto rejeitado para que o relatório seja preservado
-                lista = [produto_rejeitado]
-            else:
-                lista = []
+            logger.warning(f"⚠️ Índice LLM inválido: {idx_escolhido} (max: {len(lista)-1})")
+        
+        # PRESERVAR o relatório LLM mesmo quando nenhum produto é escolhido
+        # Criar um objeto especial para representar a análise rejeitada
+        if relatorio_llm and lista:  # Se houve análise LLM e havia produtos candidatos
+            produto_rejeitado = {
+                "llm_match": False,
+                "llm_rejected": True,
+                "llm_relatorio": relatorio_llm,
+                "query_id": q["id"],
+                "status": "rejeitado_por_llm",
+                "observacao": "Produtos encontrados mas rejeitados pela análise LLM"
+            }
+            # Manter o produto rejeitado para que o relatório seja preservado
+            return [produto_rejeitado]
+        return []
 
+    if rerank_modo == "lote":
+        # 1) recuperação de todas as queries; 2) rerank agrupado; 3) aplicação das escolhas
+        candidatos = executar_em_paralelo(_recuperar, estrutura, max_workers, prefixo="query")
+        pedidos = [
+            {
+                "id": q["id"],
+                "query": q["query"],
+                "filtros": q.get("filtros") or None,
+                "custo_beneficio": q.get("custo_beneficio") or None,
+                "rigor": q.get("rigor") or None,
+                "candidatos": lista,
+            }
+            for q, lista in zip(estrutura, candidatos)
+        ]
+        try:
+            por_id = llm_escolher_indices_em_lote(pedidos, max_workers=max_workers, metricas=metricas)
+        except Exception as e:
+            logger.error(f"[LLM] Erro ao executar refinamento em lote: {e}")
+            por_id = {}
+        listas = [
+            _aplicar_llm(q, lista, por_id.get(q["id"], {"index": -1, "relatorio": {}}))
+            for q, lista in zip(estrutura, candidatos)
+        ]
+    else:
+        # Cada query segue recuperação → rerank de forma independente (sem esperar as demais)
+        def _executar_query(q: Dict[str, Any]) -> List[Dict[str, Any]]:
+            lista = _recuperar(q)
+            return _aplicar_llm(q, lista, _reranquear(q, lista))
+
+        listas = executar_em_paralelo(_executar_query, estrutura, max_workers, prefixo="query")
+
+    for q, lista in zip(estrutura, listas):
         resultados_por_query[q["id"]] = lista
 
         # Log resumido por query
@@ -320,13 +389,18 @@ def executar_busca_duas_fases(
     estrutura: List[Dict[str, Any]],
     limite_resultados: int = LIMITE_PADRAO_RESULTADOS,
     usar_multilingue: bool = True,
-    verbose: bool = False
+    verbose: bool = False,
+    contexto_embeddings: EmbeddingContext | None = None,
+    modo_busca: str | None = None
 ) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str], Dict[str, Any]]:
     """
     Executa busca em duas fases:
     1. Primeira fase: produtos com origem='local'
     2. Segunda fase (cache): produtos com origem='externo' para queries sem resultado na primeira fase
     
+    As duas fases compartilham o mesmo contexto de embeddings, então cada query é
+    codificada uma única vez por espaço vetorial.
+    
     Returns:
         Tuple[resultados_finais, faltantes_finais, metricas_fases]
     """
@@ -338,6 +412,9 @@ def executar_busca_duas_fases(
         "analises_por_fase": {"local": {}, "cache": {}}
     }
     
+    if contexto_embeddings is None:
+        contexto_embeddings = EmbeddingContext(weaviate_manager.get_models().get("embedding_client"))
+    
     if verbose:
         logger.info("🚀 Iniciando busca em duas fases: LOCAL → CACHE")
     
@@ -359,7 +436,10 @@ def executar_busca_duas_fases(
         estrutura_local,
         limite=limite_resultados,
         usar_multilingue=usar_multilingue,
-        verbose=verbose
+        verbose=verbose,
+        contexto_embeddings=contexto_embeddings,
+        modo_busca=modo_busca,
+        metricas=metricas
     )
     
     # Atualizar métricas da fase local e marcar origem
@@ -436,7 +516,10 @@ def executar_busca_duas_fases(
             estrutura_cache,
             limite=limite_resultados,
             usar_multilingue=usar_multilingue,
-            verbose=verbose
+            verbose=verbose,
+            contexto_embeddings=contexto_embeddings,
+            modo_busca=modo_busca,
+            metricas=metricas
         )
         
         # Atualizar métricas da fase cache
@@ -495,14 +578,98 @@ def executar_busca_duas_fases(
         total_cache = metricas["fase_cache"]["queries_com_resultado"] 
         total_faltantes = len(faltantes_finais)
         logger.info(f"📊 RESUMO: {total_local} local + {total_cache} cache + {total_faltantes} faltantes = {len(estrutura)} queries")
+        logger.info(f"🧮 Embeddings de query: {contexto_embeddings.stats()}")
+        if metricas.get("rerank"):
+            logger.info(f"📏 Rerank: {metricas['rerank']}")
     
     return resultados_finais, faltantes_finais, metricas
 
+def _mesclar_metricas(destino: Dict[str, Any], origem: Dict[str, Any]):
+    """Mescla métricas de busca: soma contadores, concatena listas e mescla dicionários recursivamente."""
+    for chave, valor in origem.items():
+        atual = destino.get(chave)
+        if isinstance(valor, dict) and isinstance(atual, dict):
+            _mesclar_metricas(atual, valor)
+        elif isinstance(valor, list) and isinstance(atual, list):
+            atual.extend(valor)
+        elif (
+            isinstance(valor, (int, float)) and not isinstance(valor, bool)
+            and isinstance(atual, (int, float)) and not isinstance(atual, bool)
+        ):
+            destino[chave] = atual + valor
+        else:
+            destino[chave] = valor
+
+def _decompor_e_buscar_em_streaming(
+    solicitacao: str,
+    limite_resultados: int,
+    usar_multilingue: bool,
+    modo_busca: str | None = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]], List[str], Dict[str, Any]]:
+    """
+    Decomposição em streaming sobreposta à busca: cada item de 'itens_a_comprar' vira a query
+    Q{n} (gerar_query_item) e a busca em duas fases dessa query é submetida assim que o item
+    chega, enquanto a LLM ainda gera os seguintes. As buscas compartilham o contexto de embeddings.
+
+    Returns:
+        Tuple[brief, estrutura, resultados, faltantes, metricas_fases] no formato do fluxo sequencial
+    """
+    contexto_embeddings = EmbeddingContext(weaviate_manager.get_models().get("embedding_client"))
+    queries: Dict[int, Dict[str, Any]] = {}
+    futuros: Dict[int, Future] = {}
+    pool = ThreadPoolExecutor(max_workers=max(1, QUERIES_MAX_WORKERS), thread_name_prefix="item-stream")
+    inicio = time.time()
+
+    def _ao_item(idx: int, item: Dict[str, Any]):
+        q = gerar_query_item(item, idx)
+        queries[idx] = q
+        logger.info(f"🚚 {q['id']} despachada para busca {time.time() - inicio:.1f}s após o início da decomposição")
+        futuros[idx] = pool.submit(
+            executar_busca_duas_fases,
+            weaviate_manager,
+            [q],
+            limite_resultados=limite_resultados,
+            usar_multilingue=usar_multilingue,
+            verbose=False,
+            contexto_embeddings=contexto_embeddings,
+            modo_busca=modo_busca,
+        )
+
+    try:
+        brief = decomposer.gerar_brief_streaming(solicitacao, _ao_item)
+        fim_decomposicao = time.time()
+
+        resultados: Dict[str, List[Dict[str, Any]]] = {}
+        faltantes: List[str] = []
+        metricas_fases: Dict[str, Any] = {}
+        for idx in sorted(futuros):
+            resultados_q, faltantes_q, metricas_q = futuros[idx].result()
+            resultados.update(resultados_q)
+            faltantes.extend(faltantes_q)
+            _mesclar_metricas(metricas_fases, metricas_q)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    metricas_fases["streaming"] = {
+        "queries_despachadas": len(futuros),
+        "decomposicao_s": round(fim_decomposicao - inicio, 3),
+        "total_s": round(time.time() - inicio, 3),
+    }
+    logger.info(
+        f"📊 Streaming: {len(futuros)} queries; decomposição {metricas_fases['streaming']['decomposicao_s']}s, "
+        f"decomposição + busca {metricas_fases['streaming']['total_s']}s"
+    )
+    logger.info(f"🧮 Embeddings de query: {contexto_embeddings.stats()}")
+    estrutura = [queries[idx] for idx in sorted(queries)]
+    return brief, estrutura, resultados, faltantes, metricas_fases
+
 def processar_interpretacao(
     interpretation: Union[str, Dict[str, Any]],
     limite_resultados: int = LIMITE_PADRAO_RESULTADOS,
     usar_multilingue: bool = True,
     criar_cotacao: bool = False,
+    modo_busca: str | None = None,
+    decomposicao_streaming: bool | None = None,
 ) -> Dict[str, Any]:
     """
     Processa uma interpretação: usa o campo 'solicitacao' para rodar LLM->brief->queries->busca.
@@ -519,38 +686,35 @@ def processar_interpretacao(
     if not solicitacao:
         raise ValueError("Campo 'solicitacao' ausente na interpretação fornecida")
 
-    # Sincronizar dados antes da busca
-    try:
-        if supabase_manager and supabase_manager.is_available():
-            # Atualizar dados completos do Supabase (incluindo produtos removidos)
-            produtos_atualizados = supabase_manager.refresh()
-            if produtos_atualizados:
-                logger.info(f"🔄 Sincronizando {len(produtos_atualizados)} produtos do Supabase (incluindo remoções)")
-                # Usar sincronização completa que remove órfãos e indexa novos
-                metricas = weaviate_manager.sincronizar_com_supabase(produtos_atualizados)
-                if metricas.get("novos", 0) > 0 or metricas.get("removidos", 0) > 0:
-                    logger.info(f"📊 Sincronização: +{metricas.get('novos', 0)} novos, -{metricas.get('removidos', 0)} removidos")
-            else:
-                logger.info("📊 Nenhum produto encontrado no Supabase")
-        else:
-            logger.info("📊 Supabase não disponível; mantendo dados atuais do Weaviate")
-    except Exception as e:
-        logger.warning(f"⚠️ Falha ao sincronizar com Supabase antes da busca: {e}")
+    # A sincronização Supabase → Weaviate roda em background (SyncWorker); a busca usa o último estado sincronizado
 
-    logger.info("🤖 Decompondo solicitação...")
-    brief = decomposer.gerar_brief(solicitacao)
+    usar_streaming = DECOMPOSICAO_STREAMING if decomposicao_streaming is None else bool(decomposicao_streaming)
+    if usar_streaming:
+        # Cada item decomposto já dispara a sua busca em duas fases (LOCAL → CACHE)
+        logger.info("🤖 Decompondo solicitação em streaming...")
+        brief, estrutura, resultados, faltantes, metricas_fases = _decompor_e_buscar_em_streaming(
+            solicitacao,
+            limite_resultados,
+            usar_multilingue,
+            modo_busca=modo_busca
+        )
+        logger.info(f"🧩 {len(estrutura)} queries geradas a partir do brief")
+    else:
+        logger.info("🤖 Decompondo solicitação...")
+        brief = decomposer.gerar_brief(solicitacao)
 
-    estrutura = gerar_estrutura_de_queries(brief)
-    logger.info(f"🧩 {len(estrutura)} queries geradas a partir do brief")
+        estrutura = gerar_estrutura_de_queries(brief)
+        logger.info(f"🧩 {len(estrutura)} queries geradas a partir do brief")
 
-    # Executar busca em duas fases: LOCAL → CACHE
-    resultados, faltantes, metricas_fases = executar_busca_duas_fases(
-        weaviate_manager,
-        estrutura,
-        limite_resultados=limite_resultados,
-        usar_multilingue=usar_multilingue,
-        verbose=True
-    )
+        # Executar busca em duas fases: LOCAL → CACHE
+        resultados, faltantes, metricas_fases = executar_busca_duas_fases(
+            weaviate_manager,
+            estrutura,
+            limite_resultados=limite_resultados,
+            usar_multilingue=usar_multilingue,
+            verbose=True,
+            modo_busca=modo_busca
+        )
 
     # Mapear metadados das queries para facilitar detalhes dos faltantes
     meta_por_id = {q["id"]: q for q in estrutura}
@@ -869,9 +1033,61 @@ def processar_interpretacao(
 
     return saida
 
+def _estatisticas_caches() -> Dict[str, Any]:
+    """Coleta hits/misses dos caches em processo para exposição no health check."""
+    caches: Dict[str, Any] = {}
+    embedding_client = getattr(weaviate_manager, "embedding_client", None)
+    if embedding_client is not None and getattr(embedding_client, "cache", None) is not None:
+        caches["embeddings"] = embedding_client.cache.stats()
+    caches["rerank"] = estatisticas_cache_rerank()
+    if decomposer is not None:
+        caches["decomposicao"] = decomposer.estatisticas_cache()
+    return caches
+
+def _estado_groq() -> Dict[str, Any]:
+    """Saúde das chaves Groq usadas pelo reranker (cooldown após falha)."""
+    try:
+        return obter_pool_groq().estado()
+    except Exception as e:
+        return {"erro": str(e)}
+
+@app.before_request
+def _exigir_servicos_prontos():
+    """Responde 503 (com Retry-After) enquanto a inicialização em background não termina"""
+    _garantir_inicializacao()
+    if _servicos_prontos.is_set() or request.method == "OPTIONS" or request.path in ROTAS_SEM_PRONTIDAO:
+        return None
+    resposta = jsonify({
+        "error": "Serviço inicializando",
+        "status": "not_ready",
+        "inicializacao": _estado_prontidao(),
+        "timestamp": datetime.now().isoformat()
+    })
+    resposta.status_code = 503
+    resposta.headers["Retry-After"] = str(int(max(1, INICIALIZACAO_RETRY_SECONDS)))
+    return resposta
+
+def _estado_prontidao() -> Dict[str, Any]:
+    with _lock_inicializacao:
+        estado = {**_estado_inicializacao, "servicos": dict(_estado_inicializacao["servicos"])}
+    # Supabase indisponível no arranque é reconectado pelo SyncWorker: reportar o estado atual
+    if estado["servicos"]["supabase"] == "indisponivel" and supabase_manager is not None and supabase_manager.is_available():
+        estado["servicos"]["supabase"] = "pronto"
+    return estado
+
+@app.route('/ready', methods=["GET", "HEAD"])
+def readiness_check():
+    """Readiness: 200 só depois de Weaviate, catálogo e decomposer prontos (503 antes disso)"""
+    pronto = _servicos_prontos.is_set()
+    return jsonify({
+        "status": "ready" if pronto else "not_ready",
+        "timestamp": datetime.now().isoformat(),
+        **_estado_prontidao()
+    }), 200 if pronto else 503
+
 @app.route('/health', methods=["GET", "HEAD"])
 def health_check():
-    """Endpoint de health check"""
+    """Endpoint de health check (liveness: responde mesmo durante a inicialização; ver /ready)"""
     try:
         # Verificar se os managers estão funcionais
         weaviate_status = weaviate_manager is not None and weaviate_manager.client is not None
@@ -880,12 +1096,15 @@ def health_check():
         
         return jsonify({
             "status": "healthy",
+            "ready": _servicos_prontos.is_set(),
             "timestamp": datetime.now().isoformat(),
             "services": {
                 "weaviate": weaviate_status,
                 "supabase": supabase_status,
                 "decomposer": decomposer_status
-            }
+            },
+            "caches": _estatisticas_caches(),
+            "groq_keys": _estado_groq()
         }), 200
     except Exception as e:
         logger.error(f"Health check error: {e}")
@@ -935,6 +1154,8 @@ def process_interpretation():
         limite = data.get('limite', LIMITE_PADRAO_RESULTADOS)
         usar_multilingue = data.get('usar_multilingue', True)
         criar_cotacao = data.get('criar_cotacao', False)
+        modo_busca = validar_modo_busca(data.get('modo_busca'))
+        decomposicao_streaming = data.get('decomposicao_streaming')
         
         # Validar limite
         if limite < 1 or limite > LIMITE_MAXIMO_RESULTADOS:
@@ -945,7 +1166,9 @@ def process_interpretation():
             interpretation=interpretation,
             limite_resultados=limite,
             usar_multilingue=usar_multilingue,
-            criar_cotacao=criar_cotacao
+            criar_cotacao=criar_cotacao,
+            modo_busca=modo_busca,
+            decomposicao_streaming=decomposicao_streaming
         )
         
         return jsonify(resultado), 200
@@ -977,50 +1200,28 @@ def hybrid_search():
         filtros = data.get('filtros')
         limite = data.get('limite', LIMITE_PADRAO_RESULTADOS)
         usar_multilingue = data.get('usar_multilingue', True)
+        try:
+            modo_busca = validar_modo_busca(data.get('modo_busca'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Validar limite
         if limite < 1 or limite > LIMITE_MAXIMO_RESULTADOS:
             limite = LIMITE_PADRAO_RESULTADOS
         
-        # Sincronizar dados antes da busca
-        try:
-            if supabase_manager and supabase_manager.is_available():
-                produtos_atualizados = supabase_manager.refresh()
-                if produtos_atualizados:
-                    metricas = weaviate_manager.sincronizar_com_supabase(produtos_atualizados)
-                    if metricas.get("novos", 0) > 0 or metricas.get("removidos", 0) > 0:
-                        logger.info(f"📊 Sincronização híbrida: +{metricas.get('novos', 0)} novos, -{metricas.get('removidos', 0)} removidos")
-        except Exception as e:
-            logger.warning(f"⚠️ Falha ao sincronizar antes da busca híbrida: {e}")
-        
         modelos = weaviate_manager.get_models()
         espacos = ["vetor_portugues"] + (["vetor_multilingue"] if modelos.get("supports_multilingual") and usar_multilingue else [])
         
-        todos_resultados = []
-        
-        # Buscar em todos os espaços
-        for espaco in espacos:
-            resultados = buscar_hibrido_ponderado(
-                weaviate_manager.client,
-                modelos,
-                pesquisa,
-                espaco,
-                limite=limite,
-                filtros=filtros
-            )
-            todos_resultados.extend(resultados)
-        
-        # Agregar por produto mantendo melhor score
-        agregados = {}
-        for item in todos_resultados:
-            categoria = item.get("categoria", "") or item.get("modelo", "")
-            chave = (item["nome"], categoria)
-            atual = agregados.get(chave)
-            if not atual or item["score"] > atual["score"]:
-                agregados[chave] = item
-        
-        lista_final = list(agregados.values())
-        lista_final.sort(key=lambda x: x["score"], reverse=True)
+        # Buscar em todos os espaços e agregar por produto mantendo melhor score
+        lista_final = buscar_candidatos(
+            weaviate_manager.client,
+            modelos,
+            pesquisa,
+            espacos,
+            limite=limite,
+            filtros=filtros,
+            modo_busca=modo_busca
+        )
         
         # Limitar resultados
         lista_final = lista_final[:limite]
@@ -1030,6 +1231,7 @@ def hybrid_search():
             "resultados": lista_final,
             "total_encontrados": len(lista_final),
             "espacos_pesquisados": espacos,
+            "modo_busca": modo_busca,
             "query": pesquisa,
             "filtros": filtros,
             "timestamp": datetime.now().isoformat()
@@ -1046,36 +1248,43 @@ def hybrid_search():
 
 @app.route('/sync-products', methods=['POST'])
 def sync_products():
-    """Sincroniza produtos do Supabase para o Weaviate (incluindo remoções)"""
+    """
+    Sincroniza produtos do Supabase para o Weaviate (incluindo remoções) através do SyncWorker.
+    Por padrão espera a sincronização terminar; com {"aguardar": false} apenas a dispara em background.
+    A sincronização é incremental quando possível; {"completa": true} força a completa.
+    """
     try:
         if not supabase_manager or not supabase_manager.is_available():
             return jsonify({"error": "Supabase não disponível"}), 503
-        
-        # Buscar todos os produtos atuais do Supabase
-        produtos_atualizados = supabase_manager.refresh()
-        
-        if produtos_atualizados is not None:
-            # Sincronização completa (adiciona novos e remove órfãos)
-            metricas = weaviate_manager.sincronizar_com_supabase(produtos_atualizados)
-            logger.info(f"🔄 Sincronização completa: {len(produtos_atualizados)} produtos no Supabase")
-            
-            return jsonify({
-                "status": "success",
-                "produtos_total_supabase": len(produtos_atualizados),
-                "produtos_novos_indexados": metricas.get("novos", 0),
-                "produtos_removidos": metricas.get("removidos", 0),
-                "falhas": metricas.get("falhas", 0),
-                "timestamp": datetime.now().isoformat()
-            }), 200
-        else:
+        if sync_worker is None:
+            return jsonify({"error": "Sincronização não inicializada"}), 503
+
+        data = request.get_json(silent=True) or {}
+        if not data.get("aguardar", True):
+            ja_em_execucao = sync_worker.disparar()
             return jsonify({
-                "status": "success",
-                "produtos_total_supabase": 0,
-                "produtos_novos_indexados": 0,
-                "produtos_removidos": 0,
-                "message": "Nenhum produto encontrado no Supabase",
+                "status": "accepted",
+                "ja_em_execucao": ja_em_execucao,
+                "sync_worker": sync_worker.estado(),
                 "timestamp": datetime.now().isoformat()
-            }), 200
+            }), 202
+
+        resultado = sync_worker.sincronizar_agora(completa=bool(data.get("completa", False)))
+        logger.info(f"🔄 Sincronização completa: {resultado.get('produtos_total_supabase', 0)} produtos no Supabase")
+
+        resposta = {
+            "status": "success",
+            "produtos_total_supabase": resultado.get("produtos_total_supabase", 0),
+            "produtos_novos_indexados": resultado.get("novos", 0),
+            "produtos_atualizados": resultado.get("atualizados", 0),
+            "produtos_removidos": resultado.get("removidos", 0),
+            "falhas": resultado.get("falhas", 0),
+            "modo": resultado.get("modo"),
+            "timestamp": datetime.now().isoformat()
+        }
+        if not resultado.get("produtos_total_supabase"):
+            resposta["message"] = "Nenhum produto encontrado no Supabase"
+        return jsonify(resposta), 200
             
     except Exception as e:
         logger.error(f"Sync error: {e}")
@@ -1095,15 +1304,15 @@ def sync_status():
             "weaviate_available": False,
             "produtos_supabase": 0,
             "produtos_weaviate": 0,
-            "sincronizado": False
+            "sincronizado": False,
+            "sync_worker": sync_worker.estado() if sync_worker is not None else None
         }
         
         # Verificar Supabase
         if supabase_manager and supabase_manager.is_available():
             status["supabase_available"] = True
             try:
-                produtos = supabase_manager.get_produtos()
-                status["produtos_supabase"] = len(produtos) if produtos else 0
+                status["produtos_supabase"] = supabase_manager.total_produtos()
             except Exception as e:
                 logger.warning(f"Erro ao contar produtos Supabase: {e}")
         
@@ -1134,48 +1343,167 @@ def sync_status():
             "timestamp": datetime.now().isoformat()
         }), 500
 
+@app.route('/decomposition-cache/invalidate', methods=['POST'])
+def invalidate_decomposition_cache():
+    """Invalida o cache de decomposições: uma 'solicitacao' específica ou, sem ela, o cache inteiro"""
+    try:
+        if decomposer is None:
+            return jsonify({"error": "Decomposer não disponível"}), 503
+
+        data = request.get_json(silent=True) or {}
+        solicitacao = data.get("solicitacao")
+        removidas = decomposer.invalidar_cache(solicitacao)
+        logger.info(f"🧹 Cache de decomposições invalidado ({'solicitação' if solicitacao else 'completo'}): {removidas} entradas")
+
+        return jsonify({
+            "status": "success",
+            "escopo": "solicitacao" if solicitacao else "completo",
+            "entradas_removidas": removidas,
+            "timestamp": datetime.now().isoformat()
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Decomposition cache error: {e}")
+        return jsonify({
+            "error": "Decomposition cache error",
+            "details": str(e),
+            "status": "error"
+        }), 500
+
+def _gravar_snapshot_catalogo():
+    """Grava o snapshot do catálogo (falhas só são registradas)"""
+    try:
+        salvar_snapshot(supabase_manager, weaviate_manager)
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao gravar snapshot do catálogo: {e}")
+
+def _marcar_servico(nome: str, estado: str):
+    with _lock_inicializacao:
+        _estado_inicializacao["servicos"][nome] = estado
+
 def initialize_services():
-    """Inicializa os serviços necessários"""
-    global weaviate_manager, supabase_manager, decomposer
+    """Inicializa os serviços necessários (idempotente: numa nova tentativa, pula o que já subiu)"""
+    global weaviate_manager, supabase_manager, decomposer, sync_worker
     
     try:
         logger.info("🚀 Inicializando serviços...")
         
         # Inicializar Weaviate
-        weaviate_manager = WeaviateManager()
-        weaviate_manager.connect()
-        weaviate_manager.definir_schema()
-        logger.info("✅ Weaviate conectado")
+        if weaviate_manager is None:
+            _marcar_servico("weaviate", "inicializando")
+            manager = WeaviateManager()
+            manager.connect()
+            manager.definir_schema()
+            weaviate_manager = manager
+            logger.info("✅ Weaviate conectado")
+        _marcar_servico("weaviate", "pronto")
         
-        # Inicializar Supabase
-        supabase_manager = SupabaseManager()
-        if supabase_manager.connect():
-            # Indexar produtos existentes
-            produtos = supabase_manager.get_produtos()
-            if produtos:
-                weaviate_manager.indexar_produtos(produtos)
-                logger.info(f"✅ Supabase conectado - {len(produtos)} produtos indexados")
+        # Inicializar Supabase e o catálogo (snapshot ou indexação página a página)
+        # (o SyncWorker só é criado no fim: se algo falhar antes, a nova tentativa refaz o bloco)
+        if sync_worker is None:
+            _marcar_servico("supabase", "inicializando")
+            if supabase_manager is None:
+                supabase_manager = SupabaseManager()
+            conectado = supabase_manager.is_available() or supabase_manager.connect()
+            _marcar_servico("supabase", "pronto" if conectado else "indisponivel")
+            reconciliar = False
+            if conectado:
+                _marcar_servico("catalogo", "inicializando")
+                if restaurar_snapshot(supabase_manager, weaviate_manager):
+                    # Estado do último sync restaurado: atende já e reconcilia em background
+                    reconciliar = True
+                    logger.info(f"✅ Supabase conectado - {supabase_manager.total_produtos()} produtos restaurados do snapshot")
+                else:
+                    # Indexar produtos existentes, página a página
+                    total = 0
+                    for pagina in supabase_manager.iterar_produtos():
+                        weaviate_manager.indexar_produtos(pagina)
+                        total += len(pagina)
+                    if total:
+                        logger.info(f"✅ Supabase conectado - {total} produtos indexados")
+                        _gravar_snapshot_catalogo()
+                    else:
+                        logger.info("✅ Supabase conectado - nenhum produto encontrado")
+                _marcar_servico("catalogo", "pronto")
             else:
-                logger.info("✅ Supabase conectado - nenhum produto encontrado")
-        else:
-            logger.warning("⚠️ Supabase não disponível")
+                logger.warning("⚠️ Supabase não disponível")
+                _marcar_servico("catalogo", "indisponivel")
+            
+            # Sincronização periódica em background (as buscas não sincronizam mais)
+            sync_worker = SyncWorker(supabase_manager, weaviate_manager, apos_sincronizar=_gravar_snapshot_catalogo)
+            sync_worker.iniciar()
+            if reconciliar:
+                sync_worker.disparar()
         
         # Inicializar Decomposer (GROQ)
-        api_key = os.environ.get("GROQ_API_KEY", GROQ_API_KEY)
-        if not api_key:
-            raise ValueError("GROQ_API_KEY não encontrada")
-        
-        decomposer = SolutionDecomposer(api_key)
-        logger.info("✅ Decomposer (GROQ) inicializado")
+        if decomposer is None:
+            _marcar_servico("decomposer", "inicializando")
+            api_key = os.environ.get("GROQ_API_KEY", GROQ_API_KEY)
+            if not api_key:
+                raise ValueError("GROQ_API_KEY não encontrada")
+            
+            decomposer = SolutionDecomposer(api_key)
+            logger.info("✅ Decomposer (GROQ) inicializado")
+        _marcar_servico("decomposer", "pronto")
         
         logger.info("🎉 Todos os serviços inicializados com sucesso!")
         
     except Exception as e:
         logger.error(f"❌ Erro ao inicializar serviços: {e}")
+        with _lock_inicializacao:
+            for nome, estado in _estado_inicializacao["servicos"].items():
+                if estado == "inicializando":
+                    _estado_inicializacao["servicos"][nome] = "erro"
         raise
 
-# Inicializar serviços quando o módulo for carregado (para Gunicorn, Flask CLI, etc.)
-initialize_services()
+def _aquecer_servicos():
+    """Thread de inicialização: repete initialize_services até dar certo e aquece os embeddings"""
+    with _lock_inicializacao:
+        _estado_inicializacao["inicio"] = datetime.now().isoformat()
+    while True:
+        with _lock_inicializacao:
+            _estado_inicializacao["tentativas"] += 1
+            _estado_inicializacao["fase"] = "inicializando"
+        try:
+            initialize_services()
+            break
+        except Exception as e:
+            with _lock_inicializacao:
+                _estado_inicializacao["fase"] = "erro"
+                _estado_inicializacao["ultimo_erro"] = str(e)[:500]
+            logger.warning(f"⏳ Nova tentativa de inicialização em {INICIALIZACAO_RETRY_SECONDS:g}s")
+            time.sleep(max(1.0, INICIALIZACAO_RETRY_SECONDS))
+    with _lock_inicializacao:
+        _estado_inicializacao["fase"] = "pronto"
+        _estado_inicializacao["pronto_em"] = datetime.now().isoformat()
+        _estado_inicializacao["ultimo_erro"] = None
+    _servicos_prontos.set()
+
+    # Conexão com o Space de embeddings (lazy) aberta antes da primeira busca; não bloqueia a prontidão
+    try:
+        _marcar_servico("embeddings", "inicializando")
+        weaviate_manager._ensure_embedding_client()
+        _marcar_servico("embeddings", "pronto")
+    except Exception as e:
+        _marcar_servico("embeddings", "erro")
+        logger.warning(f"⚠️ Aquecimento do cliente de embeddings falhou (nova tentativa na primeira busca): {e}")
+
+def _garantir_inicializacao():
+    """Inicia a thread de inicialização uma vez por processo (também após fork do Gunicorn)"""
+    global _thread_inicializacao, _pid_inicializacao
+    if _pid_inicializacao == os.getpid() or _servicos_prontos.is_set():
+        return
+    with _lock_inicializacao:
+        if _pid_inicializacao == os.getpid():
+            return
+        _pid_inicializacao = os.getpid()
+        _thread_inicializacao = threading.Thread(target=_aquecer_servicos, name="inicializacao-servicos", daemon=True)
+        _thread_inicializacao.start()
+
+# Inicialização em background ao carregar o módulo (Gunicorn, Flask CLI, etc.): o import não bloqueia
+# e o worker só recebe tráfego quando /ready responder 200
+if INICIALIZACAO_AUTOMATICA:
+    _garantir_inicializacao()
 
 if __name__ == '__main__':
     try:
@@ -1198,6 +1526,8 @@ if __name__ == '__main__':
         logger.error(f"❌ Erro ao iniciar servidor: {e}")
     finally:
         # Cleanup
+        if sync_worker:
+            sync_worker.parar()
         if weaviate_manager:
             weaviate_manager.close()
         logger.info("🧹 Recursos liberados")
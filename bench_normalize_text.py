@@ -0,0 +1,57 @@
+"""
+Microbenchmark de text_utils.normalize_text.
+
+Compara o custo por chamada da implementação sem memoização (_normalize_text_impl)
+com normalize_text (memoização LRU), sobre texto de catálogo.
+
+Uso: python bench_normalize_text.py [repeticoes]
+"""
+import sys
+import timeit
+
+from text_utils import normalize_text, _normalize_text_impl, _normalize_text_cache
+
+
+# Amostra realista: nomes, categorias, tags e descrições do catálogo + termos de query
+NOMES = [
+    "Impressora HP LaserJet Pro M404dn", "Computador Portátil Dell Latitude 5440 i7",
+    "Switch Cisco Catalyst 9200L 24 portas PoE+", "Câmara IP Hikvision DS-2CD2143G2-I 4MP",
+    "Servidor HPE ProLiant DL380 Gen10", "Router Wi‑Fi 6 TP-Link Archer AX55",
+    "Licença Microsoft 365 Business Standard", "Quiosque de Autoatendimento 21,5\"",
+]
+CATEGORIAS = [
+    "Hardware de Posto de Trabalho", "Hardware de Servidores e Storage", "Networking",
+    "Videovigilância (CCTV)", "Software de Produtividade e Colaboração", "Quiosques e Autoatendimento",
+]
+TAGS = ["impressora laser", "wi-fi", "poe", "4k", "duplex", "38 ppm", "nvme", "ddr4", "a4"]
+DESCRICOES = [
+    "Impressora laser monocromática, 38 ppm, impressão duplex automática, conectividade Wi‑Fi e Ethernet.",
+    "Portátil empresarial com processador Intel® Core™ i7, 16GB DDR4, SSD NVMe 512GB e ecrã 14\" FHD.",
+    "Câmara bullet com visão nocturna IR até 40 m, compressão H.265+ e protecção IP67 — ideal para exterior.",
+]
+QUERY_TERMOS = ["impressora", "laser", "38 ppm", "duplex", "wifi", "computador", "i7", "16gb", "poe"]
+
+AMOSTRA = NOMES + CATEGORIAS + TAGS + DESCRICOES + QUERY_TERMOS
+
+
+def _por_chamada(funcao, repeticoes: int) -> float:
+    tempo = timeit.timeit(lambda: [funcao(t) for t in AMOSTRA], number=repeticoes)
+    return tempo / (repeticoes * len(AMOSTRA)) * 1e6
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    sem_cache = _por_chamada(_normalize_text_impl, repeticoes)
+    if hasattr(_normalize_text_cache, "cache_clear"):
+        _normalize_text_cache.cache_clear()
+    memoizado = _por_chamada(normalize_text, repeticoes)
+
+    print(f"📏 {len(AMOSTRA)} textos x {repeticoes} repetições")
+    print(f"   sem memoização:             {sem_cache:7.2f} µs/chamada")
+    print(f"   normalize_text (memoizado): {memoizado:7.2f} µs/chamada")
+    print(f"   ganho: {sem_cache / memoizado:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
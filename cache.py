@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class LRUCache:
+    """Cache em memória, thread-safe, com despejo LRU e TTL opcional."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = max(0, int(maxsize))
+        self.ttl = ttl
+        self._dados: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chave: Any, default: Any = None) -> Any:
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                self.misses += 1
+                return default
+            criado_em, valor = item
+            if self.ttl is not None and time.time() - criado_em > self.ttl:
+                del self._dados[chave]
+                self.misses += 1
+                return default
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def set(self, chave: Any, valor: Any):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._dados[chave] = (time.time(), valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+
+    def delete(self, chave: Any) -> bool:
+        with self._lock:
+            return self._dados.pop(chave, None) is not None
+
+    def clear(self) -> int:
+        with self._lock:
+            removidas = len(self._dados)
+            self._dados.clear()
+            return removidas
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._dados)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "itens": len(self._dados),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class SQLiteStore:
+    """Armazenamento chave→JSON persistido em SQLite, com TTL opcional por leitura."""
+
+    def __init__(self, caminho: str, tabela: str = "cache", ttl: float | None = None):
+        self.caminho = caminho
+        self.tabela = tabela
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        pasta = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(pasta, exist_ok=True)
+        self._conn = sqlite3.connect(caminho, timeout=10, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {tabela} (chave TEXT PRIMARY KEY, valor TEXT NOT NULL, criado_em REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, chave: str) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT valor, criado_em FROM {self.tabela} WHERE chave = ?", (chave,)
+            ).fetchone()
+        if not row:
+            return None
+        valor, criado_em = row
+        if self.ttl is not None and time.time() - criado_em > self.ttl:
+            self.delete(chave)
+            return None
+        return json.loads(valor)
+
+    def set(self, chave: str, valor: Any):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.tabela} (chave, valor, criado_em) VALUES (?, ?, ?)",
+                (chave, json.dumps(valor, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, chave: str) -> int:
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM {self.tabela} WHERE chave = ?", (chave,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM {self.tabela}")
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CacheDuasCamadas(ABC):
+    """
+    Cache em duas camadas: memória (LRU) e, opcionalmente, disco (SQLite) que sobrevive a reinícios,
+    ambas com o mesmo TTL opcional. As subclasses definem apenas `chave(texto, contexto)`.
+    """
+
+    tabela = "cache"
+    descricao = "cache"
+
+    def __init__(self, maxsize: int, ttl: float | None = None, caminho_disco: str | None = None):
+        self.memoria = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.disco: Optional[SQLiteStore] = None
+        if caminho_disco:
+            try:
+                self.disco = SQLiteStore(caminho_disco, tabela=self.tabela, ttl=ttl)
+            except Exception as e:
+                print(f"⚠️ Cache de {self.descricao} em disco indisponível ({caminho_disco}): {e}")
+        self._lock = threading.Lock()
+        self.hits_disco = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    @abstractmethod
+    def chave(texto: str, contexto: str) -> str:
+        """Chave do cache para o texto no contexto (modelo, versão do prompt...)."""
+
+    def get(self, texto: str, contexto: str) -> Any:
+        chave = self.chave(texto, contexto)
+        valor = self.memoria.get(chave)
+        if valor is None and self.disco is not None:
+            try:
+                valor = self.disco.get(chave)
+            except Exception as e:
+                print(f"⚠️ Falha ao ler cache de {self.descricao} em disco: {e}")
+                valor = None
+            if valor is not None:
+                with self._lock:
+                    self.hits_disco += 1
+                self.memoria.set(chave, valor)
+        with self._lock:
+            if valor is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return valor
+
+    def set(self, texto: str, contexto: str, valor: Any):
+        chave = self.chave(texto, contexto)
+        self.memoria.set(chave, valor)
+        if self.disco is not None:
+            try:
+                self.disco.set(chave, valor)
+            except Exception as e:
+                print(f"⚠️ Falha ao gravar cache de {self.descricao} em disco: {e}")
+
+    def clear(self) -> int:
+        """Esvazia as duas camadas; devolve o nº de entradas removidas (o disco guarda todas as gravadas)."""
+        removidas = self.memoria.clear()
+        if self.disco is not None:
+            try:
+                removidas = max(removidas, self.disco.clear())
+            except Exception as e:
+                print(f"⚠️ Falha ao limpar cache de {self.descricao} em disco: {e}")
+        return removidas
+
+    def stats(self) -> Dict[str, Any]:
+        itens = len(self.memoria)
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "itens_memoria": itens,
+                "maxsize": self.memoria.maxsize,
+                "ttl": self.ttl,
+                "disco": self.disco.caminho if self.disco is not None else None,
+                "hits": self.hits,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class EmbeddingCache(CacheDuasCamadas):
+    """Cache de embeddings endereçado por conteúdo: chave = (model_choice, sha256 do texto normalizado)."""
+
+    tabela = "embeddings"
+    descricao = "embeddings"
+
+    def __init__(self, maxsize: int = 4096, caminho_disco: str | None = None):
+        super().__init__(maxsize=maxsize, caminho_disco=caminho_disco)
+
+    @staticmethod
+    def chave(texto: str, model_choice: str) -> str:
+        texto_norm = " ".join(str(texto).split())
+        digest = hashlib.sha256(texto_norm.encode("utf-8")).hexdigest()
+        return f"{model_choice}:{digest}"
+
+
+class DecompositionCache(CacheDuasCamadas):
+    """
+    Cache de decomposições (brief) endereçado pela solicitação: chave = (versão do prompt,
+    sha256 do texto normalizado). Guarda o resultado já validado, serializado como dict.
+    """
+
+    tabela = "decomposicoes"
+    descricao = "decomposições"
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = None, caminho_disco: str | None = None):
+        super().__init__(maxsize=maxsize, ttl=ttl, caminho_disco=caminho_disco)
+
+    @staticmethod
+    def chave(texto: str, versao: str) -> str:
+        texto_norm = " ".join(str(texto).split()).lower()
+        digest = hashlib.sha256(texto_norm.encode("utf-8")).hexdigest()
+        return f"{versao}:{digest}"
+
+    def invalidar(self, texto: str | None = None, versao: str | None = None) -> int:
+        """Remove a entrada de uma solicitação (texto + versão) ou, sem texto, todo o cache."""
+        if texto is None or versao is None:
+            return self.clear()
+        chave = self.chave(texto, versao)
+        existia = self.memoria.delete(chave)
+        if self.disco is not None:
+            try:
+                existia = self.disco.delete(chave) > 0 or existia
+            except Exception as e:
+                print(f"⚠️ Falha ao invalidar cache de decomposições em disco: {e}")
+        return int(existia)
@@ -0,0 +1,155 @@
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+# Import robusto das configurações
+try:
+    from config import STOPWORDS_PT, RERANK_DESC_MAX_CHARS, RERANK_ORCAMENTO_TOKENS
+except ImportError:
+    try:
+        from .config import STOPWORDS_PT, RERANK_DESC_MAX_CHARS, RERANK_ORCAMENTO_TOKENS
+    except ImportError:
+        print("⚠️ Erro ao importar configurações do compactador. Usando valores padrão.")
+        STOPWORDS_PT = set()
+        RERANK_DESC_MAX_CHARS, RERANK_ORCAMENTO_TOKENS = 400, 2500
+
+try:
+    from text_utils import normalize_text
+except ImportError:
+    from .text_utils import normalize_text
+
+# Frases de descrição sem valor para a decisão (texto normalizado). Só frases completas: palavras
+# soltas como "oferta" ou "fatura" também descrevem produtos (ex.: software de faturação)
+BOILERPLATE = (
+    "imagem meramente ilustrativa", "imagens meramente ilustrativas", "imagem ilustrativa",
+    "sujeito a disponibilidade", "consulte disponibilidade", "consulte-nos", "entre em contacto",
+    "entre em contato", "pronta entrega", "envio imediato", "entrega gratis", "portes gratis",
+    "compre ja", "compre agora", "melhor preco", "100 novo", "iva incluido",
+)
+_RE_BOILERPLATE = re.compile(r"\b(?:" + "|".join(re.escape(b) for b in BOILERPLATE) + r")\b")
+
+# Separadores de trechos: fim de frase, quebras de linha, marcadores e barras verticais
+_RE_SEGMENTOS = re.compile(r"(?<=[.;!?])\s+|\s*[\n\r•|]+\s*")
+_RE_NUMERO = re.compile(r"\d")
+
+# Reduções sucessivas do limite de descrição até caber no orçamento de tokens
+_LIMITES_DESCRICAO = (1.0, 0.6, 0.35, 0.2, 0.0)
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa grosseira de tokens (≈ 4 caracteres por token)."""
+    return (len(texto) + 3) // 4
+
+
+def _termos_query(query: str) -> List[str]:
+    return [t for t in normalize_text(query).split() if t not in STOPWORDS_PT and len(t) > 1]
+
+
+def compactar_descricao(descricao: str, nome: str, termos: List[str], max_chars: int) -> str:
+    """
+    Reduz a descrição aos trechos úteis para a decisão: remove boilerplate, trechos repetidos ou
+    iguais ao nome, e prioriza trechos com termos da query (palavras inteiras), o primeiro trecho
+    descritivo (sem números: costuma dizer o tipo de produto) e depois trechos com especificações
+    (números/unidades). Os trechos escolhidos mantêm a ordem original.
+    """
+    if not descricao or max_chars <= 0:
+        return ""
+    nome_norm = normalize_text(nome)
+    vistos = set()
+    trechos: List[Tuple[int, int, int, str]] = []  # (prioridade, -hits, posição, texto)
+    descritivo_visto = False
+    for pos, trecho in enumerate(_RE_SEGMENTOS.split(str(descricao))):
+        trecho = " ".join(trecho.split()).strip(" -;,.")
+        if not trecho:
+            continue
+        norm = normalize_text(trecho)
+        if not norm or norm in vistos or norm == nome_norm:
+            continue
+        vistos.add(norm)
+        palavras = set(norm.split())
+        hits = sum(1 for t in termos if t in palavras)
+        if not hits and _RE_BOILERPLATE.search(norm):
+            continue  # trecho com termos da query nunca é descartado
+        tem_spec = bool(_RE_NUMERO.search(norm))
+        if hits:
+            prioridade = 0
+        elif not tem_spec and not descritivo_visto:
+            prioridade = 1  # primeiro trecho descritivo: o tipo de produto, antes das especificações
+        else:
+            prioridade = 2 if tem_spec else 3
+        descritivo_visto = descritivo_visto or not tem_spec
+        trechos.append((prioridade, -hits, pos, trecho))
+
+    if not trechos:
+        return ""
+    escolhidos: List[Tuple[int, str]] = []
+    usado = 0
+    for prioridade, _, pos, trecho in sorted(trechos):
+        if prioridade == 3 and escolhidos:
+            break  # texto corrido sem termos nem especificações só entra se não houver mais nada
+        custo = len(trecho) + (2 if escolhidos else 0)
+        if usado + custo > max_chars:
+            if not escolhidos:
+                escolhidos.append((pos, trecho[:max_chars]))
+                usado = max_chars
+            continue
+        escolhidos.append((pos, trecho))
+        usado += custo
+    return "; ".join(t for _, t in sorted(escolhidos))
+
+
+def compactar_candidatos(candidatos: List[Dict[str, Any]], query: str = "", max_desc_chars: int | None = None, orcamento_tokens: int | None = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Prepara os candidatos para o prompt do reranker.
+    - descrições compactadas por compactar_descricao (limite max_desc_chars)
+    - descrições idênticas a um candidato anterior viram referência ("= candidato N")
+    - se o JSON passar de `orcamento_tokens`, encurta as descrições e, em último caso, corta os
+      candidatos do fim da lista (os de menor score); o campo "index" continua o original
+    Devolve (compacts, info) com contagens e o tamanho estimado em tokens.
+    """
+    max_desc_chars = RERANK_DESC_MAX_CHARS if max_desc_chars is None else max_desc_chars
+    orcamento_tokens = RERANK_ORCAMENTO_TOKENS if orcamento_tokens is None else orcamento_tokens
+    termos = _termos_query(query)
+
+    def _montar(limite_desc: int) -> Tuple[List[Dict[str, Any]], int]:
+        compacts: List[Dict[str, Any]] = []
+        primeira_ocorrencia: Dict[str, int] = {}
+        duplicadas = 0
+        for i, c in enumerate(candidatos):
+            nome = c.get("nome", "")
+            descricao = compactar_descricao(c.get("descricao_geral") or c.get("descricao") or "", nome, termos, limite_desc)
+            chave = normalize_text(descricao)
+            if chave and chave in primeira_ocorrencia:
+                descricao = f"= candidato {primeira_ocorrencia[chave]}"
+                duplicadas += 1
+            elif chave:
+                primeira_ocorrencia[chave] = i
+            compacts.append({
+                "index": i,
+                "id": c.get("produto_id", ""),
+                "nome": nome,
+                "categoria": c.get("categoria_geral") or c.get("categoria") or "",
+                "descricao": descricao,
+                "preço": c.get("preco"),
+                "estoque": c.get("estoque"),
+            })
+        return compacts, duplicadas
+
+    compacts, duplicadas = [], 0
+    for fator in _LIMITES_DESCRICAO:
+        compacts, duplicadas = _montar(int(max_desc_chars * fator))
+        if estimar_tokens(json.dumps(compacts, ensure_ascii=False)) <= orcamento_tokens:
+            break
+    omitidos = 0
+    while len(compacts) > 1 and estimar_tokens(json.dumps(compacts, ensure_ascii=False)) > orcamento_tokens:
+        compacts.pop()
+        omitidos += 1
+
+    info = {
+        "candidatos_recebidos": len(candidatos),
+        "candidatos_enviados": len(compacts),
+        "candidatos_omitidos": omitidos,
+        "descricoes_duplicadas": duplicadas,
+        "tokens_candidatos": estimar_tokens(json.dumps(compacts, ensure_ascii=False)),
+    }
+    return compacts, info
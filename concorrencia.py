@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List
+
+# Import robusto das configurações
+try:
+    from config import CONCORRENCIA_WEAVIATE, CONCORRENCIA_HF, CONCORRENCIA_GROQ, RECUPERACAO_MAX_WORKERS
+except ImportError:
+    try:
+        from .config import CONCORRENCIA_WEAVIATE, CONCORRENCIA_HF, CONCORRENCIA_GROQ, RECUPERACAO_MAX_WORKERS
+    except ImportError:
+        print("⚠️ Erro ao importar limites de concorrência. Usando valores padrão.")
+        CONCORRENCIA_WEAVIATE, CONCORRENCIA_HF, CONCORRENCIA_GROQ = 8, 2, 3
+        RECUPERACAO_MAX_WORKERS = 16
+
+# Semáforos por backend, compartilhados por todas as threads do processo
+_SEMAFOROS: Dict[str, threading.BoundedSemaphore] = {
+    "weaviate": threading.BoundedSemaphore(max(1, CONCORRENCIA_WEAVIATE)),
+    "hf": threading.BoundedSemaphore(max(1, CONCORRENCIA_HF)),
+    "groq": threading.BoundedSemaphore(max(1, CONCORRENCIA_GROQ)),
+}
+
+# Pool compartilhado para recuperações independentes dentro de uma busca (ex.: BM25 em paralelo
+# ao embedding). Separado do pool de queries para que tarefas internas nunca esperem por vagas
+# ocupadas pelas próprias queries que as submeteram.
+_POOL_RECUPERACAO = ThreadPoolExecutor(
+    max_workers=max(1, RECUPERACAO_MAX_WORKERS),
+    thread_name_prefix="recuperacao",
+)
+
+
+@contextmanager
+def limitar(backend: str):
+    """Limita o nº de chamadas simultâneas ao backend ('weaviate', 'hf' ou 'groq')."""
+    semaforo = _SEMAFOROS.get(backend)
+    if semaforo is None:
+        yield
+        return
+    with semaforo:
+        yield
+
+
+def executar_em_paralelo(funcao: Callable[[Any], Any], itens: Iterable[Any], max_workers: int, prefixo: str = "worker") -> List[Any]:
+    """
+    Aplica `funcao` a cada item num pool de threads limitado e devolve os resultados
+    na mesma ordem dos itens. Exceções são propagadas como no laço sequencial.
+    """
+    itens = list(itens)
+    if max_workers <= 1 or len(itens) <= 1:
+        return [funcao(item) for item in itens]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(itens)), thread_name_prefix=prefixo) as pool:
+        return list(pool.map(funcao, itens))
+
+
+def submeter_recuperacao(funcao: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Agenda uma chamada de recuperação no pool compartilhado e devolve o Future."""
+    return _POOL_RECUPERACAO.submit(funcao, *args, **kwargs)
@@ -56,18 +56,97 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 WEAVIATE_HOST = os.environ.get("WEAVIATE_HOST")
 WEAVIATE_PORT = 8080
 WEAVIATE_GRPC_PORT = 50051
+# Objetos por requisição no batch de ingestão (indexar_produtos)
+WEAVIATE_BATCH_SIZE = int(os.environ.get("WEAVIATE_BATCH_SIZE", 100))
+# Validade (s) do conjunto de produto_ids obtido na última varredura da coleção; dentro dela a
+# limpeza de órfãos e produto_existe não consultam o Weaviate
+WEAVIATE_IDS_CACHE_TTL = float(os.environ.get("WEAVIATE_IDS_CACHE_TTL", 3600))
 API_KEY_WEAVIATE = os.environ.get("API_KEY_WEAVIATE")
 
 # --- CONFIGURAÇÃO DE BUSCA ---
 LIMITE_PADRAO_RESULTADOS = 4
 LIMITE_MAXIMO_RESULTADOS = 50
+# Modo de recuperação: 'por_espaco' (uma busca por vetor nomeado), 'multivetor'
+# (uma consulta multi-target vectors + um BM25) ou 'hibrido_nativo' (fusão no Weaviate)
+MODO_BUSCA = os.environ.get("MODO_BUSCA", "por_espaco")
+# Junção das distâncias no modo multivetor: minimum, average, sum ou relative_score
+MULTIVETOR_COMBINACAO = os.environ.get("MULTIVETOR_COMBINACAO", "minimum")
+# Entradas memoizadas de normalize_text (0 desativa a memoização)
+NORMALIZE_CACHE_SIZE = int(os.environ.get("NORMALIZE_CACHE_SIZE", 16384))
+# Pontuação dos candidatos em lote (NumPy); 'false' volta ao cálculo objeto a objeto
+SCORER_VETORIZADO = os.environ.get("SCORER_VETORIZADO", "true").lower() in ("1", "true", "yes", "sim")
+
+# --- INICIALIZAÇÃO DOS SERVIÇOS ---
+# Conexões (Weaviate, Supabase, GROQ) e catálogo são preparados numa thread em background;
+# 'false' adia o início para a primeira requisição
+INICIALIZACAO_AUTOMATICA = os.environ.get("INICIALIZACAO_AUTOMATICA", "true").lower() in ("1", "true", "yes", "sim")
+# Segundos entre tentativas quando a inicialização falha
+INICIALIZACAO_RETRY_SECONDS = float(os.environ.get("INICIALIZACAO_RETRY_SECONDS", 30))
+
+# --- SINCRONIZAÇÃO SUPABASE → WEAVIATE ---
+# Intervalo (segundos) da sincronização em background; 0 = apenas sob demanda (POST /sync-products)
+SYNC_INTERVAL_SECONDS = float(os.environ.get("SYNC_INTERVAL_SECONDS", 300))
+# Coluna de atualização usada como watermark da sincronização incremental (ausente = sempre completa)
+SYNC_COLUNA_WATERMARK = os.environ.get("SYNC_COLUNA_WATERMARK", "updated_at")
+# Uma sincronização completa a cada N incrementais (0 = só quando a incremental não for possível)
+SYNC_COMPLETA_A_CADA = int(os.environ.get("SYNC_COMPLETA_A_CADA", 12))
+# Linhas por página na leitura do catálogo (keyset por id); não passar do max-rows do PostgREST (1000)
+SUPABASE_PAGINA = int(os.environ.get("SUPABASE_PAGINA", 1000))
+# Colunas lidas para indexação (as que não existirem na tabela são ignoradas)
+SUPABASE_COLUNAS = [
+    c.strip() for c in os.environ.get(
+        "SUPABASE_COLUNAS", "id,nome,descricao,categoria,modelo,tags,preco,estoque,origem"
+    ).split(",") if c.strip()
+]
+# Snapshot do catálogo (ids, watermark e versão dos modelos) gravado após cada sincronização; permite
+# arrancar sem a passada completa de indexação (vazio = desativado)
+CATALOGO_SNAPSHOT_PATH = os.environ.get(
+    "CATALOGO_SNAPSHOT_PATH", str(Path(__file__).parent / "cache" / "catalogo.json.gz")
+)
 
 # --- MODELOS DE EMBEDDING ---
 MODELO_PT = 'neuralmind/bert-base-portuguese-cased'
 MODELO_MULTI = 'paraphrase-multilingual-mpnet-base-v2'
+# Versão dos embeddings gravada no hash_conteudo; incrementar força o recálculo de todo o catálogo
+EMBEDDING_VERSAO = os.environ.get("EMBEDDING_VERSAO", "1")
+# Cache de embeddings: nº de vetores em memória (LRU) e arquivo SQLite opcional (vazio = apenas memória)
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 4096))
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "")
 
 # --- CONFIGURAÇÃO GROQ ---
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+# Chaves tentadas pelo reranker, em ordem (as ausentes do ambiente são ignoradas)
+GROQ_KEY_NAMES = ["GROQ_API_KEY", "_GROQ_API_KEY", "__GROQ_API_KEY"]
+# Segundos que uma chave que falhou fica fora da rotação
+GROQ_KEY_COOLDOWN = float(os.environ.get("GROQ_KEY_COOLDOWN", 60))
+GROQ_TIMEOUT = float(os.environ.get("GROQ_TIMEOUT", 60))
+# Cache de rerank (mesma query + mesmos candidatos => mesma resposta com temperature=0)
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", 512))
+RERANK_CACHE_TTL = float(os.environ.get("RERANK_CACHE_TTL", 3600))
+# Rerank: 'individual' (uma chamada por query) ou 'lote' (várias queries por chamada)
+RERANK_MODO = os.environ.get("RERANK_MODO", "individual")
+RERANK_LOTE_MAX_QUERIES = int(os.environ.get("RERANK_LOTE_MAX_QUERIES", 4))
+# Tamanho máximo (caracteres) de prompt + mensagem num lote; acima disso, chamadas individuais
+RERANK_LOTE_MAX_CHARS = int(os.environ.get("RERANK_LOTE_MAX_CHARS", 60000))
+RERANK_LOTE_MAX_TOKENS = int(os.environ.get("RERANK_LOTE_MAX_TOKENS", 16384))
+# Compactação dos candidatos no prompt do reranker
+RERANK_COMPACTAR = os.environ.get("RERANK_COMPACTAR", "true").lower() in ("1", "true", "yes", "sim")
+RERANK_DESC_MAX_CHARS = int(os.environ.get("RERANK_DESC_MAX_CHARS", 400))
+# Orçamento (tokens estimados) para a lista de candidatos de uma query
+RERANK_ORCAMENTO_TOKENS = int(os.environ.get("RERANK_ORCAMENTO_TOKENS", 2500))
+# Gate de confiança: aceita o 1º candidato sem LLM quando o modelo pedido bate e a vantagem é clara
+RERANK_GATE_ATIVO = os.environ.get("RERANK_GATE_ATIVO", "false").lower() in ("1", "true", "yes", "sim")
+RERANK_GATE_MIN_TEXTUAL = float(os.environ.get("RERANK_GATE_MIN_TEXTUAL", 0.8))
+RERANK_GATE_MIN_MARGEM = float(os.environ.get("RERANK_GATE_MIN_MARGEM", 0.15))
+# Cache de decomposições (mesma solicitação + mesma versão do prompt => mesmo brief)
+DECOMPOSICAO_CACHE_SIZE = int(os.environ.get("DECOMPOSICAO_CACHE_SIZE", 256))
+DECOMPOSICAO_CACHE_TTL = float(os.environ.get("DECOMPOSICAO_CACHE_TTL", 7 * 24 * 3600))
+# Arquivo SQLite do cache (vazio = apenas memória)
+DECOMPOSICAO_CACHE_PATH = os.environ.get(
+    "DECOMPOSICAO_CACHE_PATH", str(Path(__file__).parent / "cache" / "decomposicoes.sqlite")
+)
+# Decomposição em streaming: a busca de cada item começa assim que ele chega da LLM
+DECOMPOSICAO_STREAMING = os.environ.get("DECOMPOSICAO_STREAMING", "false").lower() in ("1", "true", "yes", "sim")
 
 # --- SINÔNIMOS E EQUIVALÊNCIAS ---
 SYNONYMS = {
@@ -92,4 +171,14 @@ CATEGORY_EQUIV = {
     "servico": ["servico", "cloud", "suporte"],
 }
 
-STOPWORDS_PT = {'a', 'o', 'as', 'os', 'um', 'uma', 'de', 'do', 'da', 'e', 'ou', 'para', 'com', 'em', 'no', 'na'}
\ No newline at end of file
+STOPWORDS_PT = {'a', 'o', 'as', 'os', 'um', 'uma', 'de', 'do', 'da', 'e', 'ou', 'para', 'com', 'em', 'no', 'na'}
+
+# --- CONCORRÊNCIA ---
+# Nº de queries (Q1..QN) executadas em paralelo por requisição (1 = sequencial)
+QUERIES_MAX_WORKERS = int(os.environ.get("QUERIES_MAX_WORKERS", 4))
+# Máximo de chamadas simultâneas por backend, somando todas as requisições do processo
+CONCORRENCIA_WEAVIATE = int(os.environ.get("CONCORRENCIA_WEAVIATE", 8))
+CONCORRENCIA_HF = int(os.environ.get("CONCORRENCIA_HF", 2))
+CONCORRENCIA_GROQ = int(os.environ.get("CONCORRENCIA_GROQ", 3))
+# Threads do pool partilhado de recuperações internas de uma busca (ex.: BM25 em paralelo ao embedding)
+RECUPERACAO_MAX_WORKERS = int(os.environ.get("RECUPERACAO_MAX_WORKERS", 16))
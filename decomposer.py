@@ -1,42 +1,32 @@
+import hashlib
 import json
+import re
+import textwrap
 import yaml
 import instructor
 from groq import Groq
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from enum import Enum
 
 # Imports robustos
 try:
-    from models import DecompositionResult
+    from models import DecompositionResult, ComponenteParaAquisicao
     from utils import validate_and_fix_result, create_fallback_decomposition
+    from cache import DecompositionCache
+    from config import DECOMPOSICAO_CACHE_SIZE, DECOMPOSICAO_CACHE_TTL, DECOMPOSICAO_CACHE_PATH
 except ImportError:
     try:
-        from .models import DecompositionResult
+        from .models import DecompositionResult, ComponenteParaAquisicao
         from .utils import validate_and_fix_result, create_fallback_decomposition
+        from .cache import DecompositionCache
+        from .config import DECOMPOSICAO_CACHE_SIZE, DECOMPOSICAO_CACHE_TTL, DECOMPOSICAO_CACHE_PATH
     except ImportError as e:
         print(f"⚠️ Erro ao importar módulos locais no decomposer: {e}")
         raise
 
-class SolutionDecomposer:
-    def __init__(self, groq_api_key: str):
-        """Inicializa o decomposer com a API do Groq"""
-        self.groq_client = instructor.from_groq(
-            Groq(api_key=groq_api_key)
-        )
-        self.groq_simple = Groq(api_key=groq_api_key)
+MODELO_DECOMPOSICAO = "openai/gpt-oss-20b"
 
-    def decompose_request(self, main_request: str) -> DecompositionResult:
-        """
-        Decompõe uma solicitação complexa em componentes menores
-        
-        Args:
-            main_request (str): Solicitação principal do cliente
-            
-        Returns:
-            DecompositionResult: Resultado estruturado da decomposição
-        """
-        
-        decomposition_prompt = """
+PROMPT_DECOMPOSICAO = """
         Você é um especialista em soluções tecnológicas. Sua tarefa é decompor uma solicitação de cliente empresarial em um YAML altamente estruturado. 
 
         Seu objetivo é retornar EXCLUSIVAMENTE um YAML válido e completo, compatível com o schema abaixo. Não adicione comentários nem formatação Markdown.
@@ -91,11 +81,163 @@ class SolutionDecomposer:
 
         """
 
+# Versão do prompt: muda sempre que o prompt ou o modelo mudam, invalidando as entradas antigas do cache
+VERSAO_PROMPT_DECOMPOSICAO = hashlib.sha256(f"{MODELO_DECOMPOSICAO}\n{PROMPT_DECOMPOSICAO}".encode("utf-8")).hexdigest()[:16]
+
+
+_RE_INICIO_ITENS = re.compile(r"^\s*itens_a_comprar\s*:\s*$")
+
+
+class _LeitorItensYAML:
+    """
+    Extrai os itens de 'itens_a_comprar' de um YAML que chega aos pedaços (streaming).
+    Um item está completo quando começa o próximo item da lista ou quando a lista termina
+    (linha com indentação menor, ou chave no mesmo nível dos marcadores "- ").
+    Cada item completo é validado como ComponenteParaAquisicao; itens inválidos são ignorados
+    aqui e ficam para a validação do YAML completo.
+    """
+
+    def __init__(self):
+        self._pendente = ""
+        self._na_lista = False
+        self._indent_lista = 0
+        self._indent_item: Optional[int] = None
+        self._linhas_item: List[str] = []
+        self._posicao = 0
+
+    def alimentar(self, pedaco: str) -> List[Tuple[int, ComponenteParaAquisicao]]:
+        """Recebe um pedaço do texto e devolve os itens que ficaram completos, como (índice 1..N, item)."""
+        self._pendente += pedaco
+        if "\n" not in self._pendente:
+            return []
+        completas, self._pendente = self._pendente.rsplit("\n", 1)
+        itens = []
+        for linha in completas.split("\n"):
+            item = self._processar_linha(linha)
+            if item is not None:
+                itens.append(item)
+        return itens
+
+    def finalizar(self) -> List[Tuple[int, ComponenteParaAquisicao]]:
+        """Fim do stream: processa a última linha e fecha o item em aberto."""
+        itens = []
+        if self._pendente:
+            item = self._processar_linha(self._pendente)
+            self._pendente = ""
+            if item is not None:
+                itens.append(item)
+        if self._na_lista:
+            item = self._fechar_item()
+            self._na_lista = False
+            if item is not None:
+                itens.append(item)
+        return itens
+
+    def _processar_linha(self, linha: str) -> Optional[Tuple[int, ComponenteParaAquisicao]]:
+        conteudo = linha.strip()
+        if not self._na_lista:
+            if _RE_INICIO_ITENS.match(linha):
+                self._na_lista = True
+                self._indent_lista = len(linha) - len(linha.lstrip(" "))
+            return None
+        if not conteudo or conteudo.startswith("#") or conteudo.startswith("```"):
+            if self._linhas_item:
+                self._linhas_item.append("")
+            return None
+
+        indent = len(linha) - len(linha.lstrip(" "))
+        marcador = conteudo == "-" or conteudo.startswith("- ")
+        if self._indent_item is None:
+            if marcador and indent >= self._indent_lista:
+                self._indent_item = indent
+                self._linhas_item = [linha]
+            else:
+                self._na_lista = False  # lista vazia
+            return None
+        if indent == self._indent_item and marcador:
+            fechado = self._fechar_item()
+            self._linhas_item = [linha]
+            return fechado
+        if indent <= self._indent_item:
+            fechado = self._fechar_item()
+            self._na_lista = False
+            return fechado
+        self._linhas_item.append(linha)
+        return None
+
+    def _fechar_item(self) -> Optional[Tuple[int, ComponenteParaAquisicao]]:
+        if not self._linhas_item:
+            return None
+        linhas, self._linhas_item = self._linhas_item, []
+        self._posicao += 1
+        # "- nome: x" vira "  nome: x" para o bloco ser lido como um mapeamento
+        i = self._indent_item or 0
+        linhas[0] = linhas[0][:i] + linhas[0][i:].replace("-", " ", 1)
+        try:
+            # o "\n" final preserva o fim de linha de um bloco (| ou >) que termine o item
+            dados = yaml.safe_load(textwrap.dedent("\n".join(linhas) + "\n"))
+            return self._posicao, ComponenteParaAquisicao.model_validate(dados)
+        except Exception as e:
+            print(f"⚠️ Item {self._posicao} do streaming incompleto ou inválido; aguardando o YAML completo: {e}")
+            return None
+
+
+class SolutionDecomposer:
+    def __init__(self, groq_api_key: str):
+        """Inicializa o decomposer com a API do Groq"""
+        self.groq_client = instructor.from_groq(
+            Groq(api_key=groq_api_key)
+        )
+        self.groq_simple = Groq(api_key=groq_api_key)
+        self.cache = DecompositionCache(
+            maxsize=DECOMPOSICAO_CACHE_SIZE,
+            ttl=DECOMPOSICAO_CACHE_TTL,
+            caminho_disco=DECOMPOSICAO_CACHE_PATH or None,
+        )
+
+    def decompose_request(self, main_request: str) -> DecompositionResult:
+        """
+        Decompõe uma solicitação complexa em componentes menores
+        
+        Args:
+            main_request (str): Solicitação principal do cliente
+            
+        Returns:
+            DecompositionResult: Resultado estruturado da decomposição
+        """
+        resultado = self._resultado_em_cache(main_request)
+        if resultado is not None:
+            return resultado
+
+        resultado = self._decompor_via_llm(main_request)
+        if resultado is None:
+            print("🔄 Gerando decomposição de fallback...")
+            return create_fallback_decomposition(main_request)
+
+        # Só decomposições válidas vindas da LLM entram no cache (fallbacks nunca)
+        self.cache.set(main_request, VERSAO_PROMPT_DECOMPOSICAO, resultado.model_dump(mode="json"))
+        return resultado
+
+    def _resultado_em_cache(self, main_request: str) -> Optional[DecompositionResult]:
+        em_cache = self.cache.get(main_request, VERSAO_PROMPT_DECOMPOSICAO)
+        if em_cache is None:
+            return None
+        try:
+            resultado = DecompositionResult.model_validate(em_cache)
+            print(f"\n♻️ DECOMPOSIÇÃO RECUPERADA DO CACHE ({len(resultado.itens_a_comprar)} itens)")
+            return resultado
+        except Exception as e:
+            print(f"⚠️ Entrada inválida no cache de decomposições, descartando: {e}")
+            self.cache.invalidar(main_request, VERSAO_PROMPT_DECOMPOSICAO)
+            return None
+
+    def _decompor_via_llm(self, main_request: str) -> Optional[DecompositionResult]:
+        """Chama a LLM e valida o YAML devolvido; retorna None se a chamada ou a validação falharem."""
         try:
             result = self.groq_simple.chat.completions.create(
-                model="openai/gpt-oss-20b",
+                model=MODELO_DECOMPOSICAO,
                 messages=[
-                    {"role": "system", "content": decomposition_prompt},
+                    {"role": "system", "content": PROMPT_DECOMPOSICAO},
                     {"role": "user", "content": main_request}
                 ],
                 temperature=0.05,
@@ -133,8 +275,7 @@ class SolutionDecomposer:
                 print("-" * 40)
                 print(yaml_output_string[:500] + "..." if len(yaml_output_string) > 500 else yaml_output_string)
                 print("-" * 40)
-                print("🔄 Gerando decomposição de fallback...")
-                return create_fallback_decomposition(main_request)
+                return None
             except Exception as e:
                 print(f"\n❌ ERRO DE VALIDAÇÃO: Falha ao validar a estrutura dos dados.")
                 print(f"🔍 Detalhes do erro: {e}")
@@ -142,58 +283,176 @@ class SolutionDecomposer:
                 print("-" * 40)
                 print(str(data_dict)[:500] + "..." if len(str(data_dict)) > 500 else str(data_dict))
                 print("-" * 40)
-                print("🔄 Gerando decomposição de fallback...")
-                return create_fallback_decomposition(main_request)
+                return None
 
         except Exception as e:
             print(f"\n❌ ERRO NA COMUNICAÇÃO COM GROQ:")
             print(f"🔍 Detalhes: {e}")
-            print("🔄 Gerando decomposição de fallback...")
-            return create_fallback_decomposition(main_request)
+            return None
 
-    def gerar_brief(self, main_request: str) -> Dict[str, Any]:
+    def _decompor_via_llm_streaming(
+        self,
+        main_request: str,
+        ao_item: Callable[[int, ComponenteParaAquisicao], None],
+    ) -> Tuple[Optional[DecompositionResult], Dict[int, ComponenteParaAquisicao]]:
         """
-        Decompõe a solicitação e retorna um dicionário "brief" compatível com gerar_estrutura_de_queries do nlp_parser.
+        Como _decompor_via_llm, mas com a resposta em streaming: cada item de 'itens_a_comprar'
+        é entregue a `ao_item` assim que fica completo. Retorna (resultado validado ou None,
+        itens entregues por índice).
         """
-        print(f"\n🤖 INICIANDO DECOMPOSIÇÃO DA SOLICITAÇÃO:")
+        leitor = _LeitorItensYAML()
+        entregues: Dict[int, ComponenteParaAquisicao] = {}
+        partes: List[str] = []
+
+        def _entregar(itens):
+            for idx, comp in itens:
+                entregues[idx] = comp
+                print(f"📦 Item {idx} recebido no streaming: {comp.nome}")
+                try:
+                    ao_item(idx, comp)
+                except Exception as e:
+                    print(f"⚠️ Falha ao despachar o item {idx}: {e}")
+
+        try:
+            stream = self.groq_simple.chat.completions.create(
+                model=MODELO_DECOMPOSICAO,
+                messages=[
+                    {"role": "system", "content": PROMPT_DECOMPOSICAO},
+                    {"role": "user", "content": main_request}
+                ],
+                temperature=0.05,
+                max_tokens=8000,
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                pedaco = getattr(chunk.choices[0].delta, "content", None)
+                if pedaco:
+                    partes.append(pedaco)
+                    _entregar(leitor.alimentar(pedaco))
+            _entregar(leitor.finalizar())
+        except Exception as e:
+            print(f"\n❌ ERRO NO STREAMING COM GROQ:")
+            print(f"🔍 Detalhes: {e}")
+            return None, entregues
+
+        yaml_output_string = "".join(partes).strip()
+        if yaml_output_string.endswith('}'):
+            yaml_output_string = yaml_output_string[:-1].strip()
+
+        print("\n" + "="*60)
+        print("📋 YAML RETORNADO PELA LLM (streaming):")
+        print("-" * 60)
+        print(yaml_output_string)
+        print("="*60)
+
+        try:
+            resposta_validada = DecompositionResult.model_validate(yaml.safe_load(yaml_output_string))
+        except Exception as e:
+            print(f"\n❌ ERRO AO VALIDAR O YAML COMPLETO DO STREAMING: {e}")
+            return None, entregues
+
+        print("\n✅ DECOMPOSIÇÃO (STREAMING) CONCLUÍDA COM SUCESSO!")
+        print(f"📦 Itens a Comprar: {len(resposta_validada.itens_a_comprar)} itens ({len(entregues)} durante o streaming)")
+        return resposta_validada, entregues
+
+    def gerar_brief_streaming(self, main_request: str, ao_item: Callable[[int, Dict[str, Any]], None]) -> Dict[str, Any]:
+        """
+        Variante de gerar_brief em streaming: `ao_item(idx, item_do_brief)` é chamado para cada item
+        de 'itens_a_comprar' (idx 1..N, o mesmo de Q{idx}) assim que ele chega, para que a busca do
+        item comece enquanto a LLM ainda gera os seguintes. Cada índice é entregue uma única vez;
+        itens que não puderam ser lidos durante o streaming são entregues no fim, a partir do
+        resultado validado. Retorna o brief completo, igual ao de gerar_brief.
+        """
+        print(f"\n🤖 INICIANDO DECOMPOSIÇÃO EM STREAMING DA SOLICITAÇÃO:")
         print(f"📝 Texto original: {main_request[:100]}{'...' if len(main_request) > 100 else ''}")
         print("-" * 60)
-        
-        result = self.decompose_request(main_request)
-        
-        print("🔄 PROCESSANDO COMPONENTES DO BRIEF...")
-        
-        # Mapear itens a comprar
-        itens = []
-        for comp in result.itens_a_comprar:
-            itens.append({
-                "nome": comp.nome,
-                "prioridade": comp.prioridade.value if isinstance(comp.prioridade, Enum) else str(comp.prioridade),
-                "categoria": comp.categoria,
-                "especificacoes_minimas": comp.especificacoes_minimas,
-                "justificativa": comp.justificativa,
-                "tags": comp.tags or [],
-                "quantidade": getattr(comp, "quantidade", 1) or 1,
-                "orcamento_estimado": getattr(comp, "orcamento_estimado", 0) or 0,
-                "preferencias_usuario": comp.preferencias_usuario or [],
-                "rigor": getattr(comp, "rigor", 0) or 0,
-            })
-        
-        
+
+        despachados = set()
+
+        def _despachar(idx: int, comp: ComponenteParaAquisicao):
+            despachados.add(idx)
+            ao_item(idx, self._item_para_brief(comp))
+
+        resultado = self._resultado_em_cache(main_request)
+        if resultado is None:
+            resultado, entregues = self._decompor_via_llm_streaming(main_request, _despachar)
+            if resultado is not None:
+                self.cache.set(main_request, VERSAO_PROMPT_DECOMPOSICAO, resultado.model_dump(mode="json"))
+            else:
+                print("🔄 Gerando decomposição de fallback...")
+                resultado = create_fallback_decomposition(main_request)
+                if entregues:
+                    # Os itens já despachados continuam valendo; o fallback só completa os campos gerais
+                    resultado.itens_a_comprar = [entregues[i] for i in sorted(entregues)]
+                    print(f"♻️ Mantendo os {len(entregues)} itens recebidos antes da falha")
+                    return self._montar_brief(resultado)
+
+        brief = self._montar_brief(resultado)
+        for idx, item in enumerate(brief["itens_a_comprar"], start=1):
+            if idx not in despachados:
+                despachados.add(idx)
+                ao_item(idx, item)
+        return brief
+
+    @staticmethod
+    def _item_para_brief(comp: ComponenteParaAquisicao) -> Dict[str, Any]:
+        return {
+            "nome": comp.nome,
+            "prioridade": comp.prioridade.value if isinstance(comp.prioridade, Enum) else str(comp.prioridade),
+            "categoria": comp.categoria,
+            "especificacoes_minimas": comp.especificacoes_minimas,
+            "justificativa": comp.justificativa,
+            "tags": comp.tags or [],
+            "quantidade": getattr(comp, "quantidade", 1) or 1,
+            "orcamento_estimado": getattr(comp, "orcamento_estimado", 0) or 0,
+            "preferencias_usuario": comp.preferencias_usuario or [],
+            "rigor": getattr(comp, "rigor", 0) or 0,
+        }
+
+    def _montar_brief(self, result: DecompositionResult) -> Dict[str, Any]:
+        """Converte o DecompositionResult no dicionário "brief" usado pelo query_builder."""
+        itens = [self._item_para_brief(comp) for comp in result.itens_a_comprar]
         brief = {
             "solucao_principal": result.solucao_principal,
             "tipo_de_solucao": result.tipo_de_solucao,
             "itens_a_comprar": itens,
             "prazo_implementacao_dias": result.prazo_implementacao_dias,
         }
-        
+
         print("✅ BRIEF GERADO COM SUCESSO!")
         print(f"📊 Resumo do Brief:")
         print(f"   - Itens a comprar: {len(itens)}")
         print("-" * 60 + "\n")
-        
+
         return brief
 
+    def gerar_brief(self, main_request: str) -> Dict[str, Any]:
+        """
+        Decompõe a solicitação e retorna um dicionário "brief" compatível com gerar_estrutura_de_queries do nlp_parser.
+        """
+        print(f"\n🤖 INICIANDO DECOMPOSIÇÃO DA SOLICITAÇÃO:")
+        print(f"📝 Texto original: {main_request[:100]}{'...' if len(main_request) > 100 else ''}")
+        print("-" * 60)
+        
+        result = self.decompose_request(main_request)
+        
+        print("🔄 PROCESSANDO COMPONENTES DO BRIEF...")
+        return self._montar_brief(result)
+
+    def invalidar_cache(self, main_request: Optional[str] = None) -> int:
+        """
+        Remove do cache a decomposição de uma solicitação (versão atual do prompt) ou, sem
+        argumento, todas as decomposições. Retorna o nº de entradas removidas.
+        """
+        if main_request is None:
+            return self.cache.invalidar()
+        return self.cache.invalidar(main_request, VERSAO_PROMPT_DECOMPOSICAO)
+
+    def estatisticas_cache(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "versao_prompt": VERSAO_PROMPT_DECOMPOSICAO}
+
     def test_connection(self) -> bool:
         """Testa se a conexão com a API do Groq está funcionando"""
         try:
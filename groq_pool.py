@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Import robusto das configurações
+try:
+    from config import GROQ_KEY_NAMES, GROQ_KEY_COOLDOWN, GROQ_TIMEOUT
+except ImportError:
+    try:
+        from .config import GROQ_KEY_NAMES, GROQ_KEY_COOLDOWN, GROQ_TIMEOUT
+    except ImportError:
+        print("⚠️ Erro ao importar configurações da Groq. Usando valores padrão.")
+        GROQ_KEY_NAMES = ["GROQ_API_KEY", "_GROQ_API_KEY", "__GROQ_API_KEY"]
+        GROQ_KEY_COOLDOWN = 60.0
+        GROQ_TIMEOUT = 60.0
+
+
+class GroqClientPool:
+    """
+    Pool de clientes Groq do processo: um cliente por chave configurada, criado sob demanda e
+    reutilizado (o cliente HTTP mantém as conexões keep-alive entre chamadas).
+    Cada chave tem um estado de saúde: após uma falha fica fora da rotação até o cooldown acabar.
+    """
+
+    def __init__(self, key_names: List[str] | None = None, cooldown: float = GROQ_KEY_COOLDOWN, timeout: float = GROQ_TIMEOUT):
+        self.key_names = list(key_names or GROQ_KEY_NAMES)
+        self.cooldown = cooldown
+        self.timeout = timeout
+        self._clientes: Dict[str, Any] = {}
+        self._api_keys: Dict[str, str] = {}
+        self._saude: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def chaves_configuradas(self) -> List[str]:
+        """Nomes das chaves presentes no ambiente, na ordem de preferência."""
+        return [nome for nome in self.key_names if os.environ.get(nome)]
+
+    def chaves_disponiveis(self) -> List[str]:
+        """
+        Chaves fora de cooldown, na ordem de preferência. Se todas estiverem em cooldown,
+        devolve todas (a que falhou há mais tempo primeiro) para não bloquear o serviço.
+        """
+        configuradas = self.chaves_configuradas()
+        agora = time.time()
+        with self._lock:
+            saudaveis = [n for n in configuradas if self._saude.get(n, {}).get("indisponivel_ate", 0.0) <= agora]
+            if saudaveis or not configuradas:
+                return saudaveis
+            return sorted(configuradas, key=lambda n: self._saude.get(n, {}).get("indisponivel_ate", 0.0))
+
+    def cliente(self, key_name: str):
+        """Cliente Groq reutilizável da chave; recriado apenas se a chave mudar no ambiente."""
+        api_key = os.environ.get(key_name)
+        if not api_key:
+            return None
+        with self._lock:
+            cliente = self._clientes.get(key_name)
+            if cliente is None or self._api_keys.get(key_name) != api_key:
+                # Importar a biblioteca Groq apenas quando necessário
+                from groq import Groq  # type: ignore
+                cliente = Groq(api_key=api_key, timeout=self.timeout)
+                self._clientes[key_name] = cliente
+                self._api_keys[key_name] = api_key
+            return cliente
+
+    def registrar_sucesso(self, key_name: str):
+        with self._lock:
+            saude = self._saude.setdefault(key_name, {"falhas": 0, "indisponivel_ate": 0.0, "ultimo_erro": None})
+            saude["falhas"] = 0
+            saude["indisponivel_ate"] = 0.0
+
+    def registrar_falha(self, key_name: str, erro: Exception):
+        with self._lock:
+            saude = self._saude.setdefault(key_name, {"falhas": 0, "indisponivel_ate": 0.0, "ultimo_erro": None})
+            saude["falhas"] += 1
+            saude["indisponivel_ate"] = time.time() + self.cooldown
+            saude["ultimo_erro"] = str(erro)[:200]
+        print(f"[LLM] 🔒 Chave {key_name} fora da rotação por {self.cooldown:.0f}s", file=sys.stderr)
+
+    def estado(self) -> Dict[str, Any]:
+        """Estado de saúde por chave (sem expor os valores das chaves)."""
+        agora = time.time()
+        with self._lock:
+            return {
+                nome: {
+                    "disponivel": self._saude.get(nome, {}).get("indisponivel_ate", 0.0) <= agora,
+                    "falhas_consecutivas": self._saude.get(nome, {}).get("falhas", 0),
+                    "cooldown_restante": round(max(0.0, self._saude.get(nome, {}).get("indisponivel_ate", 0.0) - agora), 1),
+                    "ultimo_erro": self._saude.get(nome, {}).get("ultimo_erro"),
+                }
+                for nome in self.chaves_configuradas()
+            }
+
+
+_POOL: Optional[GroqClientPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def obter_pool_groq() -> GroqClientPool:
+    """Pool de clientes Groq compartilhado pelo processo."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = GroqClientPool()
+    return _POOL
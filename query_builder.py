@@ -65,73 +65,76 @@ def _semantica_join(partes: List[str]) -> str:
     partes_limpa = [p.strip() for p in partes if p and str(p).strip()]
     return " | ".join(partes_limpa)
 
-def gerar_queries_itens(brief: Dict[str, Any]) -> List[Dict[str, Any]]:
+def gerar_query_item(item: Dict[str, Any], idx: int) -> Dict[str, Any]:
     """
-    Gera Queries 1..N para cada item de 'itens_a_comprar':
+    Gera a query Q{idx} de um único item de 'itens_a_comprar':
     - Consulta semântica: nome + tags + justificativa
     - Categoria: item.categoria
     - Palavras-chave específicas: especificacoes_minimas (flatten)
     - Peso pela prioridade do item
     """
-    itens = brief.get("itens_a_comprar", []) or []
-    queries: List[Dict[str, Any]] = []
-    for idx, item in enumerate(itens, start=1):
-        nome = str(item.get("nome", "")).strip()
-        tags = _as_list_str(item.get("tags"))
-        justificativa = str(item.get("justificativa", "")).strip()
-        categoria = str(item.get("categoria", "")).strip() or None
-        prioridade = str(item.get("prioridade", "")).lower()
-        alternativas = _as_list_str(item.get("alternativas"))
-        quantidade = int(item.get("quantidade", 1) or 1)
-        orcamento_estimado = float(item.get("orcamento_estimado", 0) or 0)
-        preferencia = str(item.get("preferencia", "")).strip().lower()
-        rigor = int(item.get("rigor", 0) or 0)
-        peso = _prioridade_para_peso(prioridade)
+    nome = str(item.get("nome", "")).strip()
+    tags = _as_list_str(item.get("tags"))
+    justificativa = str(item.get("justificativa", "")).strip()
+    categoria = str(item.get("categoria", "")).strip() or None
+    prioridade = str(item.get("prioridade", "")).lower()
+    alternativas = _as_list_str(item.get("alternativas"))
+    quantidade = int(item.get("quantidade", 1) or 1)
+    orcamento_estimado = float(item.get("orcamento_estimado", 0) or 0)
+    preferencia = str(item.get("preferencia", "")).strip().lower()
+    rigor = int(item.get("rigor", 0) or 0)
+    peso = _prioridade_para_peso(prioridade)
 
-        termos_especificos = _flatten_specs_to_terms(item.get("especificacoes_minimas"))
+    termos_especificos = _flatten_specs_to_terms(item.get("especificacoes_minimas"))
 
-        # Construir query semântica sem "ou" desnecessário
-        partes_query = [nome] + tags + [justificativa]
-        if alternativas:
-            partes_query.extend(["ou"] + alternativas)
-        query_sem = _semantica_join(partes_query)
-        #custo beneficio para uma filtragem mais profunda contendo quantidade: x, orcamento_estimado: y, preferencia: z
-        #só entra o campo de for diferente de 0
-        custo_beneficio = {}
-        if quantidade > 0:
-            custo_beneficio["quantidade"] = quantidade
-        if orcamento_estimado > 0:
-            custo_beneficio["orcamento_maximo_estimado"] = orcamento_estimado
-        if preferencia:
-            custo_beneficio["preferencia"] = preferencia
+    # Construir query semântica sem "ou" desnecessário
+    partes_query = [nome] + tags + [justificativa]
+    if alternativas:
+        partes_query.extend(["ou"] + alternativas)
+    query_sem = _semantica_join(partes_query)
+    #custo beneficio para uma filtragem mais profunda contendo quantidade: x, orcamento_estimado: y, preferencia: z
+    #só entra o campo de for diferente de 0
+    custo_beneficio = {}
+    if quantidade > 0:
+        custo_beneficio["quantidade"] = quantidade
+    if orcamento_estimado > 0:
+        custo_beneficio["orcamento_maximo_estimado"] = orcamento_estimado
+    if preferencia:
+        custo_beneficio["preferencia"] = preferencia
 
-        # quantidade do item (min 1)
-        try:
-            quantidade = int(item.get("quantidade", 1) or 1)
-            if quantidade <= 0:
-                quantidade = 1
-        except Exception:
+    # quantidade do item (min 1)
+    try:
+        quantidade = int(item.get("quantidade", 1) or 1)
+        if quantidade <= 0:
             quantidade = 1
+    except Exception:
+        quantidade = 1
 
-        queries.append({
-            "id": f"Q{idx}",
-            "tipo": "item",
-            "query": query_sem,
-            "filtros": {
-                "categoria": categoria,
-                "palavras_chave": termos_especificos or None
-            },
-            "custo_beneficio": custo_beneficio,  # <-- incluir
-            "peso_prioridade": peso,
-            "rigor": rigor,
-            "quantidade": quantidade,  # <-- incluir
-            "fonte": {
-                "nome": nome,
-                "tags": tags,
-                "prioridade": prioridade
-            }
-        })
-    return queries
+    return {
+        "id": f"Q{idx}",
+        "tipo": "item",
+        "query": query_sem,
+        "filtros": {
+            "categoria": categoria,
+            "palavras_chave": termos_especificos or None
+        },
+        "custo_beneficio": custo_beneficio,  # <-- incluir
+        "peso_prioridade": peso,
+        "rigor": rigor,
+        "quantidade": quantidade,  # <-- incluir
+        "fonte": {
+            "nome": nome,
+            "tags": tags,
+            "prioridade": prioridade
+        }
+    }
+
+def gerar_queries_itens(brief: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Gera Queries 1..N para cada item de 'itens_a_comprar' (ver gerar_query_item).
+    """
+    itens = brief.get("itens_a_comprar", []) or []
+    return [gerar_query_item(item, idx) for idx, item in enumerate(itens, start=1)]
 
 def _map_tipo_alternativa_para_categoria(tipo: Optional[str]) -> Optional[str]:
     """
@@ -1,12 +1,17 @@
 import weaviate
 import weaviate.classes as wvc
 from typing import Dict, Any, List, Tuple
+import copy
+import hashlib
 import json
 import re
 import sys
 import os
-from groq import Groq
 import time
+import threading
+from concurrent.futures import Future
+import numpy as np
+from bisect import bisect_right
 
 # Adicionar o diretório pai ao path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -15,45 +20,83 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
     from text_utils import (
         normalize_text, preprocess_termos, 
-        _detectar_especificidade
+        _detectar_especificidade, campo_normalizado, extrair_modelos
     )
-    from config import CATEGORY_EQUIV, STOPWORDS_PT, GROQ_API_KEY
+    from config import (
+        CATEGORY_EQUIV, STOPWORDS_PT, GROQ_API_KEY, MODO_BUSCA, MULTIVETOR_COMBINACAO, SCORER_VETORIZADO,
+        RERANK_CACHE_SIZE, RERANK_CACHE_TTL, RERANK_LOTE_MAX_QUERIES, RERANK_LOTE_MAX_CHARS, RERANK_LOTE_MAX_TOKENS,
+        RERANK_GATE_ATIVO, RERANK_GATE_MIN_TEXTUAL, RERANK_GATE_MIN_MARGEM, RERANK_COMPACTAR
+    )
+    from concorrencia import limitar, submeter_recuperacao, executar_em_paralelo
+    from groq_pool import obter_pool_groq
+    from cache import LRUCache
+    from compactador import compactar_candidatos, estimar_tokens
 except ImportError:
     try:
         from .text_utils import (
             normalize_text, preprocess_termos, 
-            _detectar_especificidade
+            _detectar_especificidade, campo_normalizado, extrair_modelos
+        )
+        from .config import (
+            CATEGORY_EQUIV, STOPWORDS_PT, GROQ_API_KEY, MODO_BUSCA, MULTIVETOR_COMBINACAO, SCORER_VETORIZADO,
+            RERANK_CACHE_SIZE, RERANK_CACHE_TTL, RERANK_LOTE_MAX_QUERIES, RERANK_LOTE_MAX_CHARS, RERANK_LOTE_MAX_TOKENS,
+            RERANK_GATE_ATIVO, RERANK_GATE_MIN_TEXTUAL, RERANK_GATE_MIN_MARGEM, RERANK_COMPACTAR
         )
-        from .config import CATEGORY_EQUIV, STOPWORDS_PT, GROQ_API_KEY
+        from .concorrencia import limitar, submeter_recuperacao, executar_em_paralelo
+        from .groq_pool import obter_pool_groq
+        from .cache import LRUCache
+        from .compactador import compactar_candidatos, estimar_tokens
     except ImportError as e:
         print(f"⚠️ Erro ao importar módulos locais: {e}")
         raise
 
 
-def _llm_escolher_indice(query: str, filtros: dict | None, custo_beneficio: dict | None, rigor: int | None, candidatos: List[Dict[str, Any]]) -> Dict[str, Any]:
+class EmbeddingContext:
     """
-    Usa LLM (Groq) para escolher o índice do melhor candidato e gerar relatório detalhado.
-    Esta versão foi refatorada para usar JSON garantido, tornando-a muito mais robusta.
+    Memoiza os embeddings de query durante uma única requisição.
+
+    O orquestrador cria um contexto por chamada e o repassa às buscas, de modo que
+    cada par (query, modelo) é codificado exatamente uma vez, mesmo que a query seja
+    executada em várias fases (local/cache) ou por várias threads ao mesmo tempo.
     """
-    if not candidatos:
-        return {"index": -1, "relatorio": {"erro": "Nenhum candidato fornecido"}}
 
-    # Compactar candidatos para o prompt, garantindo clareza para a LLM
-    compacts: List[Dict[str, Any]] = []
-    for i, c in enumerate(candidatos):
-        compacts.append({
-            "index": i,
-            "id": c.get("produto_id", ""),
-            "nome": c.get("nome", ""),
-            "categoria": c.get("categoria_geral") or c.get("categoria") or "",
-            "descricao": (c.get("descricao_geral") or c.get("descricao") or "")[:400], # Limita o tamanho da descrição
-            "preço": c.get("preco"),
-            "estoque": c.get("estoque"),
-        })
+    def __init__(self, embedding_client):
+        self.embedding_client = embedding_client
+        self._vetores: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.codificados = 0
+        self.reutilizados = 0
+
+    def encode(self, text: str, model_choice: str = "mpnet") -> List[float]:
+        chave = (model_choice, text)
+        with self._lock:
+            futuro = self._vetores.get(chave)
+            dono = futuro is None
+            if dono:
+                futuro = Future()
+                self._vetores[chave] = futuro
+            else:
+                self.reutilizados += 1
+        if dono:
+            try:
+                futuro.set_result(self.embedding_client.encode(text, model_choice=model_choice))
+                self.codificados += 1
+            except Exception as e:
+                # Não memoizar falhas: a próxima chamada tenta novamente
+                with self._lock:
+                    self._vetores.pop(chave, None)
+                futuro.set_exception(e)
+        return futuro.result()
 
-    # --- PROMPT REFINADO PARA SAÍDA JSON ---
-    # A mudança principal é instruir a LLM a usar JSON.
-    prompt_sistema = (
+    def stats(self) -> Dict[str, int]:
+        return {"codificados": self.codificados, "reutilizados": self.reutilizados}
+
+
+MODELO_RERANK = "openai/gpt-oss-120b"
+
+# --- PROMPT REFINADO PARA SAÍDA JSON ---
+# A mudança principal é instruir a LLM a usar JSON.
+PROMPT_RERANK = (
     "Você é um Analista de Soluções de T.I. sénior, agindo como o módulo de decisão final do sistema SmartQuote. A sua análise deve ser lógica, objetiva e implacável na aplicação das regras.\n"
     "A sua tarefa é analisar uma lista de produtos candidatos e gerar um relatório de recomendação, seguindo estritamente o formato JSON especificado.\n"
     "Responda APENAS com um objeto JSON válido, sem comentários ou texto extra.\n\n"
@@ -127,58 +170,256 @@ def _llm_escolher_indice(query: str, filtros: dict | None, custo_beneficio: dict
     "     - **Para candidatos 'Parcialmente Relevantes'**: a `justificativa` DEVE explicar claramente qual especificação obrigatória falhou (ex: 'Excelente alternativa, mas não cumpre o requisito de 32GB de RAM').\n"
     "   - **`criterios_avaliacao`:** Forneça uma análise honesta. Se a escolha foi difícil ou se nenhum candidato é perfeito, afirme isso."
 )
+
+# Complemento do prompt para avaliar várias queries numa única chamada (RERANK_MODO=lote)
+PROMPT_RERANK_LOTE = (
+    PROMPT_RERANK
+    + "\n\n--- MODO LOTE (VÁRIAS QUERIES) ---\n"
+    "A mensagem contém VÁRIAS consultas independentes, cada uma com QUERY_ID, QUERY, FILTROS, DADOS ORCAMENTAIS, RIGOR e CANDIDATOS próprios.\n"
+    "Aplique TODAS as regras acima a cada consulta separadamente; os índices referem-se apenas à lista de candidatos da própria consulta.\n"
+    "Responda APENAS com um objeto JSON no formato:\n"
+    '{"resultados": {"<QUERY_ID>": {"index": <int>, "relatorio": {...}}, ...}}\n'
+    "com exatamente uma entrada por QUERY_ID recebido, cada uma no formato de saída definido acima."
+)
+
+# Respostas do reranker por (modelo, prompt, mensagem com query/filtros/orçamento/rigor/candidatos)
+_CACHE_RERANK = LRUCache(maxsize=RERANK_CACHE_SIZE, ttl=RERANK_CACHE_TTL)
+
+def _chave_rerank(prompt_sistema: str, user_msg: str) -> str:
+    """Chave do cache de rerank: hash de tudo o que a LLM recebe (a resposta é determinística)."""
+    return hashlib.sha256(f"{MODELO_RERANK}\n{prompt_sistema}\n{user_msg}".encode("utf-8")).hexdigest()
+
+def _guardar_rerank(chave: str, resultado: Dict[str, Any]) -> Dict[str, Any]:
+    """Guarda no cache apenas respostas válidas da LLM (erros não são memorizados)."""
+    if "erro" not in (resultado.get("relatorio") or {}):
+        _CACHE_RERANK.set(chave, copy.deepcopy(resultado))
+    return resultado
+
+def estatisticas_cache_rerank() -> Dict[str, Any]:
+    return _CACHE_RERANK.stats()
+
+def _compactar_candidatos(candidatos: List[Dict[str, Any]], query: str = "") -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Compacta candidatos para o prompt, garantindo clareza para a LLM (ver compactador.py)."""
+    if RERANK_COMPACTAR:
+        return compactar_candidatos(candidatos, query)
+    compacts: List[Dict[str, Any]] = []
+    for i, c in enumerate(candidatos):
+        compacts.append({
+            "index": i,
+            "id": c.get("produto_id", ""),
+            "nome": c.get("nome", ""),
+            "categoria": c.get("categoria_geral") or c.get("categoria") or "",
+            "descricao": (c.get("descricao_geral") or c.get("descricao") or "")[:400], # Limita o tamanho da descrição
+            "preço": c.get("preco"),
+            "estoque": c.get("estoque"),
+        })
+    info = {
+        "candidatos_recebidos": len(candidatos),
+        "candidatos_enviados": len(compacts),
+        "candidatos_omitidos": 0,
+        "descricoes_duplicadas": 0,
+        "tokens_candidatos": estimar_tokens(json.dumps(compacts, ensure_ascii=False)),
+    }
+    return compacts, info
+
+def _dados_da_query(query: str, filtros: dict | None, custo_beneficio: dict | None, rigor: int | None, compacts: List[Dict[str, Any]]) -> str:
     filtros_str = "{}" if not filtros else json.dumps(filtros, ensure_ascii=False)
-    user_msg = (
+    return (
         f"QUERY: {query}\n"
         f"FILTROS: {filtros_str}\n"
         f"DADOS ORCAMENTAIS: {custo_beneficio or {}}\n"
         f"RIGOR(0-5): {rigor or 0}\n"
-        f"CANDIDATOS: {json.dumps(compacts, ensure_ascii=False)}\n\n"
-        "Analise e retorne o JSON completo com o ranking e as justificativas."
+        f"CANDIDATOS: {json.dumps(compacts, ensure_ascii=False)}\n"
     )
 
-    # Tentar com múltiplas chaves e um retry após 4s
-    key_names = ["GROQ_API_KEY"]
-    if os.environ.get("_GROQ_API_KEY"):
-        key_names.append("_GROQ_API_KEY")
-    if os.environ.get("__GROQ_API_KEY"):
-        key_names.append("__GROQ_API_KEY")
+_INSTRUCAO_FINAL = "\nAnalise e retorne o JSON completo com o ranking e as justificativas."
+
+_LOCK_METRICAS = threading.Lock()
+
+def _registrar_metricas_rerank(metricas: Dict[str, Any] | None, evento: str, prompt_sistema: str = "", user_msg: str = "", infos: List[Dict[str, Any]] | None = None):
+    """
+    Acumula em metricas['rerank'] o que foi enviado à LLM: chamadas, tamanho efetivo do prompt
+    (caracteres e tokens estimados) e candidatos enviados/omitidos. `evento`: 'llm', 'cache' ou 'gate'.
+    """
+    if metricas is None:
+        return
+    with _LOCK_METRICAS:
+        m = metricas.setdefault("rerank", {
+            "chamadas_llm": 0, "respostas_cache": 0, "decisoes_gate": 0,
+            "prompt_chars": 0, "prompt_tokens_estimados": 0,
+            "candidatos_recebidos": 0, "candidatos_enviados": 0, "candidatos_omitidos": 0, "descricoes_duplicadas": 0,
+        })
+        if evento == "cache":
+            m["respostas_cache"] += 1
+            return
+        if evento == "gate":
+            m["decisoes_gate"] += 1
+            return
+        m["chamadas_llm"] += 1
+        m["prompt_chars"] += len(prompt_sistema) + len(user_msg)
+        m["prompt_tokens_estimados"] += estimar_tokens(prompt_sistema) + estimar_tokens(user_msg)
+        for info in infos or []:
+            for chave in ("candidatos_recebidos", "candidatos_enviados", "candidatos_omitidos", "descricoes_duplicadas"):
+                m[chave] += info.get(chave, 0)
+
+def _chamar_llm_rerank(prompt_sistema: str, user_msg: str, max_tokens: int = 4096) -> str | None:
+    """
+    Envia o pedido de rerank em modo JSON, tentando as chaves saudáveis do pool com um retry após 4s.
+    Devolve o conteúdo bruto da resposta ou None se nenhuma chave respondeu.
+    """
+    pool = obter_pool_groq()
+    key_names = pool.chaves_disponiveis()
     content: str | None = None
     last_error: Exception | None = None
 
     for round_idx in range(2):  # duas rodadas de tentativas
         for key_name in key_names:
-            api_key_try = os.environ.get(key_name)
-            if not api_key_try:
+            client = pool.cliente(key_name)
+            if client is None:
                 continue
             try:
-                # Importar a biblioteca Groq apenas quando necessário
-                from groq import Groq  # type: ignore
-                client = Groq(api_key=api_key_try)
-                resp = client.chat.completions.create(
-                    model="openai/gpt-oss-120b",
-                    messages=[
-                        {"role": "system", "content": prompt_sistema},
-                        {"role": "user", "content": user_msg},
-                    ],
-                    temperature=0,
-                    max_tokens=4096,
-                    stream=False,
-                    response_format={"type": "json_object"},
-                )
+                with limitar("groq"):
+                    resp = client.chat.completions.create(
+                        model=MODELO_RERANK,
+                        messages=[
+                            {"role": "system", "content": prompt_sistema},
+                            {"role": "user", "content": user_msg},
+                        ],
+                        temperature=0,
+                        max_tokens=max_tokens,
+                        stream=False,
+                        response_format={"type": "json_object"},
+                    )
                 content = (resp.choices[0].message.content or "{}").strip()
+                pool.registrar_sucesso(key_name)
                 print(f"[LLM] Resposta bruta (JSON) com {key_name}: '{content}'", file=sys.stderr)
                 break  # sucesso nesta rodada
             except Exception as e:
                 last_error = e
+                pool.registrar_falha(key_name, e)
                 print(f"[LLM] ⚠️ Falha com chave {key_name}: {e}", file=sys.stderr)
                 continue
         if content is not None:
             break  # sucesso geral
-        if round_idx == 0:
+        if round_idx == 0 and key_names:
             print("[LLM] ⏳ Aguardando 4s antes da última tentativa com as chaves disponíveis...", file=sys.stderr)
             time.sleep(4)
+    return content
+
+def _validar_resposta_rerank(data: Any, query: str, n_candidatos: int) -> Dict[str, Any]:
+    """Converte o JSON da LLM em {'index', 'relatorio'}, rejeitando índices inválidos."""
+    if not isinstance(data, dict):
+        return {"index": -1, "relatorio": {"erro": f"Resposta inválida: {data}"}}
+    idx = data.get("index", -1)
+    relatorio = data.get("relatorio", {})
+    if not isinstance(idx, int):
+        return {"index": -1, "relatorio": {"erro": f"Índice inválido: {idx}"}}
+
+    if idx == -1:
+        print("[LLM] ⚠️ LLM rejeitou todos os candidatos.", file=sys.stderr)
+        return {"index": -1, "relatorio": relatorio or {"erro": "Nenhum candidato elegível."}}
+
+    if not (0 <= idx < n_candidatos):
+        return {"index": -1, "relatorio": {"erro": f"Índice fora da faixa: {idx}"}}
+
+    print(f"[LLM] ✅ JSON recebido e válido - Índice escolhido: {idx}", file=sys.stderr)
+    # adicionar no relatorio o campo query
+    relatorio["query"] = query
+    return {"index": idx, "relatorio": relatorio}
+
+def _sem_separadores(texto: str) -> str:
+    return re.sub(r"[\s\-]", "", normalize_text(texto))
+
+def avaliar_gate_confianca(query: str, candidatos: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """
+    Aceita o melhor candidato da busca híbrida sem chamar a LLM quando a vitória é clara:
+    score_textual >= RERANK_GATE_MIN_TEXTUAL, vantagem de score sobre o segundo >= RERANK_GATE_MIN_MARGEM
+    e todos os códigos de modelo da query (extrair_modelos: tokens com letras e dígitos, sem unidades
+    como '16gb') iguais a códigos do nome do candidato. Sem código de modelo na query, segue para a LLM.
+    Devolve {'index', 'relatorio'} no formato do reranker, ou None para seguir para a LLM.
+    """
+    if not RERANK_GATE_ATIVO or not candidatos:
+        return None
+    modelos = extrair_modelos(query)
+    if not modelos:
+        return None
+
+    ordem = sorted(range(len(candidatos)), key=lambda i: candidatos[i].get("score", 0.0), reverse=True)
+    idx = ordem[0]
+    melhor = candidatos[idx]
+    score = float(melhor.get("score", 0.0) or 0.0)
+    score_textual = float(melhor.get("score_textual", 0.0) or 0.0)
+    margem = score - float(candidatos[ordem[1]].get("score", 0.0) or 0.0) if len(ordem) > 1 else score
+    # modelo exato: mesmo token de modelo extraído do nome (ignorando hífens/espaços internos)
+    modelos_nome = {_sem_separadores(m) for m in extrair_modelos(melhor.get("nome", ""))}
+    modelos_ok = all(_sem_separadores(m) in modelos_nome for m in modelos)
+
+    if score_textual < RERANK_GATE_MIN_TEXTUAL or margem < RERANK_GATE_MIN_MARGEM or not modelos_ok:
+        return None
+
+    print(f"[LLM] ⚡ Gate de confiança: índice {idx} aceite sem LLM (textual={score_textual:.3f}, margem={margem:.3f}, modelos={modelos})", file=sys.stderr)
+    justificativa = (
+        f"Selecionado sem análise LLM: o modelo pedido ({', '.join(modelos)}) consta no nome do produto, "
+        f"com score textual {score_textual:.2f} e vantagem de {margem:.2f} sobre o segundo candidato."
+    )
+    return {
+        "index": idx,
+        "relatorio": {
+            "escolha_principal": melhor.get("nome"),
+            "justificativa_escolha": justificativa,
+            "top_ranking": [{
+                "posicao": 1,
+                "id": str(melhor.get("produto_id", "")),
+                "nome": melhor.get("nome", ""),
+                "preco": str(melhor.get("preco", "")),
+                "justificativa": justificativa,
+                "pontos_fortes": [f"Correspondência exata do modelo: {', '.join(modelos)}"],
+                "pontos_fracos": [],
+                "score_estimado": round(score, 4),
+            }],
+            "criterios_avaliacao": {
+                "correspondencia_tipo": "Modelo exato encontrado no nome do produto.",
+                "especificacoes": "Não avaliadas pela LLM (decisão por gate de confiança).",
+                "custo_beneficio": "Não avaliado pela LLM (decisão por gate de confiança).",
+                "disponibilidade": f"Estoque: {melhor.get('estoque', 0)}",
+            },
+            "decisao": "gate_confianca",
+            "gate": {
+                "score_textual": round(score_textual, 4),
+                "margem": round(margem, 4),
+                "modelos": modelos,
+                "limiares": {"min_textual": RERANK_GATE_MIN_TEXTUAL, "min_margem": RERANK_GATE_MIN_MARGEM},
+            },
+            "query": query,
+        },
+    }
 
+def _llm_escolher_indice(query: str, filtros: dict | None, custo_beneficio: dict | None, rigor: int | None, candidatos: List[Dict[str, Any]], metricas: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """
+    Usa LLM (Groq) para escolher o índice do melhor candidato e gerar relatório detalhado.
+    Esta versão foi refatorada para usar JSON garantido, tornando-a muito mais robusta.
+    Se `metricas` for fornecido, acumula em metricas['rerank'] o tamanho do prompt enviado.
+    """
+    if not candidatos:
+        return {"index": -1, "relatorio": {"erro": "Nenhum candidato fornecido"}}
+
+    decisao_gate = avaliar_gate_confianca(query, candidatos)
+    if decisao_gate is not None:
+        _registrar_metricas_rerank(metricas, "gate")
+        return decisao_gate
+
+    compacts, info = _compactar_candidatos(candidatos, query)
+    user_msg = _dados_da_query(query, filtros, custo_beneficio, rigor, compacts) + _INSTRUCAO_FINAL
+    chave_cache = _chave_rerank(PROMPT_RERANK, user_msg)
+    em_cache = _CACHE_RERANK.get(chave_cache)
+    if em_cache is not None:
+        print(f"[LLM] ♻️ Resultado do cache de rerank - Índice: {em_cache.get('index')}", file=sys.stderr)
+        _registrar_metricas_rerank(metricas, "cache")
+        return copy.deepcopy(em_cache)
+
+    _registrar_metricas_rerank(metricas, "llm", PROMPT_RERANK, user_msg, [info])
+    print(f"[LLM] 📏 Prompt: ~{estimar_tokens(PROMPT_RERANK) + estimar_tokens(user_msg)} tokens, {info['candidatos_enviados']}/{info['candidatos_recebidos']} candidatos", file=sys.stderr)
+    content = _chamar_llm_rerank(PROMPT_RERANK, user_msg)
     if content is None:
         # Conforme pedido: após todas as tentativas, retornar erro de indisponibilidade da API key
         return {"index": -1, "relatorio": {"erro": "API key da Groq não disponível"}}
@@ -186,25 +427,7 @@ def _llm_escolher_indice(query: str, filtros: dict | None, custo_beneficio: dict
     # Processar o JSON retornado
     try:
         data = json.loads(content)
-
-        # A lógica de validação pode ser mantida, pois é robusta
-        idx = data.get("index", -1)
-        relatorio = data.get("relatorio", {})
-        if not isinstance(idx, int):
-            return {"index": -1, "relatorio": {"erro": f"Índice inválido: {idx}"}}
-
-        if idx == -1:
-            print("[LLM] ⚠️ LLM rejeitou todos os candidatos.", file=sys.stderr)
-            return {"index": -1, "relatorio": relatorio or {"erro": "Nenhum candidato elegível."}}
-
-        if not (0 <= idx < len(candidatos)):
-            return {"index": -1, "relatorio": {"erro": f"Índice fora da faixa: {idx}"}}
-
-        print(f"[LLM] ✅ JSON recebido e válido - Índice escolhido: {idx}", file=sys.stderr)
-        # adicionar no relatorio o campo query
-        relatorio["query"] = query
-        return {"index": idx, "relatorio": relatorio}
-
+        return _guardar_rerank(chave_cache, _validar_resposta_rerank(data, query, len(candidatos)))
     except json.JSONDecodeError as e:
         print(f"[LLM] ❌ Erro fatal ao fazer parse do JSON: {e}", file=sys.stderr)
         return {"index": -1, "relatorio": {"erro": f"JSON malformado: {e}"}}
@@ -212,6 +435,101 @@ def _llm_escolher_indice(query: str, filtros: dict | None, custo_beneficio: dict
         print(f"[LLM] ❌ Erro inesperado ao processar resposta da LLM: {e}", file=sys.stderr)
         return {"index": -1, "relatorio": {"erro": f"Erro na API: {e}"}}
 
+def _agrupar_pedidos_rerank(pedidos: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Agrupa pedidos em lotes respeitando RERANK_LOTE_MAX_QUERIES e RERANK_LOTE_MAX_CHARS."""
+    lotes: List[List[Dict[str, Any]]] = []
+    atual: List[Dict[str, Any]] = []
+    tamanho = len(PROMPT_RERANK_LOTE)
+    for pedido in pedidos:
+        t = len(pedido["_dados"])
+        if atual and (len(atual) >= RERANK_LOTE_MAX_QUERIES or tamanho + t > RERANK_LOTE_MAX_CHARS):
+            lotes.append(atual)
+            atual, tamanho = [], len(PROMPT_RERANK_LOTE)
+        atual.append(pedido)
+        tamanho += t
+    if atual:
+        lotes.append(atual)
+    return lotes
+
+def _rerank_lote(lote: List[Dict[str, Any]], metricas: Dict[str, Any] | None = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Reranqueia um lote de queries numa única chamada JSON. Devolve só as queries cuja resposta veio
+    válida; as demais ficam para o caminho individual.
+    """
+    if len(lote) == 1 or len(PROMPT_RERANK_LOTE) + sum(len(p["_dados"]) for p in lote) > RERANK_LOTE_MAX_CHARS:
+        return {}
+    user_msg = "".join(f"QUERY_ID: {p['id']}\n{p['_dados']}\n" for p in lote)
+    user_msg += "Analise cada QUERY_ID separadamente e retorne o JSON com 'resultados' para todas."
+    _registrar_metricas_rerank(metricas, "llm", PROMPT_RERANK_LOTE, user_msg, [p["_info"] for p in lote])
+    content = _chamar_llm_rerank(PROMPT_RERANK_LOTE, user_msg, max_tokens=min(4096 * len(lote), RERANK_LOTE_MAX_TOKENS))
+    if content is None:
+        return {}
+    try:
+        resultados = json.loads(content).get("resultados")
+    except Exception as e:
+        print(f"[LLM] ⚠️ Resposta em lote inválida ({e}); usando chamadas individuais", file=sys.stderr)
+        return {}
+    if not isinstance(resultados, dict):
+        print("[LLM] ⚠️ Resposta em lote sem 'resultados'; usando chamadas individuais", file=sys.stderr)
+        return {}
+
+    saida: Dict[str, Dict[str, Any]] = {}
+    for p in lote:
+        resultado = _validar_resposta_rerank(resultados.get(str(p["id"])), p["query"], len(p["candidatos"]))
+        if "erro" in (resultado.get("relatorio") or {}):
+            continue  # ausente ou inválida no lote: refeita individualmente
+        saida[p["id"]] = _guardar_rerank(p["_chave_lote"], resultado)
+    return saida
+
+def llm_escolher_indices_em_lote(pedidos: List[Dict[str, Any]], max_workers: int = 1, metricas: Dict[str, Any] | None = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Rerank de várias queries com menos chamadas à LLM.
+    Cada pedido: {'id', 'query', 'filtros', 'custo_beneficio', 'rigor', 'candidatos'}.
+    Respostas em cache são reaproveitadas (as do modo individual e as de lotes anteriores); as restantes
+    são agrupadas em lotes (uma chamada JSON por lote, com 'index' e 'relatorio' por id). Respostas de
+    lote ficam em cache sob a chave do PROMPT_RERANK_LOTE, nunca sob a do prompt individual. Queries
+    que não couberem num lote, ou cuja resposta em lote vier ausente/malformada, caem em
+    _llm_escolher_indice. Devolve {id: {'index', 'relatorio'}}.
+    """
+    resultados: Dict[str, Dict[str, Any]] = {}
+    pendentes: List[Dict[str, Any]] = []
+    for pedido in pedidos:
+        if not pedido.get("candidatos"):
+            resultados[pedido["id"]] = {"index": -1, "relatorio": {"erro": "Nenhum candidato fornecido"}}
+            continue
+        decisao_gate = avaliar_gate_confianca(pedido["query"], pedido["candidatos"])
+        if decisao_gate is not None:
+            _registrar_metricas_rerank(metricas, "gate")
+            resultados[pedido["id"]] = decisao_gate
+            continue
+        compacts, info = _compactar_candidatos(pedido["candidatos"], pedido["query"])
+        dados = _dados_da_query(pedido["query"], pedido.get("filtros"), pedido.get("custo_beneficio"), pedido.get("rigor"), compacts)
+        chave_lote = _chave_rerank(PROMPT_RERANK_LOTE, dados)
+        em_cache = _CACHE_RERANK.get(_chave_rerank(PROMPT_RERANK, dados + _INSTRUCAO_FINAL))
+        if em_cache is None:
+            em_cache = _CACHE_RERANK.get(chave_lote)
+        if em_cache is not None:
+            print(f"[LLM] ♻️ Resultado do cache de rerank para {pedido['id']} - Índice: {em_cache.get('index')}", file=sys.stderr)
+            _registrar_metricas_rerank(metricas, "cache")
+            resultados[pedido["id"]] = copy.deepcopy(em_cache)
+            continue
+        pendentes.append({**pedido, "_dados": dados, "_chave_lote": chave_lote, "_info": info})
+
+    lotes = _agrupar_pedidos_rerank(pendentes)
+    if any(len(l) > 1 for l in lotes):
+        print(f"[LLM] 📦 Rerank em lote: {len(pendentes)} queries em {len(lotes)} chamada(s)", file=sys.stderr)
+    for saida in executar_em_paralelo(lambda lote: _rerank_lote(lote, metricas), lotes, max_workers, prefixo="rerank"):
+        resultados.update(saida)
+
+    individuais = [p for p in pendentes if p["id"] not in resultados]
+    respostas = executar_em_paralelo(
+        lambda p: _llm_escolher_indice(p["query"], p.get("filtros"), p.get("custo_beneficio"), p.get("rigor"), p["candidatos"], metricas=metricas),
+        individuais, max_workers, prefixo="rerank"
+    )
+    for p, resposta in zip(individuais, respostas):
+        resultados[p["id"]] = resposta
+    return resultados
+
 
 def construir_filtro(filtros: dict = None):
     """Constrói filtros do Weaviate v4 (apenas estruturais, texto é tratado pela busca híbrida)."""
@@ -240,7 +558,7 @@ def calcular_score_filtros(produto: dict, filtros: dict | None) -> float:
         if filtros.get("categoria"):
             categorias_raw = filtros["categoria"] if isinstance(filtros["categoria"], list) else [filtros["categoria"]]
             categorias_norm = [normalize_text(c) for c in categorias_raw if str(c).strip()]
-            cat_prod = normalize_text(produto.get("categoria", "") or produto.get("modelo", ""))
+            cat_prod = campo_normalizado(produto, "categoria")
             # considerar equivalências conhecidas
             candidatos: List[str] = []
             for c in categorias_norm:
@@ -266,17 +584,11 @@ def calcular_relevancia_por_array(produto: dict, termos_pesquisa: list[str]) ->
     if not termos_pesquisa:
         return 0.0
 
-    # Preparar texto do produto para busca (normalizado)
-    # Usar nova coluna categoria (com fallback para modelo)
-    nome_raw = produto.get('nome', '')
-    nome = normalize_text(nome_raw)
-    categoria = normalize_text(produto.get('categoria', '') or produto.get('modelo', ''))
-    descricao = normalize_text(produto.get('descricao', ''))
-    tags_raw = produto.get('tags', [])
-    if isinstance(tags_raw, list):
-        tags_texto = normalize_text(' '.join(str(tag) for tag in tags_raw))
-    else:
-        tags_texto = normalize_text(str(tags_raw)) if tags_raw else ''
+    # Texto do produto já normalizado na indexação (campos *_norm), com fallback
+    nome = campo_normalizado(produto, 'nome')
+    categoria = campo_normalizado(produto, 'categoria')
+    descricao = campo_normalizado(produto, 'descricao')
+    tags_texto = campo_normalizado(produto, 'tags')
     texto_produto = f"{nome} {categoria} {tags_texto} {descricao}".strip()
 
     scores_dos_termos: List[float] = []
@@ -315,15 +627,11 @@ def calcular_relevancia_textual(produto: dict, query: str):
     if not query:
         return 0.0
 
-    nome = normalize_text(produto.get('nome', ''))
-    # Usar nova coluna categoria (com fallback para modelo)
-    categoria = normalize_text(produto.get('categoria', '') or produto.get('modelo', ''))
-    descricao = normalize_text(produto.get('descricao', ''))
-    tags_raw = produto.get('tags', [])
-    if isinstance(tags_raw, list):
-        tags_texto = normalize_text(' '.join(str(tag) for tag in tags_raw))
-    else:
-        tags_texto = normalize_text(str(tags_raw)) if tags_raw else ''
+    # Campos normalizados na indexação (categoria com fallback para modelo)
+    nome = campo_normalizado(produto, 'nome')
+    categoria = campo_normalizado(produto, 'categoria')
+    descricao = campo_normalizado(produto, 'descricao')
+    tags_texto = campo_normalizado(produto, 'tags')
 
     # usa a query expandida/normalizada
     q = normalize_text(query)
@@ -353,8 +661,180 @@ def calcular_relevancia_textual(produto: dict, query: str):
 
     return min(1.0, score_norm)
 
-def buscar_hibrido_ponderado(client: weaviate.WeaviateClient, modelos: dict, query: str, espaco: str, limite: int = 10, filtros: dict = None):
-    """Busca híbrida com ponderação (união de candidatos semânticos + BM25 e reranqueamento)."""
+def _presenca(termos: List[str], textos: List[str]) -> np.ndarray:
+    """
+    Matriz 0/1 (textos x termos) indicando quais termos aparecem (substring) em cada texto.
+    Os textos são unidos por '\\0' (nunca presente em texto normalizado) e cada termo é localizado
+    com str.find, saltando para o texto seguinte a cada ocorrência: só os textos que contêm o termo
+    custam uma iteração em Python.
+    """
+    n = len(textos)
+    presenca = np.zeros((n, len(termos)))
+    if not n:
+        return presenca
+    juntos = "\0".join(textos)
+    inicios = [0] * n
+    for i in range(1, n):
+        inicios[i] = inicios[i - 1] + len(textos[i - 1]) + 1
+    for j, termo in enumerate(termos):
+        if not termo or "\0" in termo:
+            presenca[:, j] = [termo in texto for texto in textos]
+            continue
+        pos = juntos.find(termo)
+        while pos != -1:
+            i = bisect_right(inicios, pos) - 1
+            presenca[i, j] = 1.0
+            if i + 1 >= n:
+                break
+            pos = juntos.find(termo, inicios[i + 1])
+    return presenca
+
+def _somar_em_ordem(parcelas: np.ndarray) -> np.ndarray:
+    """Soma as colunas da esquerda para a direita (cumsum é sequencial, como o laço original)."""
+    if parcelas.shape[1] == 0:
+        return np.zeros(parcelas.shape[0])
+    return np.cumsum(parcelas, axis=1)[:, -1]
+
+def _campos_candidatos(produtos: List[dict]) -> Dict[str, List[str]]:
+    """Campos normalizados de todos os candidatos, por campo."""
+    return {campo: [campo_normalizado(p, campo) for p in produtos] for campo in ("nome", "categoria", "descricao", "tags")}
+
+# Pesos por campo de calcular_relevancia_textual, na ordem em que são somados
+_PESOS_TEXTUAIS = (("nome", 0.6), ("categoria", 0.3), ("tags", 0.25), ("descricao", 0.1))
+
+def relevancia_textual_vetorizada(campos: Dict[str, List[str]], query: str) -> np.ndarray:
+    """Versão em lote de calcular_relevancia_textual (mesma ordem de somas, resultados idênticos)."""
+    n = len(campos["nome"])
+    if not query:
+        return np.zeros(n)
+    q = normalize_text(query)
+    palavras = [p for p in q.split() if p not in STOPWORDS_PT]
+    if not palavras:
+        return np.zeros(n)
+
+    # parcelas[:, palavra, campo] = peso do campo se a palavra aparece nele
+    parcelas = np.stack([_presenca(palavras, campos[campo]) * peso for campo, peso in _PESOS_TEXTUAIS], axis=2)
+    score_norm = _somar_em_ordem(parcelas.reshape(n, -1)) / max(1, len(palavras))
+
+    # bônus de frase exata
+    nomes, categorias, tags = campos["nome"], campos["categoria"], campos["tags"]
+    no_nome = np.array([q in nome for nome in nomes], dtype=bool)
+    nos_curtos = np.array([q in f"{a} {b} {c}" for a, b, c in zip(nomes, categorias, tags)], dtype=bool)
+    score_norm = score_norm + np.where(no_nome, 0.4, np.where(nos_curtos, 0.2, 0.0))
+    return np.minimum(1.0, score_norm)
+
+_RE_TERMO_UNIDADE = re.compile(r"(\b\d{2,}\b|\b\d{2,}\s?(ppm|dpi)\b|\ba\d\b|\b\d+x\d+\b)")
+_RE_TEXTO_UNIDADE = re.compile(r"(ppm|dpi|a\d|\d+x\d+|\d{2,})")
+
+def relevancia_por_array_vetorizada(campos: Dict[str, List[str]], termos_pesquisa: list[str]) -> np.ndarray:
+    """Versão em lote de calcular_relevancia_por_array (mesma ordem de somas, resultados idênticos)."""
+    n = len(campos["nome"])
+    termos = [t for t in (normalize_text(t) for t in termos_pesquisa or []) if t]
+    if not termos:
+        return np.zeros(n)
+
+    nomes = campos["nome"]
+    textos = [f"{a} {b} {c} {d}".strip() for a, b, c, d in zip(nomes, campos["categoria"], campos["tags"], campos["descricao"])]
+
+    # frase completa no nome (0.8) ou no texto do produto (0.5)
+    no_nome = _presenca(termos, nomes).astype(bool)
+    no_texto = _presenca(termos, textos).astype(bool)
+    score_frase = np.where(no_nome, 0.8, np.where(no_texto, 0.5, 0.0))
+
+    # tokens individuais (sem stopwords)
+    score_palavras = np.zeros((n, len(termos)))
+    for j, termo in enumerate(termos):
+        palavras = [p for p in termo.split() if p not in STOPWORDS_PT]
+        if palavras:
+            matches = _presenca(palavras, textos).sum(axis=1)
+            score_palavras[:, j] = (matches / len(palavras)) * 0.3
+
+    # bônus pequeno para números/unidades presentes
+    termo_com_unidade = np.array([bool(_RE_TERMO_UNIDADE.search(t)) for t in termos])
+    bonus_num = np.zeros((n, len(termos)))
+    if termo_com_unidade.any():
+        texto_com_unidade = np.array([bool(_RE_TEXTO_UNIDADE.search(t)) for t in textos])
+        bonus_num = np.where(texto_com_unidade[:, None] & termo_com_unidade[None, :], 0.1, 0.0)
+
+    scores_dos_termos = np.minimum(1.0, score_frase + score_palavras + bonus_num)
+    return _somar_em_ordem(scores_dos_termos) / len(termos)
+
+def _tem_estoque(produto: dict) -> bool:
+    try:
+        return int(produto.get("estoque", 0)) > 0
+    except Exception:
+        return False
+
+def score_filtros_vetorizado(produtos: List[dict], campos: Dict[str, List[str]], filtros: dict | None) -> np.ndarray:
+    """Versão em lote de calcular_score_filtros: categorias equivalentes resolvidas uma única vez."""
+    n = len(produtos)
+    if not filtros:
+        return np.zeros(n)
+    boost = np.zeros(n)
+    try:
+        if filtros.get("categoria"):
+            categorias_raw = filtros["categoria"] if isinstance(filtros["categoria"], list) else [filtros["categoria"]]
+            candidatos: List[str] = []
+            for c in (normalize_text(c) for c in categorias_raw if str(c).strip()):
+                candidatos.append(c)
+                candidatos.extend(CATEGORY_EQUIV.get(c, []))
+            candidatos_unicos = set(candidatos)
+            casa_categoria = np.array(
+                [any(c in cat_prod or cat_prod in c for c in candidatos_unicos) for cat_prod in campos["categoria"]],
+                dtype=bool
+            )
+            boost = boost + np.where(casa_categoria, 0.2, 0.0)
+        estoque = np.array([_tem_estoque(p) for p in produtos], dtype=bool)
+        boost = boost + np.where(estoque, 0.03, 0.0)
+    except Exception:
+        # mesmo contrato do cálculo por objeto: erro inesperado volta ao caminho escalar
+        return np.fromiter((calcular_score_filtros(p, filtros) for p in produtos), dtype=np.float64, count=n)
+    return np.minimum(0.3, boost)
+
+def pontuar_candidatos(produtos: List[dict], scores_semanticos: List[float], query: str, filtros: dict | None, termos_pc: List[str], pesos: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """
+    Calcula de uma vez os scores de todos os candidatos (semântico, textual, palavras-chave,
+    filtros e híbrido), com os mesmos pesos e na mesma ordem de operações do cálculo por objeto.
+    """
+    campos = _campos_candidatos(produtos)
+    sem = np.asarray(scores_semanticos, dtype=np.float64)
+    txt = relevancia_textual_vetorizada(campos, query)
+    pc = relevancia_por_array_vetorizada(campos, termos_pc)
+    flt = score_filtros_vetorizado(produtos, campos, filtros)
+
+    hibrido = sem * pesos["w_sem"] + txt * pesos["w_txt"] + pc * pesos["w_pc"] + flt * pesos["w_flt"]
+    # boost leve se textual estiver muito alto
+    hibrido = hibrido + np.where(txt > 0.75, pesos.get("boost_textual", 0.03), 0.0)
+    hibrido = np.maximum(0.0, np.minimum(1.0, hibrido))
+    return {"hibrido": hibrido, "semantico": sem, "textual": txt, "palavras_chave": pc, "filtro": flt}
+
+# Propriedades devolvidas pelas consultas de recuperação (apenas o que o reranker e a resposta usam)
+PROPRIEDADES_RETORNO = [
+    "produto_id", "nome", "categoria", "tags", "descricao", "preco", "estoque", "origem",
+    "nome_norm", "categoria_norm", "descricao_norm", "tags_norm",
+]
+
+def _buscar_bm25(collection, query: str, limite: int, filtros_weaviate):
+    """Executa a recuperação BM25 nos campos textuais; devolve None em caso de erro."""
+    try:
+        with limitar("weaviate"):
+            return collection.query.bm25(
+                query=query,
+                query_properties=["nome", "tags", "categoria", "descricao"],
+                limit=limite,
+                filters=filtros_weaviate,
+                return_metadata=wvc.query.MetadataQuery(score=True),
+                return_properties=PROPRIEDADES_RETORNO
+            )
+    except Exception as e:
+        print(f"Erro na busca BM25: {e}", file=sys.stderr)
+        return None
+
+def buscar_hibrido_ponderado(client: weaviate.WeaviateClient, modelos: dict, query: str, espaco: str, limite: int = 10, filtros: dict = None, contexto_embeddings: EmbeddingContext | None = None):
+    """
+    Busca híbrida com ponderação (união de candidatos semânticos + BM25 e reranqueamento).
+    Se `contexto_embeddings` for informado, o embedding da query é reaproveitado dentro da requisição.
+    """
     # Monta descrição apenas para logs (filtros serão ponderados, não aplicados na query)
     filtro_desc = f" com filtros ponderados: {filtros}" if filtros else ""
     print(f"\n--- BUSCA HÍBRIDA PONDERADA '{query}' em {espaco}{filtro_desc} ---", file=sys.stderr)
@@ -364,15 +844,6 @@ def buscar_hibrido_ponderado(client: weaviate.WeaviateClient, modelos: dict, que
         print(f"ERRO: Cliente de embeddings não está disponível.", file=sys.stderr)
         return []
 
-    # 0. Preparos - Gerar embedding usando a API do Hugging Face
-    try:
-        # Mapear espaços para modelos da API
-        model_choice = "bertimbau" if espaco == "vetor_portugues" else "mpnet"
-        vetor_query = embedding_client.encode(query, model_choice=model_choice)
-    except Exception as e:
-        print(f"ERRO: Falha ao gerar embedding para query '{query}': {e}", file=sys.stderr)
-        return []
-    
     # Obter collection do Weaviate
     collection = client.collections.get("Produtos")
     
@@ -382,30 +853,35 @@ def buscar_hibrido_ponderado(client: weaviate.WeaviateClient, modelos: dict, que
     # Expandir query para BM25
     expanded_query = query  # Usando query original já que expand_query_with_synonyms não existe
 
-    # 1. Recuperação de candidatos (semântica + BM25)
+    # 1. BM25 não depende do embedding: dispara em paralelo enquanto o vetor é gerado
+    futuro_bm25 = submeter_recuperacao(_buscar_bm25, collection, expanded_query, limite * 3, filtros_weaviate)
+
+    # Gerar embedding usando a API do Hugging Face
     try:
-        res_semantica = collection.query.near_vector(
-            near_vector=vetor_query,
-            target_vector=espaco,
-            limit=limite * 3,
-            filters=filtros_weaviate,
-            return_metadata=wvc.query.MetadataQuery(distance=True)
-        )
+        # Mapear espaços para modelos da API
+        model_choice = _model_choice_do_espaco(espaco)
+        encoder = contexto_embeddings or embedding_client
+        vetor_query = encoder.encode(query, model_choice=model_choice)
     except Exception as e:
-        print(f"Erro na busca semântica: {e}", file=sys.stderr)
-        res_semantica = None
+        print(f"ERRO: Falha ao gerar embedding para query '{query}': {e}", file=sys.stderr)
+        return []
 
+    # 2. Recuperação semântica (BM25 continua rodando em paralelo)
     try:
-        res_bm25 = collection.query.bm25(
-            query=expanded_query,
-            query_properties=["nome", "tags", "categoria", "descricao"],
-            limit=limite * 3,
-            filters=filtros_weaviate,
-            return_metadata=wvc.query.MetadataQuery(score=True)
-        )
+        with limitar("weaviate"):
+            res_semantica = collection.query.near_vector(
+                near_vector=vetor_query,
+                target_vector=espaco,
+                limit=limite * 3,
+                filters=filtros_weaviate,
+                return_metadata=wvc.query.MetadataQuery(distance=True),
+                return_properties=PROPRIEDADES_RETORNO
+            )
     except Exception as e:
-        print(f"Erro na busca BM25: {e}", file=sys.stderr)
-        res_bm25 = None
+        print(f"Erro na busca semântica: {e}", file=sys.stderr)
+        res_semantica = None
+
+    res_bm25 = futuro_bm25.result()
 
     objs_sem = res_semantica.objects if res_semantica and getattr(res_semantica, 'objects', None) else []
     objs_bm = res_bm25.objects if res_bm25 and getattr(res_bm25, 'objects', None) else []
@@ -414,45 +890,52 @@ def buscar_hibrido_ponderado(client: weaviate.WeaviateClient, modelos: dict, que
         print("Nenhum resultado encontrado.", file=sys.stderr)
         return []
     
-    # 2. Ponderação por especialistas
+    # 3. Ponderação, ordenação e limite
+    lista_final = _fundir_candidatos(list(objs_sem) + list(objs_bm), expanded_query, filtros, limite)
+
+    # 4. Exibir resultados
+    _exibir_candidatos(lista_final)
+    return lista_final
+
+
+def _fundir_candidatos(objetos: list, query: str, filtros: dict | None, limite: int, score_base: str = "distancia") -> List[Dict[str, Any]]:
+    """
+    Pondera os objetos recuperados (semânticos + BM25) com os especialistas, deduplica por
+    (nome, categoria) mantendo o melhor score e devolve os `limite` melhores.
+    `score_base` define a componente semântica: 'distancia' (1 - distância vetorial) ou
+    'hibrido' (score já fundido pelo Weaviate na busca híbrida nativa, que inclui o BM25: os pesos
+    textual/palavras-chave e o boost textual ficam a zero para não contar o léxico duas vezes; os
+    scores textuais continuam calculados para o relatório e o gate de confiança).
+    """
     resultados_finais: Dict[Tuple[str, str], Dict[str, Any]] = {}
 
     termos_pc = preprocess_termos(filtros.get("palavras_chave")) if filtros else []
     pesos = _detectar_especificidade(query, termos_pc)
+    if score_base == "hibrido":
+        pesos = {"w_sem": 1.0 - pesos["w_flt"], "w_txt": 0.0, "w_pc": 0.0, "w_flt": pesos["w_flt"], "boost_textual": 0.0}
 
-    for o in list(objs_sem) + list(objs_bm):
+    pontuados = []
+    for o in objetos:
         p = o.properties
         if not p:
             continue
-        # Score semântico base (1 - distância), se existir
-        dist = getattr(o.metadata, 'distance', None)
-        score_semantico = max(0.0, 1.0 - dist) if isinstance(dist, (float, int)) else 0.0
-
-        # Score textual
-        score_textual = calcular_relevancia_textual(p, expanded_query)
-
-
-        # Score de palavras-chave específicas (se fornecidas)
-        score_palavras_chave = 0.0
-        if termos_pc:
-            score_palavras_chave = calcular_relevancia_por_array(p, termos_pc)
-        
-        # Score de filtros (regras de negócio)
-        score_filtro = calcular_score_filtros(p, filtros)
-        
-        # Fusão com pesos dinâmicos
-        score_hibrido = (
-            score_semantico * pesos["w_sem"]
-            + score_textual * pesos["w_txt"]
-            + score_palavras_chave * pesos["w_pc"]
-            + score_filtro * pesos["w_flt"]
-        )
-        
-        # boost leve se textual estiver muito alto
-        if score_textual > 0.75:
-            score_hibrido += 0.03
-        score_hibrido = max(0.0, min(1.0, score_hibrido))
-    
+        if score_base == "hibrido":
+            # Score de fusão relativa do Weaviate (0..1)
+            fundido = getattr(o.metadata, 'score', None)
+            score_semantico = max(0.0, min(1.0, float(fundido))) if isinstance(fundido, (float, int)) else 0.0
+        else:
+            # Score semântico base (1 - distância), se existir
+            dist = getattr(o.metadata, 'distance', None)
+            score_semantico = max(0.0, 1.0 - dist) if isinstance(dist, (float, int)) else 0.0
+        pontuados.append((p, score_semantico))
+
+    if SCORER_VETORIZADO and pontuados:
+        scores = pontuar_candidatos([p for p, _ in pontuados], [s for _, s in pontuados], query, filtros, termos_pc, pesos)
+        linhas = zip(*(scores[k].tolist() for k in ("hibrido", "semantico", "textual", "palavras_chave", "filtro")))
+    else:
+        linhas = (_pontuar_objeto(p, score_semantico, query, filtros, termos_pc, pesos) for p, score_semantico in pontuados)
+
+    for (p, _), (score_hibrido, score_semantico, score_textual, score_palavras_chave, score_filtro) in zip(pontuados, linhas):
         # Usar nova coluna categoria (com fallback para modelo)
         categoria_p = p.get('categoria', '') or p.get('modelo', '')
         chave_produto = (p.get('nome'), categoria_p)
@@ -474,23 +957,267 @@ def buscar_hibrido_ponderado(client: weaviate.WeaviateClient, modelos: dict, que
                 'score_filtro': score_filtro
             }
 
-    # 3. Ordenar e limitar
     lista_final = list(resultados_finais.values())
     lista_final.sort(key=lambda x: x['score'], reverse=True)
-    lista_final = lista_final[:limite]
+    return lista_final[:limite]
 
-    # 4. Exibir resultados
+
+def _pontuar_objeto(p: dict, score_semantico: float, query: str, filtros: dict | None, termos_pc: List[str], pesos: Dict[str, float]) -> Tuple[float, float, float, float, float]:
+    """Scores de um único candidato: (híbrido, semântico, textual, palavras-chave, filtro)."""
+    # Score textual
+    score_textual = calcular_relevancia_textual(p, query)
+
+    # Score de palavras-chave específicas (se fornecidas)
+    score_palavras_chave = 0.0
+    if termos_pc:
+        score_palavras_chave = calcular_relevancia_por_array(p, termos_pc)
+
+    # Score de filtros (regras de negócio)
+    score_filtro = calcular_score_filtros(p, filtros)
+
+    # Fusão com pesos dinâmicos
+    score_hibrido = (
+        score_semantico * pesos["w_sem"]
+        + score_textual * pesos["w_txt"]
+        + score_palavras_chave * pesos["w_pc"]
+        + score_filtro * pesos["w_flt"]
+    )
+
+    # boost leve se textual estiver muito alto
+    if score_textual > 0.75:
+        score_hibrido += pesos.get("boost_textual", 0.03)
+    score_hibrido = max(0.0, min(1.0, score_hibrido))
+    return score_hibrido, score_semantico, score_textual, score_palavras_chave, score_filtro
+
+
+def _exibir_candidatos(lista_final: List[Dict[str, Any]]):
+    """Loga os candidatos ranqueados com a decomposição do score."""
     print(f"\n📊 Encontrados {len(lista_final)} produtos candidatos no banco de dados:", file=sys.stderr)
     for i, r in enumerate(lista_final, 1):
-        preco_info = f" |AOA$ {r.get('preco', 0):.2f}" if r.get('preco') else ""
         sem_pct = int(r['score_semantico'] * 100)
         txt_pct = int(r['score_textual'] * 100)
         pc_pct = int(r.get('score_palavras_chave', 0.0) * 100)
         flt_pct = int(r.get('score_filtro', 0.0) * 100)
         final_pct = int(r['score'] * 100)
-        categoria_display = r.get('categoria', '') or r.get('modelo', '')
         print(f"{i:2d}. {r['nome']}", file=sys.stderr)
         print(f"    📈 Score: {final_pct}% (Sem: {sem_pct}% + Txt: {txt_pct}% + PC: {pc_pct}% + Flt: {flt_pct}%)", file=sys.stderr)
     
     print(f"\n🔍 Estes produtos serão enviados para análise LLM para verificar se atendem aos critérios específicos da solicitação.", file=sys.stderr)
+
+
+# Junções multi-vetor suportadas (nomes dos métodos de wvc.query.TargetVectors)
+_COMBINACOES_MULTIVETOR = ("minimum", "average", "sum", "relative_score")
+
+
+def _alvo_multivetor(espacos: List[str], combinacao: str):
+    """
+    Monta o alvo multi-vetor do Weaviate para os espaços e a junção configurados.
+    TargetVectors só é resolvido aqui (weaviate-client >= 4.7), para o import do módulo não
+    depender dele.
+    """
+    target_vectors = wvc.query.TargetVectors
+    if combinacao == "relative_score":
+        peso = 1.0 / len(espacos)
+        return target_vectors.relative_score({e: peso for e in espacos})
+    if combinacao not in _COMBINACOES_MULTIVETOR:
+        print(f"⚠️ Combinação multi-vetor desconhecida '{combinacao}', usando 'minimum'", file=sys.stderr)
+        combinacao = "minimum"
+    return getattr(target_vectors, combinacao)(espacos)
+
+
+def _model_choice_do_espaco(espaco: str) -> str:
+    """Mapeia o vetor nomeado do Weaviate para o modelo da API de embeddings."""
+    return "bertimbau" if espaco == "vetor_portugues" else "mpnet"
+
+
+def buscar_hibrido_multivetor(client: weaviate.WeaviateClient, modelos: dict, query: str, espacos: List[str], limite: int = 10, filtros: dict = None, contexto_embeddings: EmbeddingContext | None = None, combinacao: str | None = None):
+    """
+    Busca híbrida ponderada consultando todos os vetores nomeados numa única chamada near_vector
+    (multi-target vectors, com junção `combinacao`) e executando o BM25 uma única vez.
+    Os candidatos fundidos são reranqueados uma só vez com os mesmos especialistas de buscar_hibrido_ponderado.
+    """
+    combinacao = combinacao or MULTIVETOR_COMBINACAO
+    filtro_desc = f" com filtros ponderados: {filtros}" if filtros else ""
+    print(f"\n--- BUSCA HÍBRIDA MULTI-VETOR '{query}' em {espacos} ({combinacao}){filtro_desc} ---", file=sys.stderr)
+
+    embedding_client = modelos.get("embedding_client")
+    if not embedding_client:
+        print(f"ERRO: Cliente de embeddings não está disponível.", file=sys.stderr)
+        return []
+
+    collection = client.collections.get("Produtos")
+    filtros_weaviate = construir_filtro(filtros)
+
+    # 1. BM25 uma única vez, em paralelo aos embeddings
+    futuro_bm25 = submeter_recuperacao(_buscar_bm25, collection, query, limite * 3, filtros_weaviate)
+
+    # Embeddings de todos os espaços em paralelo
+    encoder = contexto_embeddings or embedding_client
+    futuros_vetores = {
+        espaco: submeter_recuperacao(encoder.encode, query, model_choice=_model_choice_do_espaco(espaco))
+        for espaco in espacos
+    }
+    vetores: Dict[str, List[float]] = {}
+    for espaco, futuro in futuros_vetores.items():
+        try:
+            vetores[espaco] = futuro.result()
+        except Exception as e:
+            print(f"ERRO: Falha ao gerar embedding ({espaco}) para query '{query}': {e}", file=sys.stderr)
+    if not vetores:
+        return []
+
+    # 2. Recuperação semântica multi-vetor numa única chamada
+    try:
+        alvo = _alvo_multivetor(list(vetores), combinacao) if len(vetores) > 1 else next(iter(vetores))
+        with limitar("weaviate"):
+            res_semantica = collection.query.near_vector(
+                near_vector=vetores if len(vetores) > 1 else next(iter(vetores.values())),
+                target_vector=alvo,
+                limit=limite * 3,
+                filters=filtros_weaviate,
+                return_metadata=wvc.query.MetadataQuery(distance=True),
+                return_properties=PROPRIEDADES_RETORNO
+            )
+    except Exception as e:
+        print(f"Erro na busca semântica multi-vetor: {e}", file=sys.stderr)
+        res_semantica = None
+
+    res_bm25 = futuro_bm25.result()
+
+    objs_sem = res_semantica.objects if res_semantica and getattr(res_semantica, 'objects', None) else []
+    objs_bm = res_bm25.objects if res_bm25 and getattr(res_bm25, 'objects', None) else []
+    if not objs_sem and not objs_bm:
+        print("Nenhum resultado encontrado.", file=sys.stderr)
+        return []
+
+    # 3. Reranqueamento único do conjunto fundido
+    lista_final = _fundir_candidatos(list(objs_sem) + list(objs_bm), query, filtros, limite)
+    _exibir_candidatos(lista_final)
     return lista_final
+
+
+def _alpha_por_pesos(pesos: Dict[str, float]) -> float:
+    """
+    Converte os pesos de _detectar_especificidade em alpha da busca híbrida do Weaviate
+    (1 = só vetor, 0 = só BM25): fração semântica entre as componentes de recuperação.
+    """
+    recuperacao = pesos["w_sem"] + pesos["w_txt"] + pesos["w_pc"]
+    return round(pesos["w_sem"] / recuperacao, 2) if recuperacao else 0.5
+
+
+def buscar_hibrido_nativo(client: weaviate.WeaviateClient, modelos: dict, query: str, espacos: List[str], limite: int = 10, filtros: dict = None, contexto_embeddings: EmbeddingContext | None = None, combinacao: str | None = None):
+    """
+    Busca híbrida com fusão no servidor (collection.query.hybrid, fusão por score relativo).
+    O alpha vem dos pesos de _detectar_especificidade; o Weaviate devolve apenas o top-k fundido
+    (com as propriedades necessárias) e o reranker em Python roda só sobre esses candidatos.
+    """
+    combinacao = combinacao or MULTIVETOR_COMBINACAO
+    filtro_desc = f" com filtros ponderados: {filtros}" if filtros else ""
+
+    embedding_client = modelos.get("embedding_client")
+    if not embedding_client:
+        print(f"ERRO: Cliente de embeddings não está disponível.", file=sys.stderr)
+        return []
+
+    termos_pc = preprocess_termos(filtros.get("palavras_chave")) if filtros else []
+    alpha = _alpha_por_pesos(_detectar_especificidade(query, termos_pc))
+    print(f"\n--- BUSCA HÍBRIDA NATIVA '{query}' em {espacos} (alpha={alpha}){filtro_desc} ---", file=sys.stderr)
+
+    # Embeddings de todos os espaços em paralelo
+    encoder = contexto_embeddings or embedding_client
+    futuros_vetores = {
+        espaco: submeter_recuperacao(encoder.encode, query, model_choice=_model_choice_do_espaco(espaco))
+        for espaco in espacos
+    }
+    vetores: Dict[str, List[float]] = {}
+    for espaco, futuro in futuros_vetores.items():
+        try:
+            vetores[espaco] = futuro.result()
+        except Exception as e:
+            print(f"ERRO: Falha ao gerar embedding ({espaco}) para query '{query}': {e}", file=sys.stderr)
+    if not vetores:
+        return []
+
+    collection = client.collections.get("Produtos")
+    try:
+        if len(vetores) > 1:
+            vetor, alvo = vetores, _alvo_multivetor(list(vetores), combinacao)
+        else:
+            alvo, vetor = next(iter(vetores.items()))
+        with limitar("weaviate"):
+            res = collection.query.hybrid(
+                query=query,
+                alpha=alpha,
+                vector=vetor,
+                target_vector=alvo,
+                query_properties=["nome", "tags", "categoria", "descricao"],
+                fusion_type=wvc.query.HybridFusion.RELATIVE_SCORE,
+                limit=limite,
+                filters=construir_filtro(filtros),
+                return_metadata=wvc.query.MetadataQuery(score=True),
+                return_properties=PROPRIEDADES_RETORNO
+            )
+    except Exception as e:
+        print(f"Erro na busca híbrida nativa: {e}", file=sys.stderr)
+        return []
+
+    objs = res.objects if res and getattr(res, 'objects', None) else []
+    if not objs:
+        print("Nenhum resultado encontrado.", file=sys.stderr)
+        return []
+
+    lista_final = _fundir_candidatos(list(objs), query, filtros, limite, score_base="hibrido")
+    _exibir_candidatos(lista_final)
+    return lista_final
+
+
+def _agregar_por_produto(resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Agrega resultados de vários espaços por (nome, categoria), mantendo o melhor score, em ordem decrescente."""
+    agregados: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for item in resultados:
+        categoria = item.get("categoria", "") or item.get("modelo", "")
+        chave = (item["nome"], categoria)
+        atual = agregados.get(chave)
+        if not atual or item["score"] > atual["score"]:
+            agregados[chave] = item
+    lista = list(agregados.values())
+    lista.sort(key=lambda x: x["score"], reverse=True)
+    return lista
+
+
+# Modos de recuperação aceitos por buscar_candidatos (MODO_BUSCA e o campo 'modo_busca' das requisições)
+MODOS_BUSCA = ("por_espaco", "multivetor", "hibrido_nativo")
+
+
+def validar_modo_busca(modo_busca: str | None) -> str:
+    """Devolve o modo efetivo (padrão MODO_BUSCA) ou levanta ValueError para um modo desconhecido."""
+    modo = modo_busca or MODO_BUSCA
+    if modo not in MODOS_BUSCA:
+        raise ValueError(f"modo_busca inválido '{modo}'. Use um de: {', '.join(MODOS_BUSCA)}")
+    return modo
+
+
+if MODO_BUSCA not in MODOS_BUSCA:
+    print(f"⚠️ MODO_BUSCA inválido '{MODO_BUSCA}' (use um de: {', '.join(MODOS_BUSCA)}); buscas sem 'modo_busca' vão falhar", file=sys.stderr)
+
+
+def buscar_candidatos(client: weaviate.WeaviateClient, modelos: dict, query: str, espacos: List[str], limite: int = 10, filtros: dict = None, contexto_embeddings: EmbeddingContext | None = None, modo_busca: str | None = None) -> List[Dict[str, Any]]:
+    """
+    Ponto único de recuperação usado pelos endpoints. Modos (`modo_busca`, padrão MODO_BUSCA):
+    - 'por_espaco': uma busca híbrida por vetor nomeado, agregando o melhor score por produto
+    - 'multivetor': uma única consulta multi-target vectors + um BM25, reranqueada uma vez
+    - 'hibrido_nativo': collection.query.hybrid com fusão no servidor; reranker só no top-k
+    Retorna a lista agregada e ordenada por score (sem corte em `limite`).
+    """
+    modo_busca = validar_modo_busca(modo_busca)
+    if modo_busca == "multivetor":
+        resultados = buscar_hibrido_multivetor(client, modelos, query, espacos, limite=limite, filtros=filtros, contexto_embeddings=contexto_embeddings)
+        return _agregar_por_produto(resultados)
+    if modo_busca == "hibrido_nativo":
+        resultados = buscar_hibrido_nativo(client, modelos, query, espacos, limite=limite, filtros=filtros, contexto_embeddings=contexto_embeddings)
+        return _agregar_por_produto(resultados)
+
+    todos: List[Dict[str, Any]] = []
+    for espaco in espacos:
+        todos.extend(buscar_hibrido_ponderado(client, modelos, query, espaco, limite=limite, filtros=filtros, contexto_embeddings=contexto_embeddings))
+    return _agregar_por_produto(todos)
@@ -0,0 +1,102 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+# Import robusto das configurações
+try:
+    from config import CATALOGO_SNAPSHOT_PATH, SUPABASE_TABLE
+except ImportError:
+    try:
+        from .config import CATALOGO_SNAPSHOT_PATH, SUPABASE_TABLE
+    except ImportError:
+        print("⚠️ Erro ao importar configurações do snapshot do catálogo. Usando valores padrão.")
+        CATALOGO_SNAPSHOT_PATH = None
+        SUPABASE_TABLE = "produtos"
+
+# Incrementar quando o formato do arquivo mudar (snapshots antigos passam a ser ignorados)
+VERSAO_SNAPSHOT = 1
+
+
+def salvar_snapshot(supabase_manager, weaviate_manager, caminho: Optional[str] = CATALOGO_SNAPSHOT_PATH) -> bool:
+    """
+    Grava o estado sincronizado do catálogo em JSON comprimido (gzip): ids do Supabase, watermark,
+    colunas lidas e versão dos modelos de embedding. A escrita é atômica (arquivo temporário + rename),
+    então vários workers podem gravar o mesmo caminho.
+    """
+    if not caminho or supabase_manager is None or weaviate_manager is None:
+        return False
+    estado_weaviate = weaviate_manager.estado_snapshot()
+    dados = {
+        "versao": VERSAO_SNAPSHOT,
+        "tabela": SUPABASE_TABLE,
+        "criado_em": time.time(),
+        "supabase": supabase_manager.estado_snapshot(),
+        "versao_modelos": estado_weaviate["versao_modelos"],
+    }
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(prefix=".catalogo-", dir=pasta)
+    try:
+        with os.fdopen(fd, "wb") as bruto, gzip.GzipFile(fileobj=bruto, mode="wb", compresslevel=6) as arquivo:
+            arquivo.write(json.dumps(dados, separators=(",", ":")).encode("utf-8"))
+        os.replace(temporario, caminho)
+    except Exception:
+        try:
+            os.remove(temporario)
+        except OSError:
+            pass
+        raise
+    print(f"💾 Snapshot do catálogo gravado: {len(dados['supabase']['ids'])} produtos ({caminho})")
+    return True
+
+
+def carregar_snapshot(caminho: Optional[str] = CATALOGO_SNAPSHOT_PATH) -> Optional[Dict[str, Any]]:
+    """Lê o snapshot; None se não existir, estiver corrompido ou for de outro formato/tabela."""
+    if not caminho or not os.path.exists(caminho):
+        return None
+    try:
+        with gzip.open(caminho, "rb") as arquivo:
+            dados = json.loads(arquivo.read().decode("utf-8"))
+    except Exception as e:
+        print(f"⚠️ Snapshot do catálogo ilegível ({caminho}): {e}")
+        return None
+    if dados.get("versao") != VERSAO_SNAPSHOT or dados.get("tabela") != SUPABASE_TABLE:
+        print("⚠️ Snapshot do catálogo de outra versão/tabela; ignorado")
+        return None
+    return dados
+
+
+def restaurar_snapshot(supabase_manager, weaviate_manager, caminho: Optional[str] = CATALOGO_SNAPSHOT_PATH) -> bool:
+    """
+    Restaura o estado de sincronização a partir do snapshot, dispensando a passada completa de
+    indexação no arranque. Só é aceito se os vetores foram gerados pela versão atual dos modelos e
+    se o nº de objetos no Weaviate ainda bater com o nº de ids do snapshot (modelos trocados, coleção
+    recriada ou alterada por fora = reindexação normal).
+    Retorna True se restaurou; a reconciliação com o Supabase fica a cargo do SyncWorker.
+    """
+    dados = carregar_snapshot(caminho)
+    if dados is None:
+        return False
+    estado = dados.get("supabase") or {}
+    ids = estado.get("ids") or []
+    if not ids:
+        return False
+    if dados.get("versao_modelos") != weaviate_manager.versao_modelos():
+        print("⚠️ Snapshot do catálogo gerado com outra versão dos modelos de embedding; ignorado")
+        return False
+    try:
+        total_weaviate = weaviate_manager.total_objetos()
+    except Exception as e:
+        print(f"⚠️ Não foi possível conferir o snapshot com o Weaviate: {e}")
+        return False
+    if total_weaviate != len(ids):
+        print(f"⚠️ Snapshot do catálogo desatualizado ({len(ids)} ids vs {total_weaviate} objetos no Weaviate); ignorado")
+        return False
+    supabase_manager.restaurar_snapshot(estado)
+    weaviate_manager.restaurar_snapshot(set(ids))
+    idade_min = (time.time() - float(dados.get("criado_em") or 0)) / 60
+    print(f"⚡ Catálogo restaurado do snapshot: {len(ids)} produtos (gravado há {idade_min:.0f} min)")
+    return True
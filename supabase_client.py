@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 import sys
 import os
 
@@ -7,16 +7,21 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Imports robustos
 try:
-    from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_TABLE
+    from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_TABLE, SYNC_COLUNA_WATERMARK
+    from config import SUPABASE_PAGINA, SUPABASE_COLUNAS
 except ImportError:
     try:
-        from .config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_TABLE
+        from .config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_TABLE, SYNC_COLUNA_WATERMARK
+        from .config import SUPABASE_PAGINA, SUPABASE_COLUNAS
     except ImportError as e:
         print(f"⚠️ Erro ao importar configurações do Supabase: {e}")
         # Definir valores padrão para evitar falhas
         SUPABASE_URL = None
         SUPABASE_KEY = None
         SUPABASE_TABLE = "produtos"
+        SYNC_COLUNA_WATERMARK = "updated_at"
+        SUPABASE_PAGINA = 1000
+        SUPABASE_COLUNAS = ["id", "nome", "descricao", "categoria", "modelo", "tags", "preco", "estoque", "origem"]
 
 # Imports para Supabase
 try:
@@ -34,35 +39,28 @@ class SupabaseManager:
         self.produtos = []
         # Cache de IDs já carregados para detectar novos produtos em atualizações
         self._last_loaded_ids: set[int] = set()
+        # Sincronização incremental: maior valor de SYNC_COLUNA_WATERMARK já aplicado
+        self.coluna_watermark = SYNC_COLUNA_WATERMARK
+        self.watermark: Optional[str] = None
+        self._suporta_delta: Optional[bool] = None
+        # Leitura paginada: colunas efetivamente selecionadas (descobertas na primeira leitura)
+        # e se self.produtos contém o catálogo inteiro (só quando carregado via refresh)
+        self._colunas: Optional[str] = None
+        self._catalogo_carregado = False
         
     def connect(self):
-        """Conecta ao Supabase e carrega produtos"""
+        """Conecta ao Supabase (o catálogo é lido depois, em páginas, por iterar_produtos/refresh)"""
         if not SUPABASE_AVAILABLE:
             print("❌ Supabase não disponível - instale as dependências")
             return False
             
         try:
             self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-            # Testar conexão e carregar produtos
+            # Testar conexão
             test_query = self.supabase.table(SUPABASE_TABLE).select("count", count="exact").execute()
             total_produtos = test_query.count if test_query.count else 0
             print(f"✅ Supabase conectado - {total_produtos} produtos encontrados")
-            
-            # Carregar todos os produtos
-            result = self.supabase.table(SUPABASE_TABLE).select("*").execute()
-            self.produtos = result.data if result.data else []
-            # manter ids conhecidos
-            self._last_loaded_ids = set()
-            for p in self.produtos:
-                try:
-                    self._last_loaded_ids.add(int(p.get("id") or p.get("produto_id") or 0))
-                except Exception:
-                    pass
-            print(f"📊 {len(self.produtos)} produtos carregados do Supabase")
-            
-            if self.produtos:
-                campos_disponiveis = list(self.produtos[0].keys())
-                print(f"🔧 Campos disponíveis: {campos_disponiveis}")
+            print(f"🔧 Colunas lidas para indexação: {self.colunas_indexacao()}")
             return True
                 
         except Exception as e:
@@ -73,25 +71,116 @@ class SupabaseManager:
     def is_available(self) -> bool:
         """Verifica se o cliente Supabase está disponível."""
         return bool(SUPABASE_AVAILABLE and self.supabase is not None)
+
+    def colunas_indexacao(self) -> str:
+        """
+        Colunas selecionadas na leitura do catálogo: SUPABASE_COLUNAS (+ coluna de watermark)
+        que existem na tabela, conferidas numa linha de amostra. Tabela vazia ou sem 'id' = "*".
+        """
+        if self._colunas is not None:
+            return self._colunas
+        amostra = self.supabase.table(SUPABASE_TABLE).select("*").limit(1).execute()
+        linhas = amostra.data or []
+        if not linhas:
+            return "*"  # nada para conferir ainda; tenta de novo na próxima leitura
+        existentes = set(linhas[0].keys())
+        self._suporta_delta = self.coluna_watermark in existentes
+        if not self._suporta_delta:
+            print(f"⚠️ Coluna '{self.coluna_watermark}' ausente em '{SUPABASE_TABLE}'; sincronização será sempre completa")
+        desejadas = list(SUPABASE_COLUNAS) + [self.coluna_watermark]
+        colunas = [c for c in dict.fromkeys(desejadas) if c in existentes]
+        self._colunas = ",".join(colunas) if "id" in colunas else "*"
+        return self._colunas
+
+    def iterar_paginas(self, colunas: Optional[str] = None, tamanho: Optional[int] = None,
+                       desde: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Lê a tabela em páginas ordenadas por id (keyset: id > último id da página anterior),
+        sem depender do limite de linhas do PostgREST. `colunas` = projeção (padrão:
+        colunas_indexacao()); `desde` filtra por coluna de watermark >= valor.
+        A leitura só termina numa página vazia, então um max-rows menor que `tamanho` não trunca.
+        """
+        if not self.is_available():
+            raise RuntimeError("Supabase não disponível")
+        colunas = colunas or self.colunas_indexacao()
+        tamanho = max(1, int(tamanho or SUPABASE_PAGINA))
+        ultimo_id = None
+        while True:
+            consulta = self.supabase.table(SUPABASE_TABLE).select(colunas)
+            if desde is not None:
+                consulta = consulta.gte(self.coluna_watermark, desde)
+            if ultimo_id is not None:
+                consulta = consulta.gt("id", ultimo_id)
+            pagina = consulta.order("id").limit(tamanho).execute().data or []
+            if not pagina:
+                return
+            ultimo_id = pagina[-1].get("id")
+            yield pagina
+            if ultimo_id is None:
+                return
+
+    def iterar_ids(self) -> set[int]:
+        """Conjunto de ids atuais da tabela (lido em páginas, só a coluna id)."""
+        ids: set[int] = set()
+        for pagina in self.iterar_paginas(colunas="id"):
+            ids.update(self._id_produto(p) for p in pagina)
+        ids.discard(0)
+        return ids
+
+    def iterar_produtos(self, tamanho: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Percorre o catálogo inteiro em páginas, sem guardá-lo em memória. Ao terminar a leitura
+        atualiza os ids conhecidos e o watermark (uma leitura interrompida não altera o estado).
+        """
+        ids: set[int] = set()
+        valores_watermark = []
+        for pagina in self.iterar_paginas(tamanho=tamanho):
+            ids.update(self._id_produto(p) for p in pagina)
+            valores_watermark.extend(p.get(self.coluna_watermark) for p in pagina if p.get(self.coluna_watermark))
+            yield pagina
+        ids.discard(0)
+        self._last_loaded_ids = ids
+        if valores_watermark and self._suporta_delta:
+            maior = max(valores_watermark)
+            if self.watermark is None or maior > self.watermark:
+                self.watermark = maior
+
+    def estado_snapshot(self) -> Dict[str, Any]:
+        """Estado da sincronização salvo no snapshot do catálogo (ids, watermark e colunas)."""
+        return {
+            "ids": sorted(self._last_loaded_ids),
+            "watermark": self.watermark,
+            "suporta_delta": self._suporta_delta,
+            "colunas": self._colunas,
+        }
+
+    def restaurar_snapshot(self, estado: Dict[str, Any]):
+        """Retoma a sincronização do ponto salvo no snapshot (a próxima execução é incremental)."""
+        self._last_loaded_ids = {int(pid) for pid in estado.get("ids") or []}
+        self.watermark = estado.get("watermark")
+        self._suporta_delta = estado.get("suporta_delta")
+        self._colunas = estado.get("colunas") or self._colunas
+
+    def total_produtos(self) -> int:
+        """Nº de produtos vistos na última leitura completa (ou delta confirmado)."""
+        return len(self._last_loaded_ids)
         
     def get_produtos(self) -> List[Dict[str, Any]]:
-        """Retorna lista de produtos carregados"""
+        """Retorna a lista de produtos (carrega o catálogo inteiro na primeira chamada)"""
+        if not self._catalogo_carregado and self.is_available():
+            self.refresh()
         return self.produtos
 
     def refresh(self) -> List[Dict[str, Any]]:
-        """Recarrega a lista de produtos do Supabase e retorna a lista completa atualizada."""
+        """Recarrega a lista de produtos do Supabase (em páginas) e retorna a lista completa atualizada."""
         if not self.is_available():
             return self.produtos
         try:
-            result = self.supabase.table(SUPABASE_TABLE).select("*").execute()
-            self.produtos = result.data if result.data else []
-            # atualizar ids conhecidos
-            self._last_loaded_ids = set()
-            for p in self.produtos:
-                try:
-                    self._last_loaded_ids.add(int(p.get("id") or p.get("produto_id") or 0))
-                except Exception:
-                    pass
+            produtos: List[Dict[str, Any]] = []
+            for pagina in self.iterar_produtos():
+                produtos.extend(pagina)
+            self.produtos = produtos
+            self._catalogo_carregado = True
             return self.produtos
         except Exception as e:
             print(f"⚠️ Falha ao atualizar produtos do Supabase: {e}")
@@ -102,23 +191,61 @@ class SupabaseManager:
         if not self.is_available():
             return []
         try:
-            result = self.supabase.table(SUPABASE_TABLE).select("*").execute()
-            dados = result.data if result.data else []
+            conhecidos = set(self._last_loaded_ids)
             novos = []
-            ids_atuais: set[int] = set()
-            for p in dados:
-                try:
-                    pid = int(p.get("id") or p.get("produto_id") or 0)
-                except Exception:
-                    pid = 0
-                if pid:
-                    ids_atuais.add(pid)
-                    if pid not in self._last_loaded_ids:
-                        novos.append(p)
-            # atualizar cache e lista principal
-            self.produtos = dados
-            self._last_loaded_ids = ids_atuais
+            for pagina in self.iterar_produtos():
+                novos.extend(p for p in pagina if self._id_produto(p) and self._id_produto(p) not in conhecidos)
             return novos
         except Exception as e:
             print(f"⚠️ Falha ao obter novos produtos do Supabase: {e}")
             return []
+
+    @staticmethod
+    def _id_produto(p: Dict[str, Any]) -> int:
+        try:
+            return int(p.get("id") or p.get("produto_id") or 0)
+        except Exception:
+            return 0
+
+    def suporta_delta(self) -> bool:
+        """True quando a tabela tem a coluna de atualização e já existe um watermark de partida."""
+        return bool(self._suporta_delta and self.watermark)
+
+    def buscar_delta(self) -> Dict[str, Any]:
+        """
+        Busca apenas o que mudou desde o último watermark aplicado:
+        - 'alterados': linhas com coluna de atualização >= watermark (novas ou editadas)
+        - 'removidos': ids conhecidos que não existem mais na tabela (diff de ids, só a coluna id)
+        - 'ids': ids atuais da tabela; 'watermark': novo watermark candidato
+        Não altera o estado: confirmar com confirmar_delta() depois de aplicar no Weaviate.
+        O filtro usa >= para não perder linhas gravadas no mesmo instante do watermark
+        (reprocessá-las é inócuo: o plano de indexação resulta em 'nenhuma').
+        """
+        if not self.is_available():
+            raise RuntimeError("Supabase não disponível")
+        if not self.suporta_delta():
+            raise RuntimeError("Sincronização incremental indisponível (sem watermark)")
+        alterados: List[Dict[str, Any]] = []
+        for pagina in self.iterar_paginas(desde=self.watermark):
+            alterados.extend(pagina)
+        ids = self.iterar_ids()
+        valores = [p.get(self.coluna_watermark) for p in alterados if p.get(self.coluna_watermark)]
+        novo_watermark = max([self.watermark] + valores)
+        return {
+            "alterados": alterados,
+            "removidos": self._last_loaded_ids - ids,
+            "ids": ids,
+            "watermark": novo_watermark,
+        }
+
+    def confirmar_delta(self, delta: Dict[str, Any]):
+        """Aplica o delta ao estado local (lista de produtos, ids conhecidos e watermark)."""
+        ids = delta.get("ids", set())
+        if self._catalogo_carregado:
+            alterados_por_id = {self._id_produto(p): p for p in delta.get("alterados", [])}
+            produtos = [alterados_por_id.pop(self._id_produto(p), p) for p in self.produtos if self._id_produto(p) in ids]
+            produtos.extend(p for pid, p in alterados_por_id.items() if pid in ids)
+            self.produtos = produtos
+        self._last_loaded_ids = set(ids)
+        if delta.get("watermark"):
+            self.watermark = delta["watermark"]
@@ -0,0 +1,202 @@
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+# Import robusto das configurações
+try:
+    from config import SYNC_INTERVAL_SECONDS, SYNC_COMPLETA_A_CADA
+except ImportError:
+    try:
+        from .config import SYNC_INTERVAL_SECONDS, SYNC_COMPLETA_A_CADA
+    except ImportError:
+        print("⚠️ Erro ao importar configurações de sincronização. Usando valores padrão.")
+        SYNC_INTERVAL_SECONDS = 300.0
+        SYNC_COMPLETA_A_CADA = 12
+
+
+class SyncWorker:
+    """
+    Sincronização Supabase → Weaviate fora do caminho das requisições.
+
+    Uma thread daemon executa a sincronização a cada `intervalo` segundos (0 = apenas sob demanda)
+    ou quando `disparar()` é chamado. As buscas leem o último estado sincronizado e nunca esperam
+    pela sincronização. Execuções nunca se sobrepõem: um pedido feito durante uma execução é
+    atendido pela execução seguinte.
+
+    Quando a tabela tem a coluna de atualização (SYNC_COLUNA_WATERMARK), cada execução é incremental:
+    só as linhas alteradas desde o último watermark são lidas e indexadas, e as remoções saem do
+    diff de ids. A cada `completa_a_cada` execuções incrementais (0 = nunca) e sempre que o modo
+    incremental não estiver disponível ou falhar, roda a sincronização completa.
+
+    `apos_sincronizar` (opcional) é chamado depois de cada sincronização bem-sucedida, por exemplo
+    para gravar o snapshot do catálogo; falhas nele só são registradas.
+    """
+
+    def __init__(self, supabase_manager, weaviate_manager, intervalo: float = SYNC_INTERVAL_SECONDS,
+                 completa_a_cada: int = SYNC_COMPLETA_A_CADA,
+                 apos_sincronizar: Optional[Callable[[], Any]] = None):
+        self.supabase_manager = supabase_manager
+        self.weaviate_manager = weaviate_manager
+        self.intervalo = max(0.0, float(intervalo or 0))
+        self.completa_a_cada = max(0, int(completa_a_cada or 0))
+        self.apos_sincronizar = apos_sincronizar
+        self._incrementais_seguidas = 0
+        self._pedido = threading.Event()
+        self._parar = threading.Event()
+        self._lock_execucao = threading.Lock()
+        self._lock_estado = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._estado: Dict[str, Any] = {
+            "em_execucao": False,
+            "execucoes": 0,
+            "falhas_consecutivas": 0,
+            "ultima_execucao": None,
+            "ultimo_sucesso": None,
+            "duracao_s": None,
+            "ultimo_resultado": None,
+            "ultimo_erro": None,
+        }
+
+    def iniciar(self):
+        """Inicia a thread de sincronização (idempotente)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name="sync-worker", daemon=True)
+        self._thread.start()
+        modo = f"a cada {self.intervalo:g}s" if self.intervalo else "apenas sob demanda"
+        print(f"🔁 SyncWorker iniciado ({modo})")
+
+    def parar(self, timeout: float = 5.0):
+        self._parar.set()
+        self._pedido.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def disparar(self) -> bool:
+        """Pede uma sincronização em background. Retorna True se já havia uma em execução."""
+        self._pedido.set()
+        return self.em_execucao()
+
+    def em_execucao(self) -> bool:
+        with self._lock_estado:
+            return bool(self._estado["em_execucao"])
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self._pedido.wait(timeout=self.intervalo or None)
+            if self._parar.is_set():
+                break
+            self._pedido.clear()
+            try:
+                self.sincronizar_agora()
+            except Exception:
+                # sincronizar_agora já registra o erro no estado; o laço continua
+                pass
+
+    def sincronizar_agora(self, completa: bool = False) -> Dict[str, Any]:
+        """
+        Executa uma sincronização na thread atual e devolve o resultado:
+        {'modo', 'produtos_total_supabase', 'novos', 'atualizados', 'removidos', 'falhas'}.
+        `completa=True` força a sincronização completa. Se outra execução estiver em andamento,
+        espera por ela antes de começar.
+        """
+        with self._lock_execucao:
+            inicio = time.time()
+            with self._lock_estado:
+                self._estado["em_execucao"] = True
+                self._estado["ultima_execucao"] = datetime.now().isoformat()
+            try:
+                resultado = self._sincronizar(completa)
+            except Exception as e:
+                with self._lock_estado:
+                    self._estado.update({
+                        "em_execucao": False,
+                        "execucoes": self._estado["execucoes"] + 1,
+                        "falhas_consecutivas": self._estado["falhas_consecutivas"] + 1,
+                        "duracao_s": round(time.time() - inicio, 3),
+                        "ultimo_erro": str(e)[:500],
+                    })
+                print(f"⚠️ Falha na sincronização em background: {e}")
+                traceback.print_exc()
+                raise
+            with self._lock_estado:
+                self._estado.update({
+                    "em_execucao": False,
+                    "execucoes": self._estado["execucoes"] + 1,
+                    "falhas_consecutivas": 0,
+                    "ultimo_sucesso": datetime.now().isoformat(),
+                    "duracao_s": round(time.time() - inicio, 3),
+                    "ultimo_resultado": resultado,
+                    "ultimo_erro": None,
+                })
+            if self.apos_sincronizar is not None:
+                try:
+                    self.apos_sincronizar()
+                except Exception as e:
+                    print(f"⚠️ Falha após a sincronização: {e}")
+            return resultado
+
+    def _sincronizar(self, completa: bool = False) -> Dict[str, Any]:
+        if not self.supabase_manager:
+            raise RuntimeError("Supabase não disponível")
+        if not self.supabase_manager.is_available():
+            # Conexão que falhou no arranque (ou caiu): cada execução tenta de novo
+            print("🔌 Supabase indisponível; tentando reconectar...")
+            if not self.supabase_manager.connect():
+                raise RuntimeError("Supabase não disponível")
+        vencida = bool(self.completa_a_cada) and self._incrementais_seguidas >= self.completa_a_cada
+        if not completa and not vencida and self.supabase_manager.suporta_delta():
+            try:
+                return self._sincronizar_delta()
+            except Exception as e:
+                print(f"⚠️ Sincronização incremental falhou ({e}); executando sincronização completa")
+        return self._sincronizar_completa()
+
+    def _sincronizar_delta(self) -> Dict[str, Any]:
+        delta = self.supabase_manager.buscar_delta()
+        if not delta["ids"] and delta["removidos"]:
+            # Segurança (como na completa): não apagar o catálogo inteiro por causa de uma leitura vazia
+            raise RuntimeError("Supabase devolveu 0 ids")
+        metricas = self.weaviate_manager.sincronizar_delta(delta["alterados"], delta["removidos"])
+        if not metricas.get("falhas"):
+            # Só avança o watermark quando tudo foi aplicado; senão a próxima execução repete as linhas
+            self.supabase_manager.confirmar_delta(delta)
+        self._incrementais_seguidas += 1
+        return {
+            "modo": "incremental",
+            "produtos_total_supabase": len(delta["ids"]),
+            "linhas_alteradas": len(delta["alterados"]),
+            "novos": int(metricas.get("novos", 0)),
+            "atualizados": int(metricas.get("atualizados", 0)),
+            "removidos": int(metricas.get("removidos", 0)),
+            "falhas": int(metricas.get("falhas", 0)),
+            "watermark": self.supabase_manager.watermark,
+        }
+
+    def _sincronizar_completa(self) -> Dict[str, Any]:
+        # Catálogo lido em páginas e indexado página a página (memória limitada ao tamanho da página)
+        metricas = self.weaviate_manager.sincronizar_paginas(self.supabase_manager.iterar_produtos())
+        self._incrementais_seguidas = 0
+        total = int(metricas.get("total", 0))
+        if not total:
+            print("📊 Nenhum produto encontrado no Supabase; Weaviate mantido como está")
+        return {
+            "modo": "completa",
+            "produtos_total_supabase": total,
+            "novos": int(metricas.get("novos", 0)),
+            "atualizados": int(metricas.get("atualizados", 0)),
+            "removidos": int(metricas.get("removidos", 0)),
+            "falhas": int(metricas.get("falhas", 0)),
+            "watermark": getattr(self.supabase_manager, "watermark", None),
+        }
+
+    def estado(self) -> Dict[str, Any]:
+        with self._lock_estado:
+            estado = dict(self._estado)
+        estado["intervalo_s"] = self.intervalo
+        estado["thread_ativa"] = bool(self._thread is not None and self._thread.is_alive())
+        estado["pedido_pendente"] = self._pedido.is_set()
+        return estado
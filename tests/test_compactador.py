@@ -0,0 +1,22 @@
+from compactador import compactar_descricao
+
+
+def test_mantem_trecho_descritivo_antes_das_especificacoes():
+    descricao = "Impressora laser monocromática; 38 ppm, duplex"
+    assert compactar_descricao(descricao, "HP M404dn", [], 400) == descricao
+
+
+def test_trecho_descritivo_respeita_limite():
+    descricao = "Impressora laser monocromática de alto rendimento para escritório; 38 ppm"
+    assert compactar_descricao(descricao, "HP M404dn", [], 10) == "Impressora"
+
+
+def test_termos_da_query_casam_palavras_inteiras():
+    descricao = "Garantia de 2 anos. Papel A4 incluído. Chapa de aço"
+    # "a4" não pode casar dentro de "chapa" nem "hp" dentro de "chapa"
+    assert compactar_descricao(descricao, "Produto", ["a4", "hp"], 22) == "Papel A4 incluído"
+
+
+def test_boilerplate_descartado_sem_termos_da_query():
+    descricao = "Imagem meramente ilustrativa. Switch gerenciável 24 portas PoE"
+    assert compactar_descricao(descricao, "Switch", ["poe"], 400) == "Switch gerenciável 24 portas PoE"
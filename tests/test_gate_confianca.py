@@ -0,0 +1,44 @@
+import pytest
+
+import search_engine
+from text_utils import extrair_modelos
+
+
+@pytest.mark.parametrize("query", [
+    "switch 24 portas poe gerenciavel",
+    "monitor 27 polegadas 4k",
+    "portatil 16gb ram",
+    "impressora 38 ppm 1200x1200 dpi",
+    "cabo rj45 cat6 2m",
+])
+def test_especificacoes_nao_sao_modelos(query):
+    assert extrair_modelos(query) == []
+
+
+@pytest.mark.parametrize("query, esperado", [
+    ("Impressora HP LaserJet Pro M404dn", ["m404dn"]),
+    ("Câmara Hikvision DS-2CD2143G2-I", ["ds-2cd2143g2-i"]),
+    ("Dell Latitude 5440 i7-1355U 16GB", ["i7-1355u"]),
+])
+def test_codigos_de_modelo(query, esperado):
+    assert extrair_modelos(query) == esperado
+
+
+def _candidatos(nome_melhor):
+    return [
+        {"nome": nome_melhor, "produto_id": 1, "score": 0.95, "score_textual": 0.95},
+        {"nome": "Outro produto", "produto_id": 2, "score": 0.40, "score_textual": 0.30},
+    ]
+
+
+def test_gate_nao_aceita_query_generica(monkeypatch):
+    monkeypatch.setattr(search_engine, "RERANK_GATE_ATIVO", True)
+    candidatos = _candidatos("Switch 24 Portas Gigabit Não Gerenciável")
+    assert search_engine.avaliar_gate_confianca("switch 24 portas poe gerenciavel", candidatos) is None
+    assert search_engine.avaliar_gate_confianca("monitor 27 polegadas 4k", _candidatos("Monitor 27 Full HD")) is None
+
+
+def test_gate_aceita_modelo_exato(monkeypatch):
+    monkeypatch.setattr(search_engine, "RERANK_GATE_ATIVO", True)
+    resultado = search_engine.avaliar_gate_confianca("impressora hp m404dn", _candidatos("HP LaserJet Pro M404dn"))
+    assert resultado is not None and resultado["index"] == 0
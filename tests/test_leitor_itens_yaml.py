@@ -0,0 +1,80 @@
+import pytest
+import yaml
+
+from decomposer import _LeitorItensYAML
+from models import ComponenteParaAquisicao
+
+YAML_INDENTADO = """solucao_principal: Escritório
+tipo_de_solucao: sistema
+itens_a_comprar:
+  - nome: Impressora laser
+    prioridade: alta
+    categoria: Impressoras
+    justificativa: Impressão do escritório
+    tags: [laser, a4]
+  - nome: Switch 24 portas
+    prioridade: media
+    categoria: Networking
+    justificativa: |
+      Liga os postos de trabalho.
+
+      - inclui PoE para os telefones
+    quantidade: 2
+prazo_implementacao_dias: 10
+"""
+
+# Marcadores "- " no mesmo nível da chave da lista, sem chave a seguir (a lista termina no fim do stream)
+YAML_SEM_INDENTACAO = """itens_a_comprar:
+- nome: Impressora laser
+  prioridade: alta
+  categoria: Impressoras
+  justificativa: >
+    Impressão do escritório,
+    frente e verso
+- nome: Switch 24 portas
+  prioridade: media
+  categoria: Networking
+  justificativa: Rede
+"""
+
+
+def _ler(texto, tamanho):
+    """Alimenta o leitor em pedaços de `tamanho` caracteres; devolve [(pedaço em que saiu, índice, item)]."""
+    leitor = _LeitorItensYAML()
+    saida = []
+    for n, inicio in enumerate(range(0, len(texto), tamanho)):
+        saida += [(n, i, item) for i, item in leitor.alimentar(texto[inicio:inicio + tamanho])]
+    saida += [(None, i, item) for i, item in leitor.finalizar()]
+    return saida
+
+
+def _itens_do_yaml_completo(texto):
+    return [ComponenteParaAquisicao.model_validate(d) for d in yaml.safe_load(texto)["itens_a_comprar"]]
+
+
+@pytest.mark.parametrize("tamanho", [1, 7, 64, 10_000])
+def test_lista_indentada_com_bloco_literal(tamanho):
+    itens = _ler(YAML_INDENTADO, tamanho)
+    assert [(i, item.nome) for _, i, item in itens] == [(1, "Impressora laser"), (2, "Switch 24 portas")]
+    assert itens[0][2].tags == ["laser", "a4"]
+    assert itens[1][2].justificativa == "Liga os postos de trabalho.\n\n- inclui PoE para os telefones\n"
+    assert itens[1][2].quantidade == 2
+    assert [item for _, _, item in itens] == _itens_do_yaml_completo(YAML_INDENTADO)
+    # a chave seguinte à lista fecha o último item antes do fim do stream
+    assert itens[1][0] is not None
+
+
+@pytest.mark.parametrize("tamanho", [1, 5, 10_000])
+def test_lista_sem_indentacao_com_bloco_dobrado(tamanho):
+    itens = _ler(YAML_SEM_INDENTACAO, tamanho)
+    assert [(i, item.nome) for _, i, item in itens] == [(1, "Impressora laser"), (2, "Switch 24 portas")]
+    assert itens[0][2].justificativa == "Impressão do escritório, frente e verso\n"
+    assert [item for _, _, item in itens] == _itens_do_yaml_completo(YAML_SEM_INDENTACAO)
+    if tamanho == 1:
+        # o primeiro item sai assim que o segundo começa, antes do fim do stream
+        assert itens[0][0] is not None and itens[1][0] is None
+
+
+def test_item_invalido_fica_para_o_yaml_completo():
+    itens = _ler("itens_a_comprar:\n  - nome: Sem prioridade\n  - nome: Rato\n    prioridade: baixa\n    categoria: Periféricos\n    justificativa: x\n", 16)
+    assert [(i, item.nome) for _, i, item in itens] == [(2, "Rato")]
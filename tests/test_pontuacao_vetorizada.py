@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+import search_engine
+from text_utils import normalizar_campos_produto
+
+VOCABULARIO = ["impressora", "laser", "hp", "m404dn", "38 ppm", "a4", "duplex", "wi-fi", "portátil", "i7",
+               "16gb", "switch", "24", "portas", "poe", "câmara", "4mp", "de", "para", "1200x1200", "dpi"]
+CATEGORIAS = ["Impressoras", "Computadores", "Networking", "Videovigilância", ""]
+
+
+def _texto(rng, n):
+    return " ".join(rng.choice(VOCABULARIO) for _ in range(rng.randint(0, n)))
+
+
+def _produto(rng):
+    p = {"nome": _texto(rng, 6), "categoria": rng.choice(CATEGORIAS), "descricao": _texto(rng, 15),
+         "tags": [_texto(rng, 2) for _ in range(rng.randint(0, 3))], "estoque": rng.choice([0, 3, "x"])}
+    if rng.random() < 0.5:  # metade com os campos *_norm da indexação
+        p.update(normalizar_campos_produto(p))
+    return p
+
+
+@pytest.mark.parametrize("semente", range(300))
+def test_vetorizado_igual_ao_calculo_por_objeto(semente):
+    rng = random.Random(semente)
+    produtos = [_produto(rng) for _ in range(rng.randint(1, 12))]
+    semanticos = [rng.random() for _ in produtos]
+    query = _texto(rng, 5)
+    filtros = rng.choice([None, {}, {"categoria": rng.choice(CATEGORIAS + [["impressoras", "networking"]])}])
+    termos_pc = [_texto(rng, 2) for _ in range(rng.randint(0, 3))]
+    pesos = search_engine._detectar_especificidade(query, termos_pc)
+
+    scores = search_engine.pontuar_candidatos(produtos, semanticos, query, filtros, termos_pc, pesos)
+    vetorizado = list(zip(*(scores[k].tolist() for k in ("hibrido", "semantico", "textual", "palavras_chave", "filtro"))))
+    por_objeto = [search_engine._pontuar_objeto(p, s, query, filtros, termos_pc, pesos) for p, s in zip(produtos, semanticos)]
+    assert vetorizado == por_objeto
@@ -1,5 +1,6 @@
 import re
 import unicodedata
+from functools import lru_cache
 from typing import List, Dict
 import sys
 import os
@@ -9,14 +10,15 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import robusto das configurações
 try:
-    from config import SYNONYMS, STOPWORDS_PT
+    from config import SYNONYMS, STOPWORDS_PT, NORMALIZE_CACHE_SIZE
 except ImportError:
     try:
-        from .config import SYNONYMS, STOPWORDS_PT
+        from .config import SYNONYMS, STOPWORDS_PT, NORMALIZE_CACHE_SIZE
     except ImportError:
         print("⚠️ Erro ao importar configurações. Usando valores padrão.")
         SYNONYMS = {}
         STOPWORDS_PT = set()
+        NORMALIZE_CACHE_SIZE = 16384
 
 # normalização sem dependências externas pesadas; usa unidecode se existir
 try:
@@ -24,11 +26,9 @@ try:
 except Exception:  # pragma: no cover
     _unidecode = None
 
-def normalize_text(s: str) -> str:
-    """Normaliza texto para matching robusto: minúsculas, sem acentos, hífens unificados."""
-    if not s:
-        return ""
-    s = str(s).lower()
+def _normalize_text_impl(s: str) -> str:
+    """Implementação sem memoização de normalize_text."""
+    s = s.lower()
     # substituir hífens não-ASCII por '-'
     s = s.replace("\u2011", "-").replace("\u2013", "-").replace("\u2014", "-").replace("\xad", "-")
     # remover acentos
@@ -43,6 +43,39 @@ def normalize_text(s: str) -> str:
     s = re.sub(r"\s+", " ", s).strip()
     return s
 
+_normalize_text_cache = lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(_normalize_text_impl) if NORMALIZE_CACHE_SIZE > 0 else _normalize_text_impl
+
+def normalize_text(s: str) -> str:
+    """Normaliza texto para matching robusto: minúsculas, sem acentos, hífens unificados."""
+    if not s:
+        return ""
+    return _normalize_text_cache(str(s))
+
+# Campos textuais do produto guardados já normalizados no índice (<campo>_norm)
+CAMPOS_NORMALIZADOS = ("nome", "categoria", "descricao", "tags")
+
+def _texto_do_campo(produto: dict, campo: str) -> str:
+    """Texto bruto de um campo do produto (categoria com fallback para modelo; tags unidas)."""
+    if campo == "categoria":
+        return produto.get("categoria", "") or produto.get("modelo", "")
+    if campo == "tags":
+        tags_raw = produto.get("tags", [])
+        if isinstance(tags_raw, list):
+            return " ".join(str(tag) for tag in tags_raw)
+        return str(tags_raw) if tags_raw else ""
+    return produto.get(campo, "")
+
+def normalizar_campos_produto(produto: dict) -> Dict[str, str]:
+    """Calcula os campos normalizados ({campo}_norm) armazenados junto do produto na indexação."""
+    return {f"{campo}_norm": normalize_text(_texto_do_campo(produto, campo)) for campo in CAMPOS_NORMALIZADOS}
+
+def campo_normalizado(produto: dict, campo: str) -> str:
+    """Lê o campo normalizado pré-calculado; normaliza na hora se o objeto ainda não o tiver."""
+    pre = produto.get(f"{campo}_norm")
+    if pre is not None:
+        return pre
+    return normalize_text(_texto_do_campo(produto, campo))
+
 def preprocess_termos(termos: List[str] = None) -> List[str]:
     """Divide termos por vírgula/"/" e normaliza espaços; remove vazios."""
     if not termos:
@@ -58,12 +91,33 @@ def preprocess_termos(termos: List[str] = None) -> List[str]:
                 out.append(p)
     return out
 
+# Modelos: mistura de letras + números (ex.: "m404dn", "latitude 5440", "ds-2cd2143")
+_RE_MODELO = re.compile(r"[a-z]+[\- ]?\d{2,}[a-z0-9\-]*")
+
+# Códigos de modelo exatos: um único token com letras e dígitos ("m404dn", "ds-2cd2143g2-i").
+# Não contam números com unidade ("16gb", "4k", "1080p"), resoluções ("1200x1200") nem normas genéricas
+_RE_NUMERO_UNIDADE = re.compile(r"\d+(?:[.,]\d+)?[a-z]{1,4}|\d+x\d+")
+_CODIGOS_GENERICOS = {
+    "rj11", "rj45", "cat5", "cat5e", "cat6", "cat6a", "cat7", "usb2", "usb3", "wifi5", "wifi6", "wifi6e",
+    "ddr3", "ddr4", "ddr5", "ipv4", "ipv6", "mp3", "mp4", "h264", "h265", "ip65", "ip66", "ip67", "ip68",
+}
+
+def extrair_modelos(texto: str) -> List[str]:
+    """Códigos de modelo (tokens com letras e dígitos, sem unidades nem normas) do texto normalizado."""
+    modelos = []
+    for token in normalize_text(texto).split():
+        token = token.strip("-")
+        if (len(token) >= 3 and re.search(r"[a-z]", token) and re.search(r"\d", token)
+                and not _RE_NUMERO_UNIDADE.fullmatch(token) and token not in _CODIGOS_GENERICOS):
+            modelos.append(token)
+    return modelos
+
 def _detectar_especificidade(query: str, termos: List[str]) -> Dict[str, float]:
     """Define pesos dinâmicos conforme presença de modelo/marca e números com unidades."""
     qn = normalize_text(query)
     all_text = " ".join([qn] + [normalize_text(t) for t in termos])
     # padrões: modelos (mix letra+numero), unidades comuns
-    has_model = bool(re.search(r"[a-z]+[\- ]?\d{2,}[a-z0-9\-]*", all_text))
+    has_model = bool(_RE_MODELO.search(all_text))
     has_units = bool(re.search(r"(\b\d{2,}\s?(ppm|dpi)\b|\ba\d\b|\b1200x1200\b)", all_text))
     if has_model or has_units:
         return {"w_sem": 0.50, "w_txt": 0.20, "w_pc": 0.25, "w_flt": 0.05}
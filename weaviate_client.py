@@ -1,3 +1,4 @@
+import hashlib
 import weaviate
 import weaviate.classes as wvc
 from gradio_client import Client
@@ -10,17 +11,37 @@ import time
 
 # Importar configurações usando try/except para robustez
 try:
-    from config import WEAVIATE_HOST, WEAVIATE_PORT, API_KEY_WEAVIATE
+    from config import WEAVIATE_HOST, WEAVIATE_PORT, API_KEY_WEAVIATE, WEAVIATE_BATCH_SIZE
+    from config import MODELO_PT, MODELO_MULTI, EMBEDDING_VERSAO, WEAVIATE_IDS_CACHE_TTL
+    from config import EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH
 except ImportError:
     # Fallback para import relativo
     try:
-        from .config import WEAVIATE_HOST, WEAVIATE_PORT, API_KEY_WEAVIATE
+        from .config import WEAVIATE_HOST, WEAVIATE_PORT, API_KEY_WEAVIATE, WEAVIATE_BATCH_SIZE
+        from .config import MODELO_PT, MODELO_MULTI, EMBEDDING_VERSAO, WEAVIATE_IDS_CACHE_TTL
+        from .config import EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH
     except ImportError:
         # Último recurso: definir valores padrão
         print("⚠️ Aviso: Não foi possível importar configurações do Weaviate. Usando valores padrão.")
         WEAVIATE_HOST = "localhost"
         WEAVIATE_PORT = 8080
         API_KEY_WEAVIATE = None
+        WEAVIATE_BATCH_SIZE = 100
+        MODELO_PT = 'neuralmind/bert-base-portuguese-cased'
+        MODELO_MULTI = 'paraphrase-multilingual-mpnet-base-v2'
+        EMBEDDING_VERSAO = "1"
+        WEAVIATE_IDS_CACHE_TTL = 3600.0
+        EMBEDDING_CACHE_SIZE = 4096
+        EMBEDDING_CACHE_PATH = ""
+
+try:
+    from cache import EmbeddingCache
+    from concorrencia import limitar
+    from text_utils import normalizar_campos_produto, CAMPOS_NORMALIZADOS
+except ImportError:
+    from .cache import EmbeddingCache
+    from .concorrencia import limitar
+    from .text_utils import normalizar_campos_produto, CAMPOS_NORMALIZADOS
 
 warnings.filterwarnings("ignore", category=UserWarning, module="google.protobuf")
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -37,6 +58,14 @@ class HuggingFaceEmbeddingClient:
         self.backoff_seconds = float(os.environ.get("EMBEDDING_RETRY_BACKOFF", backoff_seconds or 3.0))
         # Timeout configurável para operações de embedding
         self.embedding_timeout = int(os.environ.get("EMBEDDING_TIMEOUT", 120))
+        # Limites de cada lote enviado ao Space em encode_batch (nº de textos e total de caracteres)
+        self.batch_size = max(1, int(os.environ.get("EMBEDDING_BATCH_SIZE", 32)))
+        self.batch_max_chars = max(1, int(os.environ.get("EMBEDDING_BATCH_MAX_CHARS", 20000)))
+        # Se o Space devolve um embedding por linha, por modelo: descoberto no primeiro lote
+        # (ausente = ainda não testado); após uma resposta incompatível o lote deixa de ser usado
+        self.lote_suportado: Dict[str, bool] = {}
+        # Cache de embeddings (memória LRU + disco opcional) na frente do Space
+        self.cache = EmbeddingCache(maxsize=EMBEDDING_CACHE_SIZE, caminho_disco=EMBEDDING_CACHE_PATH or None)
         
     def connect(self, timeout: int = 30):
         """Conecta ao cliente da API do Hugging Face com timeout configurável"""
@@ -55,46 +84,37 @@ class HuggingFaceEmbeddingClient:
         except Exception as e:
             print(f"❌ Erro ao conectar à API do Hugging Face: {e}")
             raise
-            
-    def encode(self, text: str, model_choice: str = "mpnet") -> List[float]:
+
+    def _predict_com_retries(self, texts: str, model_choice: str) -> Any:
         """
-        Gera embedding para um texto usando a API do Hugging Face
-        
-        Args:
-            text: Texto para gerar embedding
-            model_choice: Modelo a usar ('mpnet' ou 'bertimbau')
-            
-        Returns:
-            Lista de floats representando o embedding
+        Chama o endpoint /predict do Space com retries e backoff exponencial.
+        Retorna a resposta bruta do Gradio (lista de embeddings).
         """
-        if not self.client:
-            print("🔄 Conectando ao cliente de embeddings (inicialização lazy)...")
-            self.connect()
-            
         last_exc: Exception | None = None
         for attempt in range(1, self.max_retries + 1):
             start_time = time.time()  # Definir antes do try para estar disponível no except
             try:
+                # Referência local: outra thread pode estar reconectando o cliente
+                client = self.client
+                if not client:
+                    print("🔄 Conectando ao cliente de embeddings (inicialização lazy)...")
+                    self.connect()
+                    client = self.client
                 print(f"🔍 Tentando gerar embedding (tentativa {attempt}/{self.max_retries}, timeout={self.embedding_timeout}s)...")
                 
-                result = self.client.predict(
-                    texts=text,
-                    model_choice=model_choice,
-                    api_name="/predict"
-                )
+                with limitar("hf"):
+                    result = client.predict(
+                        texts=texts,
+                        model_choice=model_choice,
+                        api_name="/predict"
+                    )
                 
                 elapsed = time.time() - start_time
                 print(f"✅ Embedding gerado com sucesso em {elapsed:.2f}s")
 
-                # Gradio retorna [[...]] para um texto, precisa "achatar"
                 if isinstance(result, list) and len(result) > 0:
-                    # Se veio [[...]], pega só o primeiro (para um texto)
-                    if isinstance(result[0], list):
-                        return result[0]  # Retorna apenas o embedding do primeiro texto
-                    else:
-                        return result  # Já está no formato correto
-                else:
-                    raise Exception(f"Formato de resposta inesperado: {type(result)}")
+                    return result
+                raise Exception(f"Formato de resposta inesperado: {type(result)}")
 
             except Exception as e:
                 last_exc = e
@@ -137,6 +157,92 @@ class HuggingFaceEmbeddingClient:
         
         print(f"❌ {error_summary}")
         raise last_exc if last_exc else Exception("Falha desconhecida ao gerar embedding")
+            
+    def encode(self, text: str, model_choice: str = "mpnet") -> List[float]:
+        """
+        Gera embedding para um texto usando a API do Hugging Face
+        
+        Args:
+            text: Texto para gerar embedding
+            model_choice: Modelo a usar ('mpnet' ou 'bertimbau')
+            
+        Returns:
+            Lista de floats representando o embedding
+        """
+        emb = self.cache.get(text, model_choice)
+        if emb is None:
+            emb = self._encode_remoto(text, model_choice)
+            self.cache.set(text, model_choice, emb)
+        return emb
+
+    def _encode_remoto(self, text: str, model_choice: str) -> List[float]:
+        """Gera o embedding de um único texto no Space, sem passar pelo cache."""
+        result = self._predict_com_retries(text, model_choice)
+        # Gradio retorna [[...]] para um texto, precisa "achatar"
+        if isinstance(result[0], list):
+            return result[0]  # Retorna apenas o embedding do primeiro texto
+        return result  # Já está no formato correto
+
+    def _dividir_em_lotes(self, textos: List[str]) -> List[List[str]]:
+        """Divide os textos em lotes limitados por quantidade e por total de caracteres."""
+        lotes: List[List[str]] = []
+        atual: List[str] = []
+        chars = 0
+        for t in textos:
+            if atual and (len(atual) >= self.batch_size or chars + len(t) > self.batch_max_chars):
+                lotes.append(atual)
+                atual, chars = [], 0
+            atual.append(t)
+            chars += len(t)
+        if atual:
+            lotes.append(atual)
+        return lotes
+
+    def encode_batch(self, texts: List[str], model_choice: str = "mpnet") -> List[List[float]]:
+        """
+        Gera embeddings para vários textos com uma chamada ao Space por lote.
+
+        O Space recebe os textos separados por quebra de linha e devolve um
+        embedding por linha; quebras de linha internas são convertidas em espaço.
+        Se um lote vier com quantidade diferente da enviada, os textos desse lote
+        são reenviados um a um e o envio em lote é desativado para esse modelo
+        (os lotes seguintes vão direto texto a texto, sem a chamada perdida).
+        Textos já presentes no cache não são enviados.
+
+        Returns:
+            Lista de embeddings na mesma ordem de `texts`
+        """
+        if not texts:
+            return []
+        textos = [" ".join(str(t).split()) for t in texts]
+        embeddings: List[List[float] | None] = [self.cache.get(t, model_choice) for t in textos]
+        pendentes = [i for i, e in enumerate(embeddings) if e is None]
+        if len(pendentes) < len(textos):
+            print(f"💾 {len(textos) - len(pendentes)}/{len(textos)} embeddings ({model_choice}) vindos do cache")
+
+        inicio = 0
+        for lote in self._dividir_em_lotes([textos[i] for i in pendentes]):
+            indices = pendentes[inicio:inicio + len(lote)]
+            inicio += len(lote)
+            if len(lote) == 1 or self.lote_suportado.get(model_choice) is False:
+                for i, t in zip(indices, lote):
+                    embeddings[i] = self._encode_remoto(t, model_choice)
+                    self.cache.set(t, model_choice, embeddings[i])
+                continue
+            print(f"📦 Gerando {len(lote)} embeddings ({model_choice}) numa única chamada...")
+            result = self._predict_com_retries("\n".join(lote), model_choice)
+            if len(result) == len(lote) and all(isinstance(r, list) for r in result):
+                self.lote_suportado[model_choice] = True
+                for i, t, emb in zip(indices, lote, result):
+                    embeddings[i] = emb
+                    self.cache.set(t, model_choice, emb)
+            else:
+                self.lote_suportado[model_choice] = False
+                print(f"⚠️ Space devolveu {len(result)} embeddings para {len(lote)} textos; envio em lote desativado ({model_choice}), gerando individualmente")
+                for i, t in zip(indices, lote):
+                    embeddings[i] = self._encode_remoto(t, model_choice)
+                    self.cache.set(t, model_choice, embeddings[i])
+        return embeddings
 
 class WeaviateManager:
     def __init__(self):
@@ -145,6 +251,9 @@ class WeaviateManager:
         self.MULTI_OK = True  # Ambos os modelos estão disponíveis via API
         # cache leve opcional de ids já indexados, para reduzir consultas repetidas
         self._known_ids: set[int] = set()
+        # Momento da última varredura completa: enquanto válida, _known_ids é o conjunto exato
+        # de produto_ids da coleção (mantido a cada inserção/remoção) e dispensa novas varreduras
+        self._known_ids_completo_em: float | None = None
         
     def connect(self):
         """Conecta ao Weaviate e inicializa cliente de embeddings"""
@@ -189,6 +298,7 @@ class WeaviateManager:
             if self.client.collections.exists("Produtos"):
                 # Já existe: reutiliza a coleção existente para evitar 422
                 print("Schema 'Produtos' já existe. Reutilizando coleção existente.")
+                self._garantir_campos_normalizados()
                 return
             else:
                 print("Criando novo schema...")
@@ -207,6 +317,8 @@ class WeaviateManager:
                 Property(name="tags", data_type=DataType.TEXT_ARRAY),
                 Property(name="estoque", data_type=DataType.INT),
                 Property(name="origem", data_type=DataType.TEXT),  # Adicionado para busca em duas fases
+                *self._propriedades_normalizadas(),
+                self._propriedade_hash(),
             ],
             vectorizer_config=[
                 Configure.NamedVectors.none(name="vetor_portugues"),
@@ -215,28 +327,53 @@ class WeaviateManager:
         )
         print("Schema 'Produtos' criado com dois vetores nomeados.")
         
-    def indexar_produto(self, dados_produto: dict):
+    @staticmethod
+    def _propriedades_normalizadas() -> list:
+        """Propriedades <campo>_norm: texto normalizado só para o reranker (fora do BM25 e dos filtros)."""
+        from weaviate.classes.config import Property, DataType
+        return [
+            Property(name=f"{campo}_norm", data_type=DataType.TEXT,
+                     skip_vectorization=True, index_filterable=False, index_searchable=False)
+            for campo in CAMPOS_NORMALIZADOS
+        ]
+
+    @staticmethod
+    def _propriedade_hash():
+        """Propriedade hash_conteudo: hash do texto dos embeddings + versão dos modelos (não indexada)."""
+        from weaviate.classes.config import Property, DataType
+        return Property(name="hash_conteudo", data_type=DataType.TEXT,
+                        skip_vectorization=True, index_filterable=False, index_searchable=False)
+
+    def _garantir_campos_normalizados(self):
+        """Adiciona as propriedades <campo>_norm e hash_conteudo a uma coleção criada antes delas existirem."""
+        try:
+            collection = self.client.collections.get("Produtos")
+            existentes = {prop.name for prop in collection.config.get().properties}
+            for prop in [*self._propriedades_normalizadas(), self._propriedade_hash()]:
+                if prop.name not in existentes:
+                    collection.config.add_property(prop)
+                    print(f"➕ Propriedade '{prop.name}' adicionada ao schema 'Produtos'")
+        except Exception as e:
+            print(f"⚠️ Não foi possível adicionar campos normalizados ao schema: {e}")
+
+    def _hash_conteudo(self, texto_para_embedding: str) -> str:
         """
-        Indexa ou atualiza produto no Weaviate conforme o fluxo inteligente:
-        - Se não existe, insere com embeddings.
-        - Se existe, compara campos importantes.
-          - Se texto mudou, atualiza tudo e recalcula embeddings.
-          - Se só mudou preço/estoque, atualiza apenas esses campos.
+        Hash estável do que determina os vetores: texto dos embeddings (espaços colapsados) e
+        modelos usados. Mudar EMBEDDING_VERSAO (ou os modelos) força o recálculo de todo o catálogo.
         """
+        texto = " ".join(str(texto_para_embedding).split())
+        return hashlib.sha256(f"{self.versao_modelos()}\n{texto}".encode("utf-8")).hexdigest()
+
+    def versao_modelos(self) -> str:
+        """Identifica os modelos de embedding em uso (parte do hash_conteudo)."""
+        return f"{MODELO_PT}|{MODELO_MULTI if self.MULTI_OK else '-'}|v{EMBEDDING_VERSAO}"
+
+    def _extrair_campos_produto(self, dados_produto: dict) -> dict | None:
+        """Normaliza os campos vindos do Supabase para o formato indexado no Weaviate."""
         import uuid
         produto_id = int(dados_produto.get('id') or dados_produto.get('produto_id') or 0)
         if not produto_id:
-            print("Produto sem id, ignorado.")
-            return
-        uuid_produto = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"produto-{produto_id}"))
-        collection = self.client.collections.get("Produtos")
-        filtro = wvc.query.Filter.by_property("produto_id").equal(produto_id)
-        res = collection.query.fetch_objects(
-            limit=1,
-            filters=filtro,
-            return_properties=["produto_id", "nome", "descricao", "categoria", "tags", "preco", "estoque"],
-        )
-        objeto_existente = res.objects[0] if res and getattr(res, "objects", None) else None
+            return None
         nome = dados_produto.get('nome', '')
         descricao = dados_produto.get('descricao', '')
         categoria = dados_produto.get('categoria', '') or dados_produto.get('modelo', '')
@@ -249,20 +386,12 @@ class WeaviateManager:
             tags_array = []
         preco = float(dados_produto.get('preco', 0)) if dados_produto.get('preco') else 0.0
         estoque = int(dados_produto.get('estoque', 0)) if dados_produto.get('estoque') else 0
-        if not objeto_existente:
-            # Garantir que o cliente de embeddings está pronto (lazy init)
-            self._ensure_embedding_client()
-            
-            texto_para_embedding = f"Nome: {nome}. Categoria: {categoria}. Tags: {', '.join(tags_array)}. Descrição: {descricao}"
-            
-            # Gerar embeddings usando a API do Hugging Face
-            emb_pt = self.embedding_client.encode(texto_para_embedding, model_choice="bertimbau")
-            emb_multi = self.embedding_client.encode(texto_para_embedding, model_choice="mpnet") if self.MULTI_OK else None
-            
-            vectors = {"vetor_portugues": emb_pt}
-            if emb_multi is not None:
-                vectors["vetor_multilingue"] = emb_multi
-            dados_weaviate = {
+        normalizados = normalizar_campos_produto({"nome": nome, "categoria": categoria, "descricao": descricao, "tags": tags_array})
+        texto_para_embedding = f"Nome: {nome}. Categoria: {categoria}. Tags: {', '.join(tags_array)}. Descrição: {descricao}"
+        return {
+            "uuid": str(uuid.uuid5(uuid.NAMESPACE_DNS, f"produto-{produto_id}")),
+            "texto_para_embedding": texto_para_embedding,
+            "propriedades": {
                 "produto_id": produto_id,
                 "nome": nome,
                 "descricao": descricao,
@@ -270,155 +399,410 @@ class WeaviateManager:
                 "categoria": categoria,
                 "tags": tags_array,
                 "estoque": estoque,
-                "origem": dados_produto.get("origem", "local")  # Adicionado para busca em duas fases
-            }
-            # Usa o dicionário 'vectors' preparado acima para evitar enviar None
-            collection.data.insert(
-                uuid=uuid_produto,
-                properties=dados_weaviate,
-                vector=vectors
-            )
-            print(f"✔ Produto novo indexado: {nome} (id={produto_id})")
-            self._known_ids.add(produto_id)
-            return
-        atual = objeto_existente.properties
-        mudou_texto = (
-            atual.get("nome", "") != nome or
-            atual.get("descricao", "") != descricao or
-            atual.get("categoria", "") != categoria or
-            atual.get("tags", []) != tags_array
+                "origem": dados_produto.get("origem", "local"),  # Adicionado para busca em duas fases
+                **normalizados,
+                "hash_conteudo": self._hash_conteudo(texto_para_embedding),
+            },
+            "normalizados": normalizados,
+        }
+
+    # Propriedades lidas de volta para planejar a indexação: com o hash basta a versão leve;
+    # os campos de texto só são lidos para objetos indexados antes de hash_conteudo existir
+    PROPRIEDADES_PLANEJAMENTO = ["produto_id", "hash_conteudo", "preco", "estoque", "nome_norm"]
+    PROPRIEDADES_TEXTO_LEGADO = ["nome", "descricao", "categoria", "tags"]
+
+    def _buscar_existente(self, collection, produto_id: int):
+        """Retorna o objeto Weaviate do produto (ou None se ainda não indexado)."""
+        filtro = wvc.query.Filter.by_property("produto_id").equal(produto_id)
+        res = collection.query.fetch_objects(
+            limit=1,
+            filters=filtro,
+            return_properties=self.PROPRIEDADES_PLANEJAMENTO + self.PROPRIEDADES_TEXTO_LEGADO,
         )
-        mudou_numerico = (
-            atual.get("preco", 0.0) != preco or
-            atual.get("estoque", 0) != estoque
+        return res.objects[0] if res and getattr(res, "objects", None) else None
+
+    def _buscar_existentes(self, collection, produto_ids: list[int]) -> dict:
+        """
+        Objetos Weaviate de vários produtos numa única consulta filtrada: {produto_id: objeto}.
+        Lê só hash/preço/estoque; objetos ainda sem hash_conteudo são relidos com os campos de
+        texto (segunda consulta, apenas até o backfill do hash).
+        """
+        existentes = self._consultar_por_ids(collection, produto_ids, self.PROPRIEDADES_PLANEJAMENTO)
+        sem_hash = [pid for pid, obj in existentes.items() if not obj.properties.get("hash_conteudo")]
+        if sem_hash:
+            existentes.update(self._consultar_por_ids(
+                collection, sem_hash, self.PROPRIEDADES_PLANEJAMENTO + self.PROPRIEDADES_TEXTO_LEGADO
+            ))
+        return existentes
+
+    @staticmethod
+    def _consultar_por_ids(collection, produto_ids: list[int], propriedades: list[str]) -> dict:
+        ids = sorted({int(pid) for pid in produto_ids if pid})
+        if not ids:
+            return {}
+        res = collection.query.fetch_objects(
+            limit=len(ids),
+            filters=wvc.query.Filter.by_property("produto_id").contains_any(ids),
+            return_properties=propriedades,
         )
+        existentes = {}
+        for obj in getattr(res, "objects", None) or []:
+            pid = obj.properties.get("produto_id")
+            if pid is not None:
+                existentes[int(pid)] = obj
+        return existentes
+
+    def _gravar_em_lote(self, collection, itens: list[tuple[dict, dict]]) -> dict[str, str]:
+        """
+        Grava objetos completos (propriedades + vetores) com o batch de tamanho fixo do Weaviate.
+        O batch substitui o objeto quando o UUID já existe, então serve para inserções e para
+        atualizações de texto. Retorna os erros por objeto: {uuid: mensagem}.
+        """
+        if not itens:
+            return {}
+        with collection.batch.fixed_size(batch_size=max(1, WEAVIATE_BATCH_SIZE)) as batch:
+            for campos, vectors in itens:
+                batch.add_object(properties=campos["propriedades"], uuid=campos["uuid"], vector=vectors)
+        erros: dict[str, str] = {}
+        for falha in collection.batch.failed_objects or []:
+            objeto = getattr(falha, "object_", None)
+            uuid_obj = getattr(objeto, "uuid", None)
+            erros[str(uuid_obj)] = str(getattr(falha, "message", falha))
+        return erros
+
+    def _planejar_indexacao(self, campos: dict, objeto_existente) -> str:
+        """
+        Decide a ação de indexação comparando com o objeto existente:
+        'inserir', 'atualizar_texto' (recalcula embeddings), 'atualizar_numerico',
+        'atualizar_normalizado' (backfill dos campos *_norm e hash_conteudo, sem embeddings) ou 'nenhuma'.
+        O texto é comparado pelo hash_conteudo; objetos antigos, sem hash, comparam os campos de texto.
+        """
+        if not objeto_existente:
+            return "inserir"
+        atual = objeto_existente.properties
+        novo = campos["propriedades"]
+        if atual.get("hash_conteudo"):
+            mudou_texto = atual["hash_conteudo"] != novo["hash_conteudo"]
+        else:
+            mudou_texto = (
+                atual.get("nome", "") != novo["nome"] or
+                atual.get("descricao", "") != novo["descricao"] or
+                atual.get("categoria", "") != novo["categoria"] or
+                atual.get("tags", []) != novo["tags"]
+            )
         if mudou_texto:
-            # Garantir que o cliente de embeddings está pronto (lazy init)
-            self._ensure_embedding_client()
-            
-            texto_para_embedding = f"Nome: {nome}. Categoria: {categoria}. Tags: {', '.join(tags_array)}. Descrição: {descricao}"
-            
-            # Gerar embeddings usando a API do Hugging Face
-            emb_pt = self.embedding_client.encode(texto_para_embedding, model_choice="bertimbau")
-            emb_multi = self.embedding_client.encode(texto_para_embedding, model_choice="mpnet") if self.MULTI_OK else None
-            
+            return "atualizar_texto"
+        mudou_numerico = (
+            atual.get("preco", 0.0) != novo["preco"] or
+            atual.get("estoque", 0) != novo["estoque"]
+        )
+        if mudou_numerico:
+            return "atualizar_numerico"
+        # Objetos indexados antes dos campos *_norm / hash_conteudo existirem
+        if atual.get("nome_norm") is None or not atual.get("hash_conteudo"):
+            return "atualizar_normalizado"
+        return "nenhuma"
+
+    def _gerar_vetores(self, textos: list[str]) -> list[dict]:
+        """Gera os vetores nomeados (PT + multilíngue) para vários textos, em lote."""
+        if not textos:
+            return []
+        # Garantir que o cliente de embeddings está pronto (lazy init)
+        self._ensure_embedding_client()
+
+        # Gerar embeddings usando a API do Hugging Face
+        embs_pt = self.embedding_client.encode_batch(textos, model_choice="bertimbau")
+        embs_multi = self.embedding_client.encode_batch(textos, model_choice="mpnet") if self.MULTI_OK else [None] * len(textos)
+
+        vetores = []
+        for emb_pt, emb_multi in zip(embs_pt, embs_multi):
             vectors = {"vetor_portugues": emb_pt}
             if emb_multi is not None:
                 vectors["vetor_multilingue"] = emb_multi
-            dados_weaviate = {
-                "produto_id": produto_id,
-                "nome": nome,
-                "descricao": descricao,
-                "preco": preco,
-                "categoria": categoria,
-                "tags": tags_array,
-                "estoque": estoque,
-                "origem": dados_produto.get("origem", "local")  # Adicionado para busca em duas fases
-            }
-            collection.data.update(uuid=uuid_produto, properties=dados_weaviate, vector=vectors)
+            vetores.append(vectors)
+        return vetores
+
+    def _aplicar_indexacao(self, collection, campos: dict, acao: str, vectors: dict | None = None):
+        """Executa no Weaviate a ação planejada por _planejar_indexacao."""
+        props = campos["propriedades"]
+        produto_id, nome = props["produto_id"], props["nome"]
+        if acao == "inserir":
+            # Usa o dicionário 'vectors' preparado para evitar enviar None
+            collection.data.insert(
+                uuid=campos["uuid"],
+                properties=props,
+                vector=vectors
+            )
+            print(f"✔ Produto novo indexado: {nome} (id={produto_id})")
+            self._known_ids.add(produto_id)
+        elif acao == "atualizar_texto":
+            collection.data.update(uuid=campos["uuid"], properties=props, vector=vectors)
             print(f"✏️ Produto atualizado (texto mudou): {nome} (id={produto_id})")
-        elif mudou_numerico:
+        elif acao == "atualizar_numerico":
             dados_update = {
-                "preco": preco,
-                "estoque": estoque
+                "preco": props["preco"],
+                "estoque": props["estoque"],
+                **campos["normalizados"],
+                "hash_conteudo": props["hash_conteudo"],
             }
-            collection.data.update(uuid=uuid_produto, properties=dados_update)
+            collection.data.update(uuid=campos["uuid"], properties=dados_update)
             print(f"✏️ Produto atualizado (só preço/estoque): {nome} (id={produto_id})")
+        elif acao == "atualizar_normalizado":
+            collection.data.update(
+                uuid=campos["uuid"],
+                properties={**campos["normalizados"], "hash_conteudo": props["hash_conteudo"]},
+            )
+            print(f"✏️ Campos normalizados preenchidos: {nome} (id={produto_id})")
 
-    def indexar_produtos(self, produtos: list[dict]):
+    def indexar_produto(self, dados_produto: dict):
         """
-        Indexa uma lista de produtos no Weaviate.
-        Processa cada produto individualmente usando o método indexar_produto.
+        Indexa ou atualiza produto no Weaviate conforme o fluxo inteligente:
+        - Se não existe, insere com embeddings.
+        - Se existe, compara campos importantes.
+          - Se texto mudou, atualiza tudo e recalcula embeddings.
+          - Se só mudou preço/estoque, atualiza apenas esses campos.
+        """
+        campos = self._extrair_campos_produto(dados_produto)
+        if not campos:
+            print("Produto sem id, ignorado.")
+            return
+        collection = self.client.collections.get("Produtos")
+        objeto_existente = self._buscar_existente(collection, campos["propriedades"]["produto_id"])
+        acao = self._planejar_indexacao(campos, objeto_existente)
+        vectors = None
+        if acao in ("inserir", "atualizar_texto"):
+            vectors = self._gerar_vetores([campos["texto_para_embedding"]])[0]
+        self._aplicar_indexacao(collection, campos, acao, vectors)
+
+    def indexar_produtos(self, produtos: list[dict]) -> dict:
+        """
+        Indexa uma lista de produtos no Weaviate em lotes:
+        - busca os objetos existentes do lote numa única consulta (produto_id contains_any)
+        - planeja a ação de cada produto e gera os embeddings dos que precisam numa chamada por modelo
+        - grava inserções e atualizações de texto com o batch do Weaviate; preço/estoque e
+          backfill dos campos normalizados seguem como atualizações parciais (data.update)
+        Retorna métricas: { 'sucessos': int, 'falhas': int, 'acoes': {acao: int}, 'erros': [...] }
         """
         if not produtos:
             print("📭 Nenhum produto para indexar")
-            return
+            return {"sucessos": 0, "falhas": 0, "acoes": {}, "erros": []}
         
         print(f"🔄 Indexando {len(produtos)} produtos...")
         sucessos = 0
         falhas = 0
-        
-        for produto in produtos:
+        acoes: dict[str, int] = {}
+        erros: list[dict] = []
+        collection = self.client.collections.get("Produtos")
+        tamanho_lote = self.embedding_client.batch_size if self.embedding_client else 32
+
+        def _falhar(produto_id, erro):
+            nonlocal falhas
+            falhas += 1
+            erros.append({"produto_id": produto_id, "erro": str(erro)[:300]})
+            print(f"❌ Erro ao indexar produto {produto_id}: {erro}")
+
+        for inicio in range(0, len(produtos), tamanho_lote):
+            extraidos: list[dict] = []
+            for produto in produtos[inicio:inicio + tamanho_lote]:
+                try:
+                    campos = self._extrair_campos_produto(produto)
+                    if not campos:
+                        print("Produto sem id, ignorado.")
+                        sucessos += 1
+                        continue
+                    extraidos.append(campos)
+                except Exception as e:
+                    _falhar(produto.get('id', 'desconhecido'), e)
+
             try:
-                self.indexar_produto(produto)
-                sucessos += 1
+                existentes = self._buscar_existentes(collection, [c["propriedades"]["produto_id"] for c in extraidos])
             except Exception as e:
-                falhas += 1
-                produto_id = produto.get('id', 'desconhecido')
-                print(f"❌ Erro ao indexar produto {produto_id}: {e}")
+                for campos in extraidos:
+                    _falhar(campos["propriedades"]["produto_id"], f"falha ao consultar existentes: {e}")
+                continue
+            planejados = [
+                (campos, self._planejar_indexacao(campos, existentes.get(campos["propriedades"]["produto_id"])))
+                for campos in extraidos
+            ]
+
+            precisam_vetor = [c for c, acao in planejados if acao in ("inserir", "atualizar_texto")]
+            vetores_por_uuid: dict[str, dict] = {}
+            try:
+                vetores = self._gerar_vetores([c["texto_para_embedding"] for c in precisam_vetor])
+                vetores_por_uuid = {c["uuid"]: v for c, v in zip(precisam_vetor, vetores)}
+            except Exception as e:
+                print(f"❌ Erro ao gerar embeddings do lote ({len(precisam_vetor)} produtos): {e}")
+
+            em_lote: list[tuple[dict, str]] = []
+            for campos, acao in planejados:
+                produto_id = campos["propriedades"]["produto_id"]
+                if acao in ("inserir", "atualizar_texto"):
+                    if campos["uuid"] not in vetores_por_uuid:
+                        _falhar(produto_id, "embeddings não gerados")
+                    else:
+                        em_lote.append((campos, acao))
+                    continue
+                try:
+                    self._aplicar_indexacao(collection, campos, acao)
+                    sucessos += 1
+                    acoes[acao] = acoes.get(acao, 0) + 1
+                except Exception as e:
+                    _falhar(produto_id, e)
+
+            try:
+                erros_lote = self._gravar_em_lote(collection, [(c, vetores_por_uuid[c["uuid"]]) for c, _ in em_lote])
+            except Exception as e:
+                erros_lote = {c["uuid"]: f"falha no batch: {e}" for c, _ in em_lote}
+            for campos, acao in em_lote:
+                props = campos["propriedades"]
+                erro = erros_lote.get(campos["uuid"])
+                if erro:
+                    _falhar(props["produto_id"], erro)
+                    continue
+                sucessos += 1
+                acoes[acao] = acoes.get(acao, 0) + 1
+                self._known_ids.add(props["produto_id"])
+                rotulo = "✔ Produto novo indexado" if acao == "inserir" else "✏️ Produto atualizado (texto mudou)"
+                print(f"{rotulo}: {props['nome']} (id={props['produto_id']})")
         
         print(f"✅ Indexação concluída: {sucessos} sucessos, {falhas} falhas")
+        return {"sucessos": sucessos, "falhas": falhas, "acoes": acoes, "erros": erros}
+
+    def _ids_completos(self) -> bool:
+        """True se _known_ids veio de uma varredura completa ainda dentro do TTL."""
+        return (
+            self._known_ids_completo_em is not None and
+            time.time() - self._known_ids_completo_em <= WEAVIATE_IDS_CACHE_TTL
+        )
+
+    def _invalidar_ids(self):
+        """Marca o conjunto de ids como incompleto (próxima limpeza refaz a varredura)."""
+        self._known_ids_completo_em = None
+
+    def _varrer_ids(self, collection) -> tuple[set[int], list, int]:
+        """
+        Percorre a coleção inteira (só produto_id, cursor 'after') e devolve
+        (produto_ids, uuids de objetos sem produto_id, total de objetos).
+        """
+        ids: set[int] = set()
+        sem_id: list = []
+        total = 0
+        after: str | None = None
+        while True:
+            res = collection.query.fetch_objects(
+                limit=1000,
+                after=after,
+                return_properties=["produto_id"],
+            )
+            objetos = getattr(res, "objects", None) or []
+            if not objetos:
+                break
+            for obj in objetos:
+                total += 1
+                pid = obj.properties.get("produto_id") if hasattr(obj, "properties") else None
+                if pid is None:
+                    sem_id.append(getattr(obj, "uuid", None))
+                else:
+                    ids.add(int(pid))
+            after = getattr(res, "next_page_cursor", None) or getattr(objetos[-1], "uuid", None)
+            if not after or len(objetos) < 1000:
+                break
+        return ids, sem_id, total
+
+    def _apagar_por_produto_ids(self, collection, produto_ids: set[int]) -> tuple[int, int]:
+        """
+        Apaga em bloco (delete_many filtrado por produto_id, em fatias de WEAVIATE_BATCH_SIZE).
+        Retorna (removidos, falhas); uma fatia que falhar inteira conta todos os seus ids como falha.
+        """
+        import sys
+        removidos, falhas = 0, 0
+        ids = sorted(int(pid) for pid in produto_ids)
+        tamanho = max(1, WEAVIATE_BATCH_SIZE)
+        for inicio in range(0, len(ids), tamanho):
+            fatia = ids[inicio:inicio + tamanho]
+            try:
+                res = collection.data.delete_many(
+                    where=wvc.query.Filter.by_property("produto_id").contains_any(fatia)
+                )
+                removidos += int(getattr(res, "successful", 0) or 0)
+                falhas_fatia = int(getattr(res, "failed", 0) or 0)
+            except Exception as e:
+                falhas_fatia = len(fatia)
+                print(f"❌ Falha ao remover {len(fatia)} produto(s) em bloco: {e}", file=sys.stderr)
+            if falhas_fatia:
+                falhas += falhas_fatia
+                # Não dá para saber quais ids ficaram: a próxima limpeza refaz a varredura
+                self._invalidar_ids()
+            else:
+                self._known_ids.difference_update(fatia)
+        return removidos, falhas
 
     def remover_orfaos(self, valid_produto_ids: set[int]) -> dict:
         """Remove objetos em Weaviate cujo produto_id não existe na base relacional.
-        Retorna métricas: { 'removidos': int, 'falhas': int, 'total_encontrados': int }
+        Os órfãos são calculados localmente (ids indexados - ids válidos) e apagados em bloco com
+        delete_many. A varredura da coleção só acontece quando o conjunto de ids em cache não é
+        completo ou expirou (WEAVIATE_IDS_CACHE_TTL).
+        Retorna métricas: { 'removidos': int, 'falhas': int, 'total_encontrados': int, 'varredura': bool }
         """
         import sys
-        removidos, falhas, total = 0, 0, 0
         try:
             collection = self.client.collections.get("Produtos")
         except Exception as e:
             print(f"⚠️ Falha ao obter coleção 'Produtos' para limpeza: {e}")
-            return {"removidos": 0, "falhas": 1, "total_encontrados": 0}
+            return {"removidos": 0, "falhas": 1, "total_encontrados": 0, "varredura": False}
 
-        # Paginação usando cursor 'after'
-        after: str | None = None
-        while True:
+        varredura = not self._ids_completos()
+        sem_id: list = []
+        if varredura:
             try:
-                res = collection.query.fetch_objects(
-                    limit=100,
-                    after=after,
-                    return_properties=["produto_id"],
-                )
+                ids, sem_id, total = self._varrer_ids(collection)
             except Exception as e:
                 print(f"⚠️ Erro ao paginar objetos na limpeza: {e}", file=sys.stderr)
-                break
+                return {"removidos": 0, "falhas": 1, "total_encontrados": 0, "varredura": True}
+            self._known_ids = ids
+            self._known_ids_completo_em = time.time()
+        else:
+            total = len(self._known_ids)
 
-            objetos = getattr(res, "objects", None) or []
-            if not objetos:
-                break
+        valid = {int(pid) for pid in valid_produto_ids}
+        orfaos = self._known_ids - valid
+        removidos, falhas = self._apagar_por_produto_ids(collection, orfaos) if orfaos else (0, 0)
 
-            for obj in objetos:
-                total += 1
-                try:
-                    pid = obj.properties.get("produto_id") if hasattr(obj, "properties") else None
-                    uuid_obj = getattr(obj, "uuid", None) or getattr(obj, "id", None)
-                    if pid is None or int(pid) not in valid_produto_ids:
-                        if uuid_obj is None:
-                            # Fallback para reconstruir UUID determinístico se possível
-                            import uuid as _uuid
-                            try:
-                                if pid is not None:
-                                    uuid_obj = str(_uuid.uuid5(_uuid.NAMESPACE_DNS, f"produto-{int(pid)}"))
-                            except Exception:
-                                uuid_obj = None
-                        try:
-                            if uuid_obj is not None:
-                                collection.data.delete_by_id(uuid=uuid_obj)
-                                removidos += 1
-                            else:
-                                falhas += 1
-                        except Exception as e:
-                            falhas += 1
-                            print(f"❌ Falha ao remover objeto órfão (produto_id={pid}): {e}", file=sys.stderr)
-                except Exception as e:
+        # Objetos sem produto_id não casam com o filtro: removidos pelo UUID
+        for uuid_obj in sem_id:
+            try:
+                if uuid_obj is not None and collection.data.delete_by_id(uuid=uuid_obj):
+                    removidos += 1
+                else:
                     falhas += 1
-                    print(f"⚠️ Erro ao avaliar objeto na limpeza: {e}", file=sys.stderr)
-
-            # Próxima página
-            after = getattr(res, "next_page_cursor", None)
-            if not after:
-                break
+            except Exception as e:
+                falhas += 1
+                print(f"❌ Falha ao remover objeto órfão sem produto_id ({uuid_obj}): {e}", file=sys.stderr)
 
         if removidos:
             print(f"🧹 Limpeza Weaviate: removidos {removidos} objeto(s) órfão(s).", file=sys.stderr)
-        return {"removidos": removidos, "falhas": falhas, "total_encontrados": total}
+        return {"removidos": removidos, "falhas": falhas, "total_encontrados": total, "varredura": varredura}
+
+    def remover_produtos(self, produto_ids: set[int]) -> dict:
+        """Remove do Weaviate os produtos indicados (delete_many por produto_id, em bloco).
+        Retorna métricas: { 'removidos': int, 'falhas': int }
+        """
+        if not produto_ids:
+            return {"removidos": 0, "falhas": 0}
+        collection = self.client.collections.get("Produtos")
+        removidos, falhas = self._apagar_por_produto_ids(collection, set(produto_ids))
+        if removidos:
+            print(f"🧹 Removidos {removidos} produto(s) apagado(s) no Supabase.")
+        return {"removidos": removidos, "falhas": falhas}
 
     def produto_existe(self, produto_id: int) -> bool:
         """Verifica se já existe um objeto com o produto_id dado no Weaviate."""
         try:
             if produto_id in self._known_ids:
                 return True
+            if self._ids_completos():
+                # Conjunto exato e recente: ausência no cache = ausência na coleção
+                return False
             collection = self.client.collections.get("Produtos")
             filtro = wvc.query.Filter.by_property("produto_id").equal(produto_id)
             res = collection.query.fetch_objects(
@@ -439,48 +823,85 @@ class WeaviateManager:
         """Sincroniza: garante que Weaviate reflita o Supabase em tempo de execução.
         Ações:
         - Remove objetos cujo produto_id não existe na lista fornecida
-        - Indexa produtos que ainda não existem
-        Retorna métricas: { 'novos': int, 'removidos': int, 'falhas': int }
+        - Indexa produtos novos e aplica as alterações (texto com novos embeddings, preço/estoque)
+        Retorna métricas: { 'novos': int, 'atualizados': int, 'removidos': int, 'falhas': int }
         """
-        if not produtos_supabase:
-            # Segurança: não remover tudo quando a lista vier vazia
-            return {"novos": 0, "removidos": 0, "falhas": 0}
-        novos, falhas, removidos = 0, 0, 0
+        return self.sincronizar_paginas([produtos_supabase] if produtos_supabase else [])
+
+    def sincronizar_paginas(self, paginas) -> dict:
+        """Sincronização completa a partir de páginas do catálogo (ex.: SupabaseManager.iterar_produtos()).
+        Cada página passa inteira por indexar_produtos, que consulta os existentes em bloco e planeja
+        cada linha (inserir, atualizar_texto, atualizar_numerico, ...), e depois é descartada.
+        Os órfãos são removidos no fim, com os ids de todas as páginas.
+        Retorna métricas: { 'novos': int, 'atualizados': int, 'removidos': int, 'falhas': int, 'total': int }
+        """
+        novos, atualizados, falhas, removidos = 0, 0, 0, 0
+        valid_ids: set[int] = set()
+        for pagina in paginas:
+            com_id = []
+            for p in pagina:
+                try:
+                    pid = int(p.get("id") or p.get("produto_id") or 0)
+                except Exception:
+                    pid = 0
+                if not pid:
+                    # sem id, não indexar
+                    continue
+                valid_ids.add(pid)
+                com_id.append(p)
+            if com_id:
+                res_index = self.indexar_produtos(com_id)
+                acoes = res_index.get("acoes", {})
+                novos += int(acoes.get("inserir", 0))
+                atualizados += sum(int(n) for acao, n in acoes.items() if acao.startswith("atualizar"))
+                falhas += int(res_index.get("falhas", 0))
 
         # Purga de órfãos baseada nos IDs atuais do Supabase
-        try:
-            valid_ids = {int(p.get("id") or p.get("produto_id") or 0) for p in produtos_supabase if (p.get("id") or p.get("produto_id"))}
-        except Exception:
-            valid_ids = set()
-        try:
-            if valid_ids:
+        # Segurança: não remover tudo quando nenhuma página trouxer produtos
+        if valid_ids:
+            try:
                 res_cleanup = self.remover_orfaos(valid_ids)
                 removidos = int(res_cleanup.get("removidos", 0))
-        except Exception as e:
-            print(f"⚠️ Falha ao remover órfãos durante sincronização: {e}")
-
-        # Indexar o que faltar
-        for p in produtos_supabase:
-            try:
-                pid = int(p.get("id") or p.get("produto_id") or 0)
-            except Exception:
-                pid = 0
-            if not pid:
-                # sem id, não indexar
-                continue
-            if self.produto_existe(pid):
-                continue
-            try:
-                self.indexar_produto(p)
-                novos += 1
             except Exception as e:
-                falhas += 1
-                nome = p.get('nome', 'sem nome')
-                print(f"❌ Erro ao indexar novo produto '{nome}' (id={pid}): {e}")
-        if novos or removidos:
-            print(f"🔄 Sincronização: {novos} novo(s) indexado(s), {removidos} removido(s).")
-        return {"novos": novos, "removidos": removidos, "falhas": falhas}
+                print(f"⚠️ Falha ao remover órfãos durante sincronização: {e}")
+        if novos or atualizados or removidos:
+            print(f"🔄 Sincronização: {novos} novo(s) indexado(s), {atualizados} atualizado(s), {removidos} removido(s).")
+        return {"novos": novos, "atualizados": atualizados, "removidos": removidos, "falhas": falhas, "total": len(valid_ids)}
+
+    def estado_snapshot(self) -> dict:
+        """Estado local salvo no snapshot do catálogo: versão dos modelos que geraram os vetores."""
+        return {"versao_modelos": self.versao_modelos()}
+
+    def restaurar_snapshot(self, ids: set[int]):
+        """Restaura os ids indexados guardados no snapshot do catálogo."""
+        self._known_ids.update(int(pid) for pid in ids)
+
+    def total_objetos(self) -> int:
+        """Nº de objetos na coleção 'Produtos' (aggregate)."""
+        collection = self.client.collections.get("Produtos")
+        res = collection.aggregate.over_all(total_count=True)
+        return int(res.total_count or 0) if res else 0
         
+    def sincronizar_delta(self, alterados: list[dict], removidos: set[int]) -> dict:
+        """Sincronização incremental: aplica apenas as linhas alteradas e as remoções detectadas.
+        As linhas alteradas passam pelo mesmo plano de indexar_produtos (inserir, atualizar_texto com
+        novos embeddings, atualizar_numerico só com preço/estoque, ou nenhuma).
+        Retorna métricas: { 'novos': int, 'atualizados': int, 'removidos': int, 'falhas': int }
+        """
+        novos, atualizados, falhas = 0, 0, 0
+        res_remocao = self.remover_produtos(set(removidos or ()))
+        if alterados:
+            res_index = self.indexar_produtos(alterados)
+            acoes = res_index.get("acoes", {})
+            novos = int(acoes.get("inserir", 0))
+            atualizados = sum(int(n) for acao, n in acoes.items() if acao.startswith("atualizar"))
+            falhas = int(res_index.get("falhas", 0))
+        falhas += int(res_remocao.get("falhas", 0))
+        removidos_total = int(res_remocao.get("removidos", 0))
+        if novos or atualizados or removidos_total:
+            print(f"🔄 Sincronização incremental: {novos} novo(s), {atualizados} atualizado(s), {removidos_total} removido(s).")
+        return {"novos": novos, "atualizados": atualizados, "removidos": removidos_total, "falhas": falhas}
+
     def get_models(self) -> Dict[str, Any]:
         """Retorna dicionário com cliente de embeddings"""
         return {